@@ -1,8 +1,13 @@
 # keep track of all contracts and their labels through this contract.
-import pandas as pd
+import functools
 
+from src.storage import load_frame
 
-TRANSFERS = pd.read_csv("output_files/all_transfers.csv")
+
+# read on first use rather than at import, only the columns needed here
+@functools.lru_cache(maxsize=None)
+def load_transfers():
+    return load_frame("all_transfers", ["contractAddress", "chain"])
 
 
 # return the count of unique contract addresses
@@ -23,7 +28,7 @@ def fetch_contracts(transfers):
 
 # main
 def main():
-    transfer_count = count_contracts(TRANSFERS)
+    transfer_count = count_contracts(load_transfers())
 
     print(transfer_count)
 
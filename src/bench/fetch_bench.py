@@ -0,0 +1,98 @@
+import argparse
+import os
+import tempfile
+import time
+
+from src.bench.mock_explorer import start_mock_explorer, synthetic_fixtures, load_fixtures
+
+
+# benchmark the real fetchers in src/transactions.py against the mock explorer
+# e.g. python -m src.bench.fetch_bench --wallets 5 --chains 4 --records 25000 --latency 0.1
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--wallets", type=int, default=3, help="number of wallets from WALLET_LIST")
+    parser.add_argument("--chains", type=int, default=3, help="number of chains from CHAIN_LIST")
+    parser.add_argument("--records", type=int, default=2_000, help="synthetic records per wallet, chain and action")
+    parser.add_argument("--fixtures", help="recorded fixtures json to serve instead of synthetic data")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument("--rate-limit", type=int, default=5, help="calls per second per chain, 0 for none")
+    parser.add_argument("--max-records", type=int, default=10_000, help="records returned per response")
+    parser.add_argument("--serial", action="store_true", help="fetch chains one at a time")
+    parser.add_argument("--backend", choices=["explorer", "rpc"], default="explorer", help="token transfer source")
+    parser.add_argument("--max-logs", type=int, default=10_000, help="logs returned per eth_getLogs query")
+    parser.add_argument("--warm", action="store_true", help="repeat the run against the warm response cache")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # keep the response cache and rate limit state away from the real ones
+    # these are read when src.cache and src.scheduler are imported, and the mock rpc imports
+    # them through src.rpc_logs, so nothing that fetches is imported until they're set
+    bench_dir = tempfile.mkdtemp(prefix="fetch_bench_")
+    os.environ["EXPLORER_CACHE_DIR"] = os.path.join(bench_dir, "cache")
+    os.environ["EXPLORER_SCHEDULER_DIR"] = os.path.join(bench_dir, "rate_limits")
+
+    from src.bench.mock_rpc import start_mock_rpc
+    from src.utils import CHAINS, CHAIN_LIST, WALLET_LIST
+    from src import transactions
+    from src.transactions import (
+        get_normal_transactions, get_token_transfers, get_internal_transactions
+    )
+
+    wallets = WALLET_LIST[:args.wallets]
+    chains = CHAIN_LIST[:args.chains]
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        fixtures = synthetic_fixtures(chains, wallets, args.records)
+
+    server = start_mock_explorer(
+        fixtures,
+        latency=args.latency,
+        calls_per_second=args.rate_limit or None,
+        max_records=args.max_records,
+    )
+    rpc_server = start_mock_rpc(fixtures, latency=args.latency, max_logs=args.max_logs)
+    for chain in chains:
+        CHAINS[chain]["explorer_url"] = server.explorer_url(chain)
+        CHAINS[chain]["rpc_url"] = rpc_server.rpc_url(chain)
+    transactions.MAX_RECORDS = args.max_records
+    transactions.WINDOW_TARGET_RECORDS = args.max_records // 2
+
+    fetchers = {
+        "normal transactions": get_normal_transactions,
+        "token transfers": lambda wallets, chains, concurrent: get_token_transfers(
+            wallets, chains, concurrent, backend=args.backend
+        ),
+        "internal transactions": get_internal_transactions,
+    }
+    runs = ["cold", "warm"] if args.warm else ["cold"]
+    results = []
+    for run in runs:
+        for name, fetch in fetchers.items():
+            server.stats.clear()
+            rpc_server.stats.clear()
+            start = time.perf_counter()
+            frame = fetch(wallets, chains, concurrent=not args.serial)
+            elapsed = time.perf_counter() - start
+            results.append((run, name, len(frame), elapsed, server.stats + rpc_server.stats))
+
+    server.shutdown()
+    rpc_server.shutdown()
+
+    print()
+    print(f"{len(wallets)} wallets x {len(chains)} chains, {args.latency}s latency, "
+          f"{args.rate_limit or 'no'} calls/s limit, {'serial' if args.serial else 'concurrent'}, "
+          f"{args.backend} token transfers")
+    for run, name, rows, elapsed, stats in results:
+        print(
+            f"{run:5} {name:22} {rows:8} rows {elapsed:8.2f}s "
+            f"{stats.get('requests', 0):6} requests {stats.get('rate_limited', 0):4} throttled "
+            f"{stats.get('capped', 0):4} capped"
+        )
+
+
+if __name__ == "__main__":
+    main()
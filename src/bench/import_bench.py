@@ -0,0 +1,90 @@
+import argparse
+import subprocess
+import sys
+
+
+# measure how long the cli modules take to import, each in a fresh interpreter
+# using python -X importtime, and show the slowest imports under each one
+# a module that imports dotenv is reading the .env at import, which is an error
+# e.g. python -m src.bench.import_bench --max-ms 50 src.utils src.cache src.lending.main
+MODULES = [
+    "src.utils",
+    "src.cache",
+    "src.schema",
+    "src.transactions",
+    "src.lending.main",
+    "src.lending.split",
+    "src.lending.filter",
+    "src.rewards.calc",
+    "src.accounting.contracts",
+    "src.internal_transfers.internal_txs",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("modules", nargs="*", default=MODULES, help="modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="imports per module, the fastest is kept")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports to show per module")
+    parser.add_argument("--max-ms", type=float, help="exit with an error if any module takes longer")
+    return parser.parse_args()
+
+
+# {module: cumulative microseconds} for _module and everything imported while importing it
+def import_times(_module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {_module}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"importing {_module} failed:\n{result.stderr}")
+
+    # importtime prints each import after the ones it triggered, indented under it
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        name = name[1:]
+        imports.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative)))
+
+    if any(name == "dotenv" for _, name, _ in imports):
+        raise Exception(f"importing {_module} reads the .env")
+
+    position = max(i for i, (_, name, _) in enumerate(imports) if name == _module)
+    depth, _, total = imports[position]
+    times = {_module: total}
+    for indent, name, cumulative in reversed(imports[:position]):
+        if indent <= depth:
+            break
+        times[name] = cumulative
+    return times
+
+
+def main():
+    args = parse_args()
+
+    slow = []
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda times: times[module])
+        total_ms = best[module] / 1000
+
+        print(f"{module}: {total_ms:.1f} ms")
+        children = sorted(
+            (name for name in best if name != module), key=lambda name: best[name], reverse=True
+        )
+        for name in children[:args.top]:
+            print(f"    {name}: {best[name] / 1000:.1f} ms")
+
+        if args.max_ms is not None and total_ms > args.max_ms:
+            slow.append(module)
+
+    if slow:
+        raise Exception(f"slower to import than {args.max_ms} ms: {', '.join(slow)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import collections
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# stand-in for an etherscan-style block explorer, serving
+# module=account&action=txlist|tokentx|txlistinternal from fixtures, and the head block from
+# module=proxy&action=eth_blockNumber
+# each chain is served under its own path, e.g. http://127.0.0.1:8545/mainnet/api,
+# with its own rate limit, like the real explorers
+
+ACTIONS = ["txlist", "tokentx", "txlistinternal"]
+
+
+def _random_hex(_rng, _length):
+    return "0x" + "".join(_rng.choice("0123456789abcdef") for _ in range(_length))
+
+
+def _synthetic_record(_rng, _action, _address, _block):
+    counterparty = _random_hex(_rng, 40)
+    from_address, to_address = (_address, counterparty) if _rng.random() < 0.5 else (counterparty, _address)
+    record = {
+        "blockNumber": str(_block),
+        "timeStamp": str(1_600_000_000 + _block * 2),
+        "hash": _random_hex(_rng, 64),
+        "from": from_address,
+        "to": to_address,
+        "value": str(_rng.randint(0, 10**21)),
+        "contractAddress": "",
+        "input": "",
+        "gas": str(_rng.randint(21_000, 500_000)),
+        "gasUsed": str(_rng.randint(21_000, 300_000)),
+    }
+    if _action == "txlistinternal":
+        record.update({
+            "type": "call",
+            "traceId": "0",
+            "isError": "0",
+            "errCode": "",
+        })
+        return record
+
+    record.update({
+        "nonce": str(_rng.randint(0, 5_000)),
+        "blockHash": _random_hex(_rng, 64),
+        "transactionIndex": str(_rng.randint(0, 200)),
+        "gasPrice": str(_rng.randint(10**9, 300 * 10**9)),
+        "cumulativeGasUsed": str(_rng.randint(21_000, 30_000_000)),
+        "confirmations": str(20_000_000 - _block),
+    })
+    if _action == "txlist":
+        method = _rng.choice(["deposit(address,uint256)", "withdraw(address,uint256)", ""])
+        record.update({
+            "isError": "0",
+            "txreceipt_status": "1",
+            # the big hex call data is what makes real responses heavy
+            "input": _random_hex(_rng, 8 + 64 * _rng.randint(0, 8)),
+            "methodId": record["input"][:10],
+            "functionName": method,
+        })
+    else:
+        symbol = _rng.choice(["USDC", "WETH", "DAI", "AAVE"])
+        record.update({
+            "contractAddress": _random_hex(_rng, 40),
+            "tokenName": symbol,
+            "tokenSymbol": symbol,
+            "tokenDecimal": "6" if symbol == "USDC" else "18",
+            "input": "deprecated",
+        })
+
+    return record
+
+
+# deterministic synthetic history for every chain, action and address
+def synthetic_fixtures(_chains, _addresses, _records_per_wallet, _max_block=20_000_000, _seed=0):
+    fixtures = {}
+    for chain in _chains:
+        for action in ACTIONS:
+            for address in _addresses:
+                rng = random.Random(f"{_seed}-{chain}-{action}-{address}")
+                blocks = sorted(rng.randint(1, _max_block) for _ in range(_records_per_wallet))
+                fixtures.setdefault(chain, {}).setdefault(action, {})[address] = [
+                    _synthetic_record(rng, action, address, block) for block in blocks
+                ]
+
+    return fixtures
+
+
+# recorded fixtures are stored as {chain: {action: {address: [records]}}}
+def load_fixtures(_path):
+    with open(_path) as f:
+        return json.load(f)
+
+
+def save_fixtures(_fixtures, _path):
+    with open(_path, "w") as f:
+        json.dump(_fixtures, f)
+
+
+class MockExplorer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, _fixtures, port=0, latency=0.0, calls_per_second=None, max_records=10_000, head=None
+    ):
+        super().__init__(("127.0.0.1", port), _MockExplorerHandler)
+        self.fixtures = _fixtures
+        self.latency = latency
+        self.calls_per_second = calls_per_second
+        self.max_records = max_records
+        self.head = head
+
+        self.stats = collections.Counter()
+        self._calls = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    def _count(self, _stat, _amount=1):
+        with self._lock:
+            self.stats[_stat] += _amount
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def explorer_url(self, _chain):
+        return f"{self.url}/{_chain}/api"
+
+    # sliding one second window per chain, like the explorers' per-key limits
+    def _is_rate_limited(self, _chain):
+        if not self.calls_per_second:
+            return False
+
+        with self._lock:
+            now = time.time()
+            calls = self._calls[_chain]
+            while calls and now - calls[0] >= 1:
+                calls.popleft()
+            if len(calls) >= self.calls_per_second:
+                return True
+            calls.append(now)
+            return False
+
+    # the chain head is the highest block in the fixtures, unless head is given
+    def head_block(self, _chain):
+        if self.head is not None:
+            return self.head
+        return max(
+            (
+                int(record["blockNumber"])
+                for records_by_address in self.fixtures.get(_chain, {}).values()
+                for records in records_by_address.values()
+                for record in records
+            ),
+            default=0,
+        )
+
+    def respond(self, _chain, _params):
+        self._count("requests")
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self._is_rate_limited(_chain):
+            self._count("rate_limited")
+            return {"status": "0", "message": "NOTOK", "result": "Max rate limit reached"}
+
+        if _params.get("module") == "proxy" and _params.get("action") == "eth_blockNumber":
+            return {"jsonrpc": "2.0", "id": 83, "result": hex(self.head_block(_chain))}
+
+        if _params.get("module") != "account" or _params.get("action") not in ACTIONS:
+            return {"status": "0", "message": "NOTOK", "result": "Error! Missing Or invalid Module name"}
+
+        start_block = int(_params.get("startblock", 0))
+        end_block = int(_params.get("endblock", 99999999))
+        records = self.fixtures.get(_chain, {}).get(_params["action"], {}).get(
+            _params.get("address", "").lower(), []
+        )
+        records = [
+            record for record in records
+            if start_block <= int(record["blockNumber"]) <= end_block
+        ]
+        if "contractaddress" in _params:
+            records = [
+                record for record in records
+                if record["contractAddress"] == _params["contractaddress"].lower()
+            ]
+        if _params.get("sort") == "desc":
+            records = records[::-1]
+
+        if not records:
+            return {"status": "0", "message": "No transactions found", "result": []}
+
+        if len(records) >= self.max_records:
+            self._count("capped")
+        self._count("records", min(len(records), self.max_records))
+        return {"status": "1", "message": "OK", "result": records[:self.max_records]}
+
+
+class _MockExplorerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        chain = url.path.strip("/").split("/")[0]
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        body = json.dumps(self.server.respond(chain, params)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# run the server on a background thread, returning it so it can be shut down
+def start_mock_explorer(_fixtures, **kwargs):
+    server = MockExplorer(_fixtures, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
@@ -0,0 +1,210 @@
+import collections
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.rpc_logs import TRANSFER_TOPIC, NAME_SELECTOR, SYMBOL_SELECTOR, DECIMALS_SELECTOR
+
+
+# stand-in for an ethereum json-rpc node, serving the eth_getLogs, block, transaction,
+# receipt and erc20 metadata calls src/rpc_logs.py makes, built from the same
+# "tokentx" fixtures as the mock explorer
+# each chain is served under its own path, e.g. http://127.0.0.1:8545/mainnet
+
+def _topic(_address):
+    return "0x" + "0" * 24 + _address[2:]
+
+
+def _abi_string(_text):
+    data = _text.encode()
+    padded = data + b"\0" * (-len(data) % 32)
+    return "0x" + (32).to_bytes(32, "big").hex() + len(data).to_bytes(32, "big").hex() + padded.hex()
+
+
+class _ChainState:
+    def __init__(self, _records):
+        self.logs = []
+        self.blocks = {}
+        self.transactions = {}
+        self.tokens = {}
+
+        seen = set()
+        for record in _records:
+            key = (record["hash"], record["from"], record["to"], record["value"])
+            if key in seen:
+                continue
+            seen.add(key)
+
+            block = int(record["blockNumber"])
+            self.blocks[block] = {"timestamp": hex(int(record["timeStamp"])), "hash": record["blockHash"]}
+            self.transactions[record["hash"]] = {
+                "nonce": hex(int(record["nonce"])),
+                "gas": hex(int(record["gas"])),
+                "gasPrice": hex(int(record["gasPrice"])),
+                "gasUsed": hex(int(record["gasUsed"])),
+                "cumulativeGasUsed": hex(int(record["cumulativeGasUsed"])),
+            }
+            self.tokens[record["contractAddress"]] = (
+                record["tokenName"], record["tokenSymbol"], int(record["tokenDecimal"])
+            )
+            self.logs.append({
+                "address": record["contractAddress"],
+                "topics": [TRANSFER_TOPIC, _topic(record["from"]), _topic(record["to"])],
+                "data": hex(int(record["value"])),
+                "blockNumber": hex(block),
+                "blockHash": record["blockHash"],
+                "transactionHash": record["hash"],
+                "transactionIndex": hex(int(record["transactionIndex"])),
+                "logIndex": hex(len(self.logs)),
+                "removed": False,
+            })
+        self.logs.sort(key=lambda log: int(log["blockNumber"], 16))
+        self.head = max(self.blocks, default=0) + 10
+
+
+class MockRpc(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, _fixtures, port=0, latency=0.0, max_logs=10_000):
+        super().__init__(("127.0.0.1", port), _MockRpcHandler)
+        self.chains = {
+            chain: _ChainState([
+                record
+                for records in actions.get("tokentx", {}).values()
+                for record in records
+            ])
+            for chain, actions in _fixtures.items()
+        }
+        self.latency = latency
+        self.max_logs = max_logs
+
+        self.stats = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, _stat, _amount=1):
+        with self._lock:
+            self.stats[_stat] += _amount
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def rpc_url(self, _chain):
+        return f"{self.url}/{_chain}"
+
+    def _get_logs(self, _state, _filter):
+        from_block = int(_filter["fromBlock"], 16)
+        to_block = int(_filter["toBlock"], 16)
+        topics = _filter.get("topics", [])
+
+        logs = []
+        for log in _state.logs:
+            block = int(log["blockNumber"], 16)
+            if block < from_block or block > to_block:
+                continue
+            matches = all(
+                topic is None
+                or (log["topics"][i] in topic if isinstance(topic, list) else log["topics"][i] == topic)
+                for i, topic in enumerate(topics)
+            )
+            if matches:
+                logs.append(log)
+
+        # like most providers, refuse queries that would return too much
+        if len(logs) > self.max_logs:
+            self._count("too_many_logs")
+            raise _RpcFailure(-32005, f"query returned more than {self.max_logs} results")
+        self._count("logs", len(logs))
+        return logs
+
+    def _eth_call(self, _state, _call):
+        if _call["to"] not in _state.tokens:
+            return "0x"
+        name, symbol, decimals = _state.tokens[_call["to"]]
+        return {
+            NAME_SELECTOR: _abi_string(name),
+            SYMBOL_SELECTOR: _abi_string(symbol),
+            DECIMALS_SELECTOR: "0x" + decimals.to_bytes(32, "big").hex(),
+        }.get(_call["data"], "0x")
+
+    def _call(self, _state, _method, _params):
+        if _method == "eth_blockNumber":
+            return hex(_state.head)
+        if _method == "eth_getLogs":
+            return self._get_logs(_state, _params[0])
+        if _method == "eth_getBlockByNumber":
+            block = _state.blocks[int(_params[0], 16)]
+            return {"number": _params[0], "hash": block["hash"], "timestamp": block["timestamp"]}
+        if _method == "eth_getTransactionByHash":
+            transaction = _state.transactions[_params[0]]
+            return {
+                "hash": _params[0],
+                "nonce": transaction["nonce"],
+                "gas": transaction["gas"],
+                "gasPrice": transaction["gasPrice"],
+            }
+        if _method == "eth_getTransactionReceipt":
+            transaction = _state.transactions[_params[0]]
+            return {
+                "transactionHash": _params[0],
+                "gasUsed": transaction["gasUsed"],
+                "cumulativeGasUsed": transaction["cumulativeGasUsed"],
+                "effectiveGasPrice": transaction["gasPrice"],
+            }
+        if _method == "eth_call":
+            return self._eth_call(_state, _params[0])
+        raise _RpcFailure(-32601, f"the method {_method} does not exist")
+
+    def respond(self, _chain, _request):
+        self._count("requests")
+        if self.latency:
+            time.sleep(self.latency)
+
+        state = self.chains.get(_chain, _ChainState([]))
+        batch = _request if isinstance(_request, list) else [_request]
+        responses = []
+        for call in batch:
+            self._count("calls")
+            response = {"jsonrpc": "2.0", "id": call.get("id")}
+            try:
+                response["result"] = self._call(state, call["method"], call.get("params", []))
+            except _RpcFailure as e:
+                response["error"] = {"code": e.code, "message": e.message}
+            responses.append(response)
+
+        return responses if isinstance(_request, list) else responses[0]
+
+
+class _RpcFailure(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class _MockRpcHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        chain = self.path.strip("/").split("/")[0]
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        body = json.dumps(self.server.respond(chain, request)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# run the server on a background thread, returning it so it can be shut down
+def start_mock_rpc(_fixtures, **kwargs):
+    server = MockRpc(_fixtures, **kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+
+CACHE_DIR = os.environ.get("EXPLORER_CACHE_DIR", ".cache/explorer")
+
+# requests running up to the chain head can change, so they expire after this many seconds
+# requests for a closed block range are historical and never expire, so the paginator only
+# closes a range once it's settled below the chain head
+HEAD_TTL = int(os.environ.get("EXPLORER_CACHE_TTL", 60 * 60))
+
+# once the cache grows past this size, the least recently used responses are evicted
+MAX_CACHE_BYTES = int(os.environ.get("EXPLORER_CACHE_MAX_BYTES", 2 * 1024**3))
+
+# any request with an end block at or past this is treated as running to the chain head
+OPEN_END_BLOCK = 99999999
+
+# parameters that don't change the response, so must not change the cache key
+UNCACHED_PARAMS = ["apikey"]
+
+# when offline, responses are only ever served from the cache
+offline = os.environ.get("EXPLORER_OFFLINE", "") == "1"
+
+_eviction_lock = threading.Lock()
+# running total of the cache size, counted from disk on first write
+_cache_bytes = None
+
+
+class CacheMiss(Exception):
+    pass
+
+
+def set_offline(_offline=True):
+    global offline
+    offline = _offline
+
+
+# content address for a request: a hash of the endpoint and its parameters
+def cache_key(_url, _params):
+    params = {
+        key: str(value) for key, value in _params.items() if key not in UNCACHED_PARAMS
+    }
+    request = json.dumps({"url": _url, "params": params}, sort_keys=True)
+
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+def _cache_path(_key):
+    return os.path.join(CACHE_DIR, _key[:2], f"{_key}.json")
+
+
+def _is_expired(_path, _params):
+    if int(_params.get("endblock", OPEN_END_BLOCK)) < OPEN_END_BLOCK:
+        return False
+
+    return time.time() - os.path.getmtime(_path) > HEAD_TTL
+
+
+# path to the cached response body for a request, or None if there isn't a fresh one
+def cached_response_path(_url, _params):
+    path = _cache_path(cache_key(_url, _params))
+    try:
+        # stale responses are still better than nothing when offline
+        if not offline and _is_expired(path, _params):
+            return None
+
+        # access time drives the LRU eviction; mtime is kept for the TTL
+        os.utime(path, (time.time(), os.path.getmtime(path)))
+    except FileNotFoundError:
+        # never cached, or evicted by another thread
+        return None
+
+    return path
+
+
+# somewhere to write a response body while it streams in, before it is known to be good
+def temp_response_path():
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, f"{uuid.uuid4().hex}.tmp")
+
+
+# move a fully written response body into the cache
+def store_response(_url, _params, _temp_path):
+    path = _cache_path(cache_key(_url, _params))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(_temp_path, path)
+
+    _evict(os.path.getsize(path))
+
+
+def _cache_entries():
+    entries = []
+    for directory, _, files in os.walk(CACHE_DIR):
+        for file in files:
+            if file.endswith(".json"):
+                path = os.path.join(directory, file)
+                # another process may have evicted it since the walk listed it
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+
+    return entries
+
+
+# remove the least recently used responses until the cache fits in MAX_CACHE_BYTES
+def _evict(_added_bytes):
+    global _cache_bytes
+
+    with _eviction_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _cache_entries())
+        else:
+            _cache_bytes += _added_bytes
+        if _cache_bytes <= MAX_CACHE_BYTES:
+            return
+
+        entries = sorted(_cache_entries())
+        _cache_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if _cache_bytes <= MAX_CACHE_BYTES:
+                break
+            # the cache is shared between processes, another one may have evicted it first
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            _cache_bytes -= size
@@ -0,0 +1,109 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+
+# workbooks are written with openpyxl's write-only mode, which streams each row out
+# to the file instead of building every cell in memory first, and frames are turned
+# into rows a chunk at a time, so the memory used doesn't grow with the row count
+# frames longer than a sheet can hold carry on in numbered sheets
+# openpyxl writes the xml with lxml when it's installed, which is several times faster
+
+# rows per sheet in excel, including the header
+MAX_SHEET_ROWS = 1_048_576
+MAX_SHEET_NAME = 31
+
+CHUNK_ROWS = 10_000
+
+
+# the header, index and datetime cells look like the ones pandas writes
+# each style is built once per sheet and shared, looking it up per cell is slow
+def _styled_cells(_worksheet):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    header = WriteOnlyCell(_worksheet)
+    header.font = Font(bold=True)
+    side = Side(style="thin")
+    header.border = Border(left=side, right=side, top=side, bottom=side)
+    header.alignment = Alignment(horizontal="center", vertical="top")
+
+    datetime = WriteOnlyCell(_worksheet)
+    datetime.number_format = "YYYY-MM-DD HH:MM:SS"
+
+    def styled_cell(_value, _template):
+        # blank cells are left unstyled
+        if _value is None:
+            return None
+        cell = WriteOnlyCell(_worksheet, value=_value)
+        cell._style = _template._style
+        return cell
+
+    return lambda value: styled_cell(value, header), lambda value: styled_cell(value, datetime)
+
+
+# values openpyxl can write, with None for missing values
+def _cell_values(_series):
+    return _series.astype(object).where(_series.notna(), None).tolist()
+
+
+# the names of the sheets for a frame split into _parts sheets, e.g. all_transfers, all_transfers_2
+def sheet_names(_name, _parts):
+    names = [_name[:MAX_SHEET_NAME]]
+    for part in range(2, _parts + 1):
+        suffix = f"_{part}"
+        names.append(_name[:MAX_SHEET_NAME - len(suffix)] + suffix)
+    return names
+
+
+def _write_sheets(_workbook, _name, _df, _index, _max_rows):
+    rows_per_sheet = _max_rows - 1
+    parts = max(1, -(-len(_df) // rows_per_sheet))
+
+    for part, sheet_name in enumerate(sheet_names(_name, parts)):
+        worksheet = _workbook.create_sheet(sheet_name)
+        header_cell, datetime_cell = _styled_cells(worksheet)
+        header = ([_df.index.name] if _index else []) + list(_df.columns)
+        worksheet.append([header_cell(value) for value in header])
+
+        end = min(len(_df), (part + 1) * rows_per_sheet)
+        for start in range(part * rows_per_sheet, end, CHUNK_ROWS):
+            chunk = _df.iloc[start:min(start + CHUNK_ROWS, end)]
+            columns = []
+            for column in chunk.columns:
+                values = _cell_values(chunk[column])
+                if pd.api.types.is_datetime64_any_dtype(chunk[column]):
+                    values = [datetime_cell(value) for value in values]
+                columns.append(values)
+            if _index:
+                index_cells = [header_cell(value) for value in _cell_values(chunk.index.to_series())]
+                columns.insert(0, index_cells)
+            for row in zip(*columns):
+                worksheet.append(row)
+
+
+# write _sheets, a list of (sheet name, frame, write the index), to one workbook
+def write_workbook(_path, _sheets, max_rows=MAX_SHEET_ROWS):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for name, df, index in _sheets:
+        _write_sheets(workbook, name, df, index, max_rows)
+    workbook.save(_path)
+
+    return _path
+
+
+# write each of _sheets to its own workbook next to _path, e.g. aave_lending_all_transfers.xlsx,
+# in separate processes since building the rows is cpu bound
+def write_workbooks(_path, _sheets, max_rows=MAX_SHEET_ROWS, max_workers=None):
+    stem, extension = os.path.splitext(_path)
+    paths = [f"{stem}_{name}{extension}" for name, _, _ in _sheets]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(write_workbook, path, [sheet], max_rows)
+            for path, sheet in zip(paths, _sheets)
+        ]
+        return [future.result() for future in futures]
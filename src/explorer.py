@@ -0,0 +1,249 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import utils
+from src import cache
+from src.cache import CacheMiss, cached_response_path, temp_response_path, store_response
+from src.scheduler import TokenBucket, bucket_name
+from src.streaming import ColumnBuffer, parse_explorer_response
+
+
+# free tier explorer keys allow 5 calls per second
+DEFAULT_CALLS_PER_SECOND = 5
+
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30
+REQUEST_TIMEOUT_SECONDS = 30
+
+# connections kept alive per explorer, enough for the parallel block windows
+POOL_SIZE = 16
+
+# response bodies are read and parsed this many bytes at a time
+CHUNK_BYTES = 1 << 16
+
+
+class ExplorerError(Exception):
+    pass
+
+
+# rate limits and timeouts on the explorer side, worth retrying
+class TransientExplorerError(ExplorerError):
+    pass
+
+
+class RateLimitedError(TransientExplorerError):
+    pass
+
+
+# each explorer api key has its own budget, shared with every other job on this host
+# made on a chain's first request, since the keys come from the .env
+@functools.lru_cache(maxsize=None)
+def get_rate_limiter(chain):
+    config = utils.CHAINS[chain]
+    return TokenBucket(
+        bucket_name(config["explorer_url"], config["explorer_token"]),
+        config.get("calls_per_second", DEFAULT_CALLS_PER_SECOND),
+    )
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+# one keep-alive session per explorer, shared by every thread querying it
+def _get_session(chain):
+    with _sessions_lock:
+        if chain not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[chain] = session
+
+        return _sessions[chain]
+
+
+# the explorers' proxy to the chain's rpc, for the latest block number
+HEAD_PARAMS = {"module": "proxy", "action": "eth_blockNumber"}
+
+
+# explorers answer "status": "0" both for genuinely empty results and for errors
+# empty results have a "No ... found" message and an empty result list
+def _is_empty_result(response):
+    return (
+        response.message.startswith("No ")
+        and isinstance(response.result, ColumnBuffer)
+        and len(response.result) == 0
+    )
+
+
+def _error_text(response):
+    return f"{response.message} {response.result}".lower()
+
+
+def _is_rate_limited(response):
+    return "rate limit" in _error_text(response) or "too many" in _error_text(response)
+
+
+def _is_transient_error(response):
+    return "timeout" in _error_text(response) or "busy" in _error_text(response)
+
+
+# full jitter exponential backoff, so parallel workers don't retry in lockstep
+def backoff_seconds(attempt):
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt))
+
+
+def _read_cached(path, _new_buffer):
+    with open(path, "rb") as f:
+        return parse_explorer_response(iter(lambda: f.read(CHUNK_BYTES), b""), _new_buffer())
+
+
+def _request(chain, params, _new_buffer):
+    url = utils.CHAINS[chain]["explorer_url"]
+    rate_limiter = get_rate_limiter(chain)
+
+    rate_limiter.acquire()
+    try:
+        http_response = _get_session(chain).get(
+            url,
+            params=dict(params, apikey=utils.CHAINS[chain]["explorer_token"]),
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            stream=True,
+        )
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise TransientExplorerError(str(e))
+
+    temp_path = temp_response_path()
+    try:
+        if http_response.status_code == 429:
+            rate_limiter.on_throttle()
+            raise RateLimitedError("HTTP 429")
+        if http_response.status_code >= 500:
+            raise TransientExplorerError(f"HTTP {http_response.status_code}")
+        http_response.raise_for_status()
+
+        # the body is parsed as it arrives and copied to the cache on the way through
+        with open(temp_path, "wb") as f:
+            def chunks():
+                for chunk in http_response.iter_content(CHUNK_BYTES):
+                    f.write(chunk)
+                    yield chunk
+
+            try:
+                response = parse_explorer_response(chunks(), _new_buffer())
+            except (ValueError, requests.RequestException) as e:
+                # explorers sometimes answer with an html error page under load
+                raise TransientExplorerError(f"unreadable response: {e}")
+
+        if response.status == "1" or _is_empty_result(response):
+            rate_limiter.on_success()
+            # explorer errors like rate limits must not be replayed later
+            store_response(url, params, temp_path)
+            return response
+        if _is_rate_limited(response):
+            rate_limiter.on_throttle()
+            raise RateLimitedError(f"{response.message}: {response.result}")
+        if _is_transient_error(response):
+            raise TransientExplorerError(f"{response.message}: {response.result}")
+
+        raise ExplorerError(f"{chain}: {response.message}: {response.result}")
+    finally:
+        http_response.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+# query a chain's block explorer api, retrying rate limits and transient errors
+# the result records are streamed into a fresh buffer from _new_buffer()
+# responses are served from the on-disk cache when possible
+def get_explorer_response(chain, params, _new_buffer):
+    path = cached_response_path(utils.CHAINS[chain]["explorer_url"], params)
+    if path:
+        try:
+            return _read_cached(path, _new_buffer)
+        except FileNotFoundError:
+            # evicted between finding and reading it
+            pass
+    if cache.offline:
+        raise CacheMiss(f"No cached response for {chain} {params}")
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            return _request(chain, params, _new_buffer)
+        except TransientExplorerError as e:
+            print(f"{chain} explorer: {e}, retrying")
+            time.sleep(backoff_seconds(attempt))
+
+    return _request(chain, params, _new_buffer)
+
+
+def _request_head(chain):
+    url = utils.CHAINS[chain]["explorer_url"]
+    rate_limiter = get_rate_limiter(chain)
+
+    rate_limiter.acquire()
+    try:
+        http_response = _get_session(chain).get(
+            url,
+            params=dict(HEAD_PARAMS, apikey=utils.CHAINS[chain]["explorer_token"]),
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise TransientExplorerError(str(e))
+
+    with http_response:
+        if http_response.status_code == 429:
+            rate_limiter.on_throttle()
+            raise RateLimitedError("HTTP 429")
+        if http_response.status_code >= 500:
+            raise TransientExplorerError(f"HTTP {http_response.status_code}")
+        http_response.raise_for_status()
+
+        try:
+            body = http_response.json()
+        except ValueError as e:
+            raise TransientExplorerError(f"unreadable response: {e}")
+
+    result = str(body.get("result", ""))
+    if not result.startswith("0x"):
+        if "rate limit" in result.lower():
+            rate_limiter.on_throttle()
+            raise RateLimitedError(result)
+        raise TransientExplorerError(result)
+    rate_limiter.on_success()
+
+    temp_path = temp_response_path()
+    with open(temp_path, "w") as f:
+        json.dump(body, f)
+    store_response(url, HEAD_PARAMS, temp_path)
+    return int(result, 16)
+
+
+# the chain's latest block, cached like any request running to the chain head
+def get_chain_head(chain):
+    path = cached_response_path(utils.CHAINS[chain]["explorer_url"], HEAD_PARAMS)
+    if path:
+        try:
+            with open(path) as f:
+                return int(json.load(f)["result"], 16)
+        except FileNotFoundError:
+            pass
+    if cache.offline:
+        raise CacheMiss(f"No cached head block for {chain}")
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            return _request_head(chain)
+        except TransientExplorerError as e:
+            print(f"{chain} explorer: {e}, retrying")
+            time.sleep(backoff_seconds(attempt))
+
+    return _request_head(chain)
@@ -0,0 +1,83 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from src import utils
+
+
+# gas is always sent to the zero address
+GAS_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# the fees worked out so far, by transaction hash, shared by every stage in the process
+_fees = pd.Series([], dtype="float64")
+
+
+# each chain's base token symbol and 10**decimals, built once
+@functools.lru_cache(maxsize=None)
+def _chain_table():
+    chains = utils.CHAINS
+    return pd.DataFrame({
+        "symbol": {chain: chains[chain]["base_token_symbol"] for chain in chains},
+        "unit": pd.Series({chain: 10**chains[chain]["base_token_decimals"] for chain in chains}, dtype=object),
+    })
+
+
+# the gas paid by each of _transactions, the price times gas used in the chain's base token
+# the products don't fit in an int64 at high gas prices, so they're python ints, divided
+# exactly like one transaction at a time
+# transactions without a gas price or gas used have no fee
+def _calc_fees(_transactions):
+    known = (_transactions.gasPrice.notna() & _transactions.gasUsed.notna()).to_numpy()
+    units = _chain_table().unit.reindex(_transactions.chain.astype(object)).to_numpy()
+
+    fees = np.full(len(_transactions), np.nan)
+    prices = _transactions.gasPrice.astype(object).to_numpy()[known]
+    used = _transactions.gasUsed.astype(object).to_numpy()[known]
+    fees[known] = (prices * used / units[known]).astype("float64")
+    return fees
+
+
+# the fee of each transaction in _transactions, by its hash
+# fees are cached, so the lending, rewards and reporting stages only work out each one once
+def transaction_fees(_transactions):
+    global _fees
+
+    hashes = pd.Index(_transactions.hash)
+    new = ~hashes.isin(_fees.index)
+    if new.any():
+        transactions = _transactions[new].drop_duplicates(subset=["hash"])
+        _fees = pd.concat([_fees, pd.Series(_calc_fees(transactions), index=transactions.hash)])
+
+    return _fees.reindex(hashes).to_numpy()
+
+
+# a gas fee row for each transaction the transfers came from, the first transfer's wallet
+# and pool standing for the transaction
+# extra_columns are copied from the transfers onto the end of the rows, e.g. {"original_action": "action"}
+def calc_gas_fees(_transfers, extra_columns=None):
+    # only use one gas fee per transaction hash
+    transactions = _transfers.drop_duplicates(subset=["hash"])
+    chains = transactions.chain.astype(object)
+
+    def transfer_values(_column):
+        return transactions[_column].astype(object).to_numpy()
+
+    gas_fees = pd.DataFrame({
+        "tokenSymbol": _chain_table().symbol.reindex(chains).to_numpy(),
+        "hash": transfer_values("hash"),
+        "datetime": transactions["datetime"].to_numpy(),
+        "action": "gas_fee",
+        "transfer_from": transfer_values("from"),
+        "transfer_to": GAS_ADDRESS,
+        "amount": transaction_fees(transactions),
+        "from": transfer_values("from"),
+        "wallet": transfer_values("wallet"),
+        "wallet_name": transfer_values("wallet_name"),
+        "pool": transfer_values("to"),
+        "chain": chains.to_numpy(),
+    })
+    for column, transfer_column in (extra_columns or {}).items():
+        gas_fees[column] = transfer_values(transfer_column)
+
+    return gas_fees
@@ -1,14 +1,22 @@
+import functools
+
 from src.transactions import get_normal_transactions
-from src.utils import WALLET_LIST, CHAIN_LIST
+from src import utils
+from src.schema import apply_schema
+from src.store import query, store_exists
 
 import pandas as pd
 
 
-wallets = WALLET_LIST
-chains = CHAIN_LIST
-normal_transactions = pd.read_excel(
-    "output_files/transactions.xlsx", sheet_name="normal_transactions"
-)
+# read on first use rather than at import, from the transaction store if there is one
+@functools.lru_cache(maxsize=None)
+def load_normal_transactions():
+    if store_exists():
+        return query("normal_transactions")
+    return apply_schema(
+        pd.read_excel("output_files/transactions.xlsx", sheet_name="normal_transactions"),
+        "normal_transactions"
+    )
 
 
 # check if a given transaction is internal, given a list of wallets
@@ -61,6 +69,8 @@ def mark_internal_transactions_in_dataframe(_transfers, _wallets):
 # get all transactions and mark as internal or not
 # send output to a .csv file
 def main(verbose=False):
+    wallets = utils.WALLET_LIST
+    normal_transactions = load_normal_transactions()
     normal_transactions_marked = mark_internal_transactions_in_dataframe(
         normal_transactions, wallets
     ).drop_duplicates(subset=["hash"])
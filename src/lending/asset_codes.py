@@ -0,0 +1,89 @@
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# the lukka asset code of each token on each chain, by its symbol and, where there's one, its
+# contract address
+ASSET_CODES_PATH = os.path.join(os.path.dirname(__file__), "asset_codes.csv")
+
+
+# the registry compiled into (chain, contractAddress) -> code for the tokens listed with an
+# address, and (chain, tokenSymbol) -> code for the symbols with only one code on their chain
+# a symbol shared by tokens with different codes can only be matched by address
+@functools.lru_cache(maxsize=None)
+def load_asset_codes(_path=ASSET_CODES_PATH):
+    registry = pd.read_csv(_path, dtype=str, keep_default_na=False)
+    registry["contractAddress"] = registry.contractAddress.str.lower()
+
+    with_address = registry[registry.contractAddress != ""]
+    listed_twice = with_address.duplicated(subset=["chain", "contractAddress"], keep=False)
+    if listed_twice.any():
+        raise Exception(
+            f"Contract addresses listed more than once in {_path}: "
+            f"{sorted(set(with_address[listed_twice].contractAddress))}"
+        )
+    by_address = with_address.set_index(["chain", "contractAddress"]).asset_code
+
+    codes = registry.drop_duplicates(subset=["chain", "tokenSymbol", "asset_code"])
+    codes = codes[~codes.duplicated(subset=["chain", "tokenSymbol"], keep=False)]
+    by_symbol = codes.set_index(["chain", "tokenSymbol"]).asset_code
+
+    return by_address, by_symbol
+
+
+# the asset code of the token of each of _txs, NaN where there isn't one
+# tokens are matched by contract address when _txs have a contractAddress column and the
+# address is listed, and by symbol otherwise
+def lookup_asset_codes(_txs):
+    by_address, by_symbol = load_asset_codes()
+    chains = _txs.chain.astype(object).to_numpy()
+
+    codes = by_symbol.reindex(
+        pd.MultiIndex.from_arrays([chains, _txs.tokenSymbol.astype(object).to_numpy()])
+    ).to_numpy()
+    if "contractAddress" in _txs:
+        addresses = _txs.contractAddress.astype(object).str.lower().to_numpy()
+        address_codes = by_address.reindex(pd.MultiIndex.from_arrays([chains, addresses])).to_numpy()
+        codes = np.where(pd.isna(address_codes), codes, address_codes)
+
+    return codes
+
+
+# every token of _txs without an asset code, and how many rows it's on
+def unmapped_assets(_txs, _codes=None):
+    codes = lookup_asset_codes(_txs) if _codes is None else _codes
+    columns = ["chain", "tokenSymbol"] + (["contractAddress"] if "contractAddress" in _txs else [])
+
+    unmapped = _txs.loc[pd.isna(codes), columns].astype(object)
+    return unmapped.groupby(columns, sort=True, dropna=False).size().rename("rows").reset_index()
+
+
+# raises with every unmapped token at once, so they can all be added before exporting
+def check_asset_codes(_txs, _codes=None):
+    unmapped = unmapped_assets(_txs, _codes)
+    if not unmapped.empty:
+        raise Exception(
+            f"{len(unmapped)} assets have no asset code in {ASSET_CODES_PATH}:\n"
+            f"{unmapped.to_string(index=False)}"
+        )
+
+
+# the asset codes of _txs, raising if any token doesn't have one
+def asset_codes(_txs):
+    codes = lookup_asset_codes(_txs)
+    check_asset_codes(_txs, codes)
+    return codes
+
+
+# report the tokens of the split transactions that still need an asset code
+if __name__ == "__main__":
+    from src.lending.filter import filter_split_txs, load_deposits_and_borrows
+
+    unmapped = unmapped_assets(filter_split_txs(load_deposits_and_borrows()))
+    if unmapped.empty:
+        print("Every asset has an asset code")
+    else:
+        print(unmapped.to_string(index=False))
@@ -0,0 +1,47 @@
+import json
+import os
+
+import pandas as pd
+
+
+# the rows exported last time, in the directory the accounts' files are written to
+EXPORT_INDEX_NAME = "exported_ids.json"
+
+
+# the index is stored as {account: {transaction_id: fingerprint}}, an account being the name of
+# a wallet and chain's file, and a fingerprint a hash of everything in the exported row
+def load_export_index(_output_dir):
+    path = f"{_output_dir}/{EXPORT_INDEX_NAME}"
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+# write to a temporary file first so a crash can't leave half an index
+def save_export_index(_index, _output_dir):
+    path = f"{_output_dir}/{EXPORT_INDEX_NAME}"
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(_index, f, indent=4, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+# {transaction_id: fingerprint} for the formatted rows of an account
+def fingerprint_rows(_formatted_txs):
+    fingerprints = pd.util.hash_pandas_object(_formatted_txs.astype(str), index=False)
+    return dict(zip(_formatted_txs.transaction_id, fingerprints.to_numpy().tolist()))
+
+
+# the formatted rows that are new or have changed since the account's last export, and the ids
+# of the rows exported last time that are gone
+def diff_export(_formatted_txs, _fingerprints, _exported):
+    ids = _formatted_txs.transaction_id.to_numpy()
+    exported = pd.Series(_exported, dtype=object).reindex(ids).to_numpy()
+    current = _formatted_txs.transaction_id.map(_fingerprints).to_numpy()
+
+    changed_txs = _formatted_txs[exported != current]
+    removed_ids = sorted(set(_exported) - set(_fingerprints))
+
+    return changed_txs, removed_ids
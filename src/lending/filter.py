@@ -1,9 +1,21 @@
+import argparse
+import functools
+import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from src.lending.asset_codes import check_asset_codes
+from src.lending.exports import (
+    EXPORT_INDEX_NAME, diff_export, fingerprint_rows, load_export_index, save_export_index
+)
 from src.lending.formatting import format_split_txs 
 
-deposits_and_borrows = pd.read_csv("output_files/lending/deposits_and_borrows.csv")
+
+# read the split output on first use rather than at import
+@functools.lru_cache(maxsize=None)
+def load_deposits_and_borrows():
+    return pd.read_csv("output_files/lending/deposits_and_borrows.csv")
 
 
 # helper function to extract out all the gas fees for the filtered transactions 
@@ -56,51 +68,113 @@ def filter_split_txs(_deposits_and_borrows):
     return split_txs
 
 
-# split txs by accounts between wallets and chain to match lukka system for accounts
-def print_txs_by_account(_deposits_and_borrows, _output_dir="output_files/split_txs"):
-    split_txs = filter_split_txs(_deposits_and_borrows)
+# format and write one account's transactions, in a worker process when there's more than one
+# with _exported, the account's fingerprints from the last export, only the rows that are new
+# or have changed are written, to {account}_changes.csv, with the ids of the rows that are gone
+# in {account}_removed.csv
+# returns the number of rows formatted, their fingerprints, the hashes written and the number
+# of rows removed
+def _export_account(_account, _txs, _output_dir, _exported=None):
+    formatted_txs = format_split_txs(_txs)
+    fingerprints = fingerprint_rows(formatted_txs)
 
-    # get all wallets and chains
-    wallets = split_txs.wallet_name.unique()
-    chains = split_txs.chain.unique()
+    removed_ids = []
+    if _exported is None:
+        formatted_txs.to_csv(f"{_output_dir}/{_account}.csv", index=False)
+        written_txs = formatted_txs
+    else:
+        written_txs, removed_ids = diff_export(formatted_txs, fingerprints, _exported)
+        _write_delta(_account, written_txs, removed_ids, _output_dir)
+
+    hashes = written_txs.blockchain_transaction_id.unique().tolist()
+    return len(formatted_txs), fingerprints, hashes, len(written_txs), len(removed_ids)
+
+
+def _write_delta(_account, _changed_txs, _removed_ids, _output_dir):
+    _changed_txs.to_csv(f"{_output_dir}/{_account}_changes.csv", index=False)
+    pd.DataFrame({"transaction_id": _removed_ids}, dtype=object).to_csv(
+        f"{_output_dir}/{_account}_removed.csv", index=False
+    )
 
-    total_txs_check = 0
-    total_txs = len(split_txs)
 
+# split txs by accounts between wallets and chain to match lukka system for accounts
+# the txs are grouped by account once, and with more than one worker (None for one per cpu)
+# the accounts are formatted and written across processes, the largest first
+# the rows exported are indexed by transaction id in the output directory, and with delta only
+# the rows that are new or have changed since the last export are written
+def print_txs_by_account(_deposits_and_borrows, _output_dir="output_files/split_txs", delta=False, max_workers=1):
+    split_txs = filter_split_txs(_deposits_and_borrows)
+    # every asset without a code is reported before any account is formatted
+    check_asset_codes(split_txs)
+    exported_index = load_export_index(_output_dir) if delta else {}
+
+    # accounts in the order of their wallets, then chains, first appearing
+    wallets = list(split_txs.wallet_name.unique())
+    chains = list(split_txs.chain.unique())
+    accounts = sorted(
+        split_txs.groupby(["wallet_name", "chain"], sort=False),
+        key=lambda group: (wallets.index(group[0][0]), chains.index(group[0][1])),
+    )
+
+    def export_args(_group):
+        (wallet_name, chain), these_txs = _group
+        account = f"{wallet_name}_{chain}"
+        exported = exported_index.get(account, {}) if delta else None
+        return account, these_txs, _output_dir, exported
+
+    workers = max_workers or os.cpu_count()
+    if workers == 1 or len(accounts) <= 1:
+        results = [_export_account(*export_args(group)) for group in accounts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            largest_first = sorted(range(len(accounts)), key=lambda i: -len(accounts[i][1]))
+            futures = {i: executor.submit(_export_account, *export_args(accounts[i])) for i in largest_first}
+            results = [futures[i].result() for i in range(len(accounts))]
+
+    export_index = {}
     hash_list = pd.DataFrame()
-    for wallet_name in wallets:
-        for chain in chains:
-            # filter frame for this wallet and chain only
-            these_txs = split_txs[
-                (split_txs['wallet_name'] == wallet_name) & 
-                (split_txs['chain'] == chain)
-            ]
-            # output txs to separate csv if the filter is non-empty
-            if not these_txs.empty:
-                these_hashes = these_txs.hash.unique().tolist()
-                i = 0
-                group_hashes = []
-                while i < len(these_hashes):
-                    group_hashes += [",".join(these_hashes[i:i+20])]
-                    i += 20
-
-                temp_hash_list = pd.DataFrame({f"{wallet_name} {chain}": group_hashes})
-                hash_list = pd.concat([hash_list, temp_hash_list])
-
-                these_txs = format_split_txs(these_txs)
-
-                these_txs.to_csv(f'{_output_dir}/{wallet_name}_{chain}.csv', index=False)
-                total_txs_check += len(these_txs)
+    total_txs_check = 0
+    for ((wallet_name, chain), _), (rows, fingerprints, hashes, changed, removed) in zip(accounts, results):
+        account = f"{wallet_name}_{chain}"
+        export_index[account] = fingerprints
+        total_txs_check += rows
+        if delta:
+            print(f"{account}: {changed} new or changed, {removed} removed")
+
+        group_hashes = [",".join(hashes[i:i+20]) for i in range(0, len(hashes), 20)]
+        hash_list = pd.concat([hash_list, pd.DataFrame({f"{wallet_name} {chain}": group_hashes})])
+
+    # accounts with nothing left to export only have removals
+    for account in exported_index.keys() - export_index.keys():
+        print(f"{account}: 0 new or changed, {len(exported_index[account])} removed")
+        _write_delta(account, format_split_txs(split_txs.iloc[:0]), sorted(exported_index[account]), _output_dir)
 
     hash_list.to_csv(f"{_output_dir}/hash_list.csv", index=False)
 
     # transactions added must equal total transactions in starting dataframe
-    assert total_txs_check == total_txs
+    assert total_txs_check == len(split_txs)
+
+    # only replace the index once the files it describes have been written
+    save_export_index(export_index, _output_dir)
 
 
-def main():
-    print_txs_by_account(deposits_and_borrows)
+def main(delta=False, max_workers=1):
+    print_txs_by_account(load_deposits_and_borrows(), delta=delta, max_workers=max_workers)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help=f"only write the rows that changed since the last export, as indexed in {EXPORT_INDEX_NAME}",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes to write the accounts' files across, 0 for one per cpu",
+    )
+    args = parser.parse_args()
+
+    main(delta=args.delta, max_workers=args.workers or None)
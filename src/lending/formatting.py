@@ -1,7 +1,10 @@
+import hashlib
+
+import numpy as np
 import pandas as pd
-import random
 
-from src.utils import WALLET_LIST
+from src.lending.asset_codes import asset_codes
+from src import utils
 
 
 map_action_to_type = {
@@ -13,246 +16,95 @@ map_action_to_type = {
     "gas_fee": "Expense"
 }
 
-map_asset_to_assetcode = {
-    'polygon':
-        {
-            'AAVE': 'AAVE1',
-            'ADDY': 'ADDY',
-            'DAI': 'DAI2',
-            'LITHIUM': 'LITHIUM',
-            'MYFRIENDS': 'MYFRIENDS',
-            'ARCADIUM': 'ARCADIUM',
-            'MIM-3LP3CRV-f': 'MIM3LP3RCVFGAUGE',
-            'MATIC': 'MATIC1',
-            'SUSHI': 'SUSHI3',
-            'USDC': 'USDC1',
-            'USDT': 'USDT1',
-            'WBTC': 'WBTC2',
-            'WETH': 'WETH2',
-            'SLP': 'SLP6D',
-            'WLP': 'WLP',
-            'UNI-V2': 'UNIV2AF',
-            'aPolSUSHI': 'APOLSUSHI',
-            'amAAVE': 'AMAAVE',
-            'amDAI': 'AMDAI',
-            'amUSDC': 'AMUSDC',
-            'amUSDT': 'AMUSDT',
-            'amWBTC': 'AMWBTC',
-            'amWETH': 'AMWETH',
-            'amWMATIC': 'AMWMATIC',
-            'variableDebtmUSDC': 'VARIABLEDEBTMUSDC',
-            'variableDebtmUSDT': 'VARIABLEDEBTMUSDT',
-            'variableDebtmWMATIC': 'VARIABLEDEBTMWMATIC'
-        },
-    'avalanche':
-        {
-            'AVAX': 'AVAX',
-            'bAVAX': 'BAVAX',
-            'variableDebtgAVAX': 'VARIABLEDEBTGAVAX'
-        },
-    'mainnet':
-        {
-            'BMI': 'BMI1',
-            'CRV': 'CRV',
-            'CVX': 'CVX',
-            'ETH': 'ETH',
-            'WETH': 'WETH',
-            'LINK': 'LINK',
-            'LOOKS': 'LOOKS',
-            'MIM-3LP3CRV-f': 'MIM3LP3RCVFGAUGE',
-            'USDC': 'USDC',
-            'USDT': 'USDT',
-            'YFI': 'YFI',
-            'aCRV': 'ACRV',
-            'aCVX': 'ACVX',
-            'aLINK': 'ALINK1',
-            'aUSDC': 'AUSDC1',
-            'aUSDT': 'AUSDT1',
-            'aXSUSHI': 'AXSUSHI',
-            'aYFI': 'AYFI1',
-            'sUSD': 'NUSD',
-            'variableDebtCRV': 'VARIABLEDEBTCRV',
-            'variableDebtSUSD': 'VARIABLEDEBTSUSD',
-            'variableDebtUSDT': 'VARIABLEDEBTUSDT',
-            'xSUSHI': 'XSUSHI',
-            'ibEUR': 'IBEUR',
-            'ibGBP': 'IBGBP',
-        },
-    'fantom':
-        {
-            'FTM': 'FTM1',
-            'gFTM': 'GFTM',
-            'USDC': 'USDC6',
-            'FRAX': 'FFRAX'
-        }
-}
-
-
-def _is_tx_in(_tx) -> bool:
-    return _tx.transfer_to in WALLET_LIST
-
-
-def _make_row(_tx, _type, _sub_type, _notes):
-    row = pd.DataFrame(
-        [
-            {
-                "type": _type,
-                "sub_type": _sub_type,
-                "ref_data_exchange": "",
-                "asset": map_asset_to_assetcode[_tx.chain][_tx.tokenSymbol],
-                "amount": _tx.amount,
-                "counter_asset_code": "",
-                "counter_asset_amount": "",
-                "fee_asset_code": "",
-                "fee_asset_amount": "",
-                "rebate_asset_code": "",
-                "rebate_asset_amount": "",
-                "rate": "",
-                "txn_complete_ts": _tx.datetime.replace(" ", "T"),
-                "transaction_id": f"{_tx.hash}-{random.random()}",
-                "order_id": "",
-                "from_address": _tx.transfer_from,
-                "to_address": _tx.transfer_to,
-                "contract_address": _tx.pool,
-                "blockchain_transaction_id": _tx.hash,
-                "blockchain_address": _tx.wallet,
-                "counterparty": "",
-                "notes": _notes,
-                "tags": "",
-            }
-        ]
-    )
-
-    return row
-
-
-def _handle_borrow(_tx):
-    type_ = "Deposit" if _is_tx_in(_tx) else "Withdrawal"
-    sub_type = "Crypto Loan In" if _is_tx_in(_tx) else "Crypto Loan Out"
-    notes = "_borrow"
-
-    return _make_row(_tx, type_, sub_type, notes)
-
-
-def _handle_deposit(_tx):
-    type_ = "Deposit" if _is_tx_in(_tx) else "Withdrawal"
-    sub_type = "Crypto Loan In" if _is_tx_in(_tx) else "Crypto Loan Out"
-    notes = "_lending_deposit"
-    
-    return _make_row(_tx, type_, sub_type, notes)
-
-
-def _handle_repay_interest(_tx):
-    type_ = "Income" if _is_tx_in(_tx) else "Expense"
-    sub_type = "Interest"
-    notes = "_repay_interest"
-
-    return _make_row(_tx, type_, sub_type, notes)
-
-
-def _handle_repay_principal(_tx):
-    if _is_tx_in(_tx):
-        type_ = "Deposit"
-        sub_type = "Crypto Loan In"
-    else:
-        type_ = "Withdrawal"
-        sub_type = "Crypto Loan Out"
-    notes = "_repay_principal"
-
-    return _make_row(_tx, type_, sub_type, notes)
-
-
-def _handle_withdraw_interest(_tx):
-    type_ = "Income" if _is_tx_in(_tx) else "Expense"
-    sub_type = "Interest"
-    notes = "_withdraw_interest"
-
-    return _make_row(_tx, type_, sub_type, notes)
-
-
-def _handle_withdraw_principal(_tx):
-    if _is_tx_in(_tx):
-        type_ = "Deposit"
-        sub_type = "Crypto Loan In"
-    else:
-        type_ = "Withdrawal"
-        sub_type = "Crypto Loan Out"
-    notes = "_withdraw_principal"
-
-    return _make_row(_tx, type_, sub_type, notes)
-
-
-def _handle_dummy_income(_tx):
-    type_ = "Income"
-    sub_type = "Interest"
-    notes = "_dummy_income"
-
-    return _make_row(_tx, type_, sub_type, notes)
-
-
-def _handle_gas(_tx):
-    return pd.DataFrame(
-        [
-            {
-                "type": "Expense",
-                "sub_type": "Other",
-                "ref_data_exchange": "",
-                "asset": map_asset_to_assetcode[_tx.chain][_tx.tokenSymbol],
-                "amount": 0,
-                "counter_asset_code": "",
-                "counter_asset_amount": "",
-                "fee_asset_code": map_asset_to_assetcode[_tx.chain][_tx.tokenSymbol],
-                "fee_asset_amount": _tx.amount,
-                "rebate_asset_code": "",
-                "rebate_asset_amount": "",
-                "rate": "",
-                "txn_complete_ts": _tx.datetime.replace(" ", "T"),
-                "transaction_id": f"{_tx.hash}-{random.random()}",
-                "order_id": "",
-                "from_address": _tx.transfer_from,
-                "to_address": _tx.transfer_to,
-                "contract_address": _tx.pool,
-                "blockchain_transaction_id": _tx.hash,
-                "blockchain_address": _tx.wallet,
-                "counterparty": "",
-                "notes": "gas",
-                "tags": "",
-            }
-        ]
-    )
-
-
-def _handle_tx(_tx):
-    if _tx.action == 'deposit':
-        row = _handle_deposit(_tx)
-    elif _tx.action == 'borrow':
-        row = _handle_borrow(_tx)
-    elif _tx.action == 'repay_interest':
-        row = _handle_repay_interest(_tx)
-    elif _tx.action == 'repay_principal':
-        row = _handle_repay_principal(_tx)
-    elif _tx.action == 'withdraw_interest':
-        row = _handle_withdraw_interest(_tx)
-    elif _tx.action == 'withdraw_principal':
-        row = _handle_withdraw_principal(_tx)
-    elif _tx.action == 'dummy_income':
-        row = _handle_dummy_income(_tx)
-    elif _tx.action == 'gas_fee':
-        row = _handle_gas(_tx)
-    else:
-        raise Exception(f"Transaction action {_tx.action} not recognized")
-
-    return row
+# the lukka type and sub type of each action's rows when the transfer is into one of the wallets,
+# and when it's out of them, and the notes the rows get
+map_action_to_lukka = pd.DataFrame.from_dict(
+    {
+        "deposit": ["Deposit", "Crypto Loan In", "Withdrawal", "Crypto Loan Out", "_lending_deposit"],
+        "borrow": ["Deposit", "Crypto Loan In", "Withdrawal", "Crypto Loan Out", "_borrow"],
+        "repay_principal": ["Deposit", "Crypto Loan In", "Withdrawal", "Crypto Loan Out", "_repay_principal"],
+        "withdraw_principal": ["Deposit", "Crypto Loan In", "Withdrawal", "Crypto Loan Out", "_withdraw_principal"],
+        "repay_interest": ["Income", "Interest", "Expense", "Interest", "_repay_interest"],
+        "withdraw_interest": ["Income", "Interest", "Expense", "Interest", "_withdraw_interest"],
+        "dummy_income": ["Income", "Interest", "Income", "Interest", "_dummy_income"],
+        "gas_fee": ["Expense", "Other", "Expense", "Other", "gas"],
+    },
+    orient="index",
+    columns=["in_type", "in_sub_type", "out_type", "out_sub_type", "notes"],
+)
+
+
+# a transaction id that's the same every time the same row is exported: the hash, and a digest of
+# the wallet, the action and which of the hash's rows for that wallet and action it is
+def _transaction_ids(_txs):
+    ordinals = _txs.groupby(["hash", "wallet", "action"], sort=False, dropna=False).cumcount().to_numpy()
+    return [
+        f"{hash_}-{hashlib.blake2b(f'{wallet}-{action}-{ordinal}'.encode(), digest_size=8).hexdigest()}"
+        for hash_, wallet, action, ordinal in zip(_txs.hash, _txs.wallet, _txs.action, ordinals)
+    ]
+
+
+def _is_tx_in(_txs):
+    return _txs.transfer_to.isin(utils.WALLET_LIST).to_numpy()
 
 
 # format the split transactions dataframe to have the right columns for uploading to Lukka
+# every row is formatted at once, the same as formatting one transaction at a time and
+# concatenating the rows
 def format_split_txs(split_txs):
-    formatted_txs = pd.DataFrame()
-
-    for _, tx in split_txs.iterrows(): 
-        row = _handle_tx(tx)
-        
-        formatted_txs = pd.concat([formatted_txs, row])
-
-    formatted_txs.reset_index(drop=True, inplace=True)
-    return formatted_txs.copy()
+    actions = split_txs.action.astype(object).to_numpy()
+    lukka = map_action_to_lukka.reindex(actions)
+    unknown = lukka.notes.isna().to_numpy()
+    if unknown.any():
+        raise Exception(f"Transaction action {actions[unknown][0]} not recognized")
+
+    tx_in = _is_tx_in(split_txs)
+    gas = actions == "gas_fee"
+    assets = asset_codes(split_txs)
+    amounts = split_txs.amount.to_numpy()
+    blank = np.full(len(split_txs), "", dtype=object)
+
+    # a gas row's amount is its fee, and with only gas rows the columns keep the types a
+    # single gas row has
+    if gas.all():
+        amount = np.zeros(len(split_txs), dtype="int64")
+        fee_asset_code = assets
+        fee_asset_amount = amounts
+    else:
+        amount = np.where(gas, 0, amounts)
+        fee_asset_code = np.where(gas, assets, blank)
+        fee_asset_amount = blank.copy()
+        fee_asset_amount[gas] = amounts[gas]
+
+    def tx_values(_column):
+        return split_txs[_column].to_numpy()
+
+    hashes = tx_values("hash")
+
+    formatted_txs = pd.DataFrame({
+        "type": np.where(tx_in, lukka.in_type, lukka.out_type),
+        "sub_type": np.where(tx_in, lukka.in_sub_type, lukka.out_sub_type),
+        "ref_data_exchange": blank,
+        "asset": assets,
+        "amount": amount,
+        "counter_asset_code": blank,
+        "counter_asset_amount": blank,
+        "fee_asset_code": fee_asset_code,
+        "fee_asset_amount": fee_asset_amount,
+        "rebate_asset_code": blank,
+        "rebate_asset_amount": blank,
+        "rate": blank,
+        "txn_complete_ts": split_txs.datetime.str.replace(" ", "T", regex=False).to_numpy(),
+        "transaction_id": _transaction_ids(split_txs),
+        "order_id": blank,
+        "from_address": tx_values("transfer_from"),
+        "to_address": tx_values("transfer_to"),
+        "contract_address": tx_values("pool"),
+        "blockchain_transaction_id": hashes,
+        "blockchain_address": tx_values("wallet"),
+        "counterparty": blank,
+        "notes": lukka.notes.to_numpy(),
+        "tags": blank,
+    })
+
+    return formatted_txs
@@ -0,0 +1,61 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+LEDGER_PATH = "output_files/lending/position_ledger.json"
+
+
+# each position's checkpoint is stored as {wallet: {pool: {token: checkpoint}}}, where a
+# checkpoint is the datetime of the last transfer split, the number of the position's
+# transfers split up to then, and the running totals after it: added, taken out and interest
+# for the deposit and the borrow position
+def load_ledger(_path=LEDGER_PATH):
+    if not os.path.exists(_path):
+        return {}
+
+    with open(_path) as f:
+        return json.load(f)
+
+
+# write to a temporary file first so a crash can't leave half a ledger
+def save_ledger(_ledger, _path=LEDGER_PATH):
+    temp_path = f"{_path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(_ledger, f, indent=4, sort_keys=True)
+    os.replace(temp_path, _path)
+
+
+def get_checkpoint(_ledger, _wallet, _pool, _token):
+    return _ledger.get(_wallet, {}).get(_pool, {}).get(_token)
+
+
+def set_checkpoint(_ledger, _wallet, _pool, _token, _datetime, _transfers, _totals):
+    _ledger.setdefault(_wallet, {}).setdefault(_pool, {})[_token] = {
+        "datetime": pd.Timestamp(_datetime).isoformat(),
+        "transfers": int(_transfers),
+        "totals": _totals,
+    }
+
+    return _ledger
+
+
+# how many of a position's transfers, sorted by datetime, the checkpoint is past
+# raises if that's not the number it was saved after, since the history before it has changed
+# and only a full replay can give the same rows
+def checkpoint_position(_checkpoint, _datetimes, _name):
+    if _checkpoint is None:
+        return 0
+
+    split = int(np.searchsorted(
+        _datetimes, pd.Timestamp(_checkpoint["datetime"]).to_datetime64(), side="right"
+    ))
+    if split != _checkpoint["transfers"]:
+        raise Exception(
+            f"{_name} has {split} transfers up to its checkpoint, not {_checkpoint['transfers']}, "
+            f"the ledger has to be rebuilt"
+        )
+
+    return split
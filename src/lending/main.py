@@ -1,18 +1,22 @@
-import pandas as pd
+import argparse
 from datetime import date
 
-from src.transactions import (
-    get_normal_transactions, 
-    get_token_transfers, 
-    get_internal_transactions, 
-    merge_transactions_and_token_transfers
-)
-from src.lending.split import get_deposits_and_borrows
-from src.lending.filter import filter_deposits_and_withdrawals, filter_borrows_and_repayments, filter_split_txs
-from src.utils import CHAIN_LIST, WALLET_LIST, POOL_LIST
+from src.cache import set_offline
 
 
-def build_lending_excel_sheet(_wallets, _pools, _chains, verbose=False):
+def build_lending_excel_sheet(_wallets, _pools, _chains, verbose=False, separate_files=False, max_workers=1):
+    # the pipeline is imported here, so the cli starts (and --help answers) without
+    # loading pandas
+    from src.transactions import (
+        get_normal_transactions, 
+        get_token_transfers, 
+        get_internal_transactions, 
+        merge_transactions_and_token_transfers
+    )
+    from src.lending.split import get_deposits_and_borrows
+    from src.lending.filter import filter_deposits_and_withdrawals, filter_borrows_and_repayments, filter_split_txs
+    from src.excel import write_workbook, write_workbooks
+
     if verbose:
         print("Downloading normal transactions")
     normal_transactions = get_normal_transactions(_wallets, _chains)
@@ -38,7 +42,7 @@ def build_lending_excel_sheet(_wallets, _pools, _chains, verbose=False):
     # get all the relevant dataframes
     if verbose:
         print("Getting collateral and borrow history")
-    deposits_and_borrows = get_deposits_and_borrows(all_transfers, POOL_LIST)
+    deposits_and_borrows = get_deposits_and_borrows(all_transfers, _pools, max_workers)
 
     if verbose:
         print("Filtering collateral and borrowing transactions")
@@ -51,36 +55,54 @@ def build_lending_excel_sheet(_wallets, _pools, _chains, verbose=False):
 
     # put everything to excel
     path = f"output_files/lending/aave_lending_{date.today()}.xlsx"
-    with pd.ExcelWriter(path) as writer:
-        if verbose:
-            print("Writing to excel")
-
-        normal_transactions.to_excel(
-            writer, sheet_name="normal_transactions", index=False
-        )
-        all_transfers.to_excel(writer, sheet_name="all_transfers")
-        deposits_and_withdrawals.to_excel(
-            writer, sheet_name="deposits_and_withdrawals", index=False
-        )
-        borrows_and_repayments.to_excel(
-            writer, sheet_name="borrows_and_repayments", index=False
-        )
-        split_txs.to_excel(
-            writer, sheet_name="split_txs", index=False
-        )
-        if verbose:
-            print("Done!")
+    sheets = [
+        ("normal_transactions", normal_transactions, False),
+        ("all_transfers", all_transfers, True),
+        ("deposits_and_withdrawals", deposits_and_withdrawals, False),
+        ("borrows_and_repayments", borrows_and_repayments, False),
+        ("split_txs", split_txs, False),
+    ]
+    if verbose:
+        print("Writing to excel")
+    if separate_files:
+        write_workbooks(path, sheets)
+    else:
+        write_workbook(path, sheets)
+    if verbose:
+        print("Done!")
 
     return True
 
 
-def main(verbose=False):
+def main(verbose=False, separate_files=False, max_workers=1):
+    from src.utils import CHAIN_LIST, WALLET_LIST, POOL_LIST
+
     wallets = WALLET_LIST
     pools = POOL_LIST
     chains = CHAIN_LIST
 
-    build_lending_excel_sheet(wallets, pools, chains, verbose)
+    build_lending_excel_sheet(wallets, pools, chains, verbose, separate_files, max_workers)
 
 
 if __name__ == "__main__":
-    main(verbose=True)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="serve explorer responses only from the cache, never the network",
+    )
+    parser.add_argument(
+        "--separate-files",
+        action="store_true",
+        help="write each sheet to its own workbook, concurrently",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="processes to split the lending positions across, 0 for one per cpu",
+    )
+    args = parser.parse_args()
+    set_offline(args.offline)
+
+    main(verbose=True, separate_files=args.separate_files, max_workers=args.workers or None)
@@ -1,8 +1,53 @@
+import argparse
+import functools
+import os
+import numpy as np
 import pandas as pd
 
-from src.utils import POOL_LIST, CHAINS, h_POOL_LIST, generic_vault_list, qi_dao_vaults
+from src import utils
+from src.utils import h_POOL_LIST, generic_vault_list, qi_dao_vaults
+from src.gas import calc_gas_fees
+from src.lending.ledger import LEDGER_PATH, load_ledger, save_ledger, get_checkpoint, set_checkpoint, checkpoint_position
+from src.positions import (
+    DEPOSIT_TOTALS,
+    BORROW_TOTALS,
+    DEPOSIT_ROW,
+    WITHDRAW_ROW,
+    BORROW_ROW,
+    REPAY_ROW,
+    Position,
+    PositionRows,
+    map_positions,
+    position_order,
+)
+from src.storage import load_frame
+from src.store import query, store_exists
+
+# the only columns the pool split looks at
+TRANSFER_COLUMNS = [
+    "hash", "datetime", "action", "from", "to", "transferFrom", "transferTo",
+    "tokenSymbol", "amount_fixed", "gasPrice", "gasUsed", "wallet", "wallet_name", "chain",
+]
+# the ones the split rows are made from, all a worker is sent
+SPLIT_COLUMNS = [column for column in TRANSFER_COLUMNS if column not in ["gasPrice", "gasUsed"]]
+
+DEPOSITS_AND_BORROWS_PATH = "output_files/lending/deposits_and_borrows.csv"
+# its columns, in the order they're written
+DEPOSITS_AND_BORROWS_COLUMNS = [
+    "tokenSymbol", "hash", "datetime", "action", "transfer_from", "transfer_to", "amount", "from",
+    *DEPOSIT_TOTALS, *BORROW_TOTALS, "wallet", "wallet_name", "pool", "chain", "category",
+]
+
+
+# the transfers sent to the pools, read on first use rather than at import
+# the transaction store only reads those rows, the exported files are read whole
+@functools.lru_cache(maxsize=None)
+def load_pool_transfers():
+    if store_exists():
+        return query("all_transfers", TRANSFER_COLUMNS, to=utils.POOL_LIST)
+    return get_pool_transfers(load_frame("all_transfers", TRANSFER_COLUMNS), utils.POOL_LIST)
+
 
-all_transfers = pd.read_csv("output_files/all_transfers.csv")
 # rebasing tokens representing deposit positions on AAVE
 deposit_tokens = [
     "bAVAX",
@@ -33,409 +78,86 @@ action_categories = {
     "gas_fee": 2,
 }
 
+# the functions called on the pools for each kind of transfer
+deposit_actions = ['deposit','depositETH','supply','supplyETH','depositAll','depositCollateral']
+withdraw_actions = ['withdraw','withdrawETH','withdrawAll','withdrawCollateral']
+borrow_actions = ['borrow','borrowETH','borrowToken']
+repay_actions = ['repay','repayETH','repayBorrow','payBackToken']
 
-def _is_deposit(_tx):
-    return _tx.action in ['deposit','depositETH','supply','supplyETH','depositAll','depositCollateral']
-
-
-def _is_withdraw(_tx):
-    return _tx.action in ['withdraw','withdrawETH','withdrawAll','withdrawCollateral']
-
-
-def _is_borrow(_tx):
-    return _tx.action in ['borrow','borrowETH','borrowToken']
-
-
-def _is_repay(_tx):
-    return _tx.action in ['repay','repayETH','repayBorrow','payBackToken']
-
-
-def _handle_deposit(_tx, _temp_deposits, _temp_withdraws, _temp_interest):
-    # check if amount is to us or from us
-    amount = _tx.amount_fixed
-    if _tx['from'] == _tx.wallet:
-        amount = amount
-    elif _tx.transferTo == _tx.wallet:
-        amount = -amount
-    else:
-        raise Exception(f"transfer is neither to nor from one of our wallets")
-    if _tx.tokenSymbol in deposit_tokens:
-        return _handle_borrow(_tx, _temp_deposits, _temp_withdraws, _temp_interest)
 
-    new_deposits = _temp_deposits + amount
-    row = pd.DataFrame(
+# the kind of each transfer, whether it's against the borrow position rather than the
+# deposit position, and its amount, positive when it adds to its kind
+def _transfer_kinds(_pool_transfers):
+    action = _pool_transfers.action
+    kinds = np.select(
         [
-            {
-                "tokenSymbol": _tx.tokenSymbol,
-                "hash": _tx.hash,
-                "datetime": _tx.datetime,
-                "action": "deposit",
-                "from": _tx['from'],
-                "transfer_from": _tx.transferFrom,
-                "transfer_to": _tx.transferTo,
-                "amount": amount,
-                "total_deposits": new_deposits,
-                "total_withdraws": _temp_withdraws,
-                "total_deposit_interest": _temp_interest,
-                "wallet": _tx.wallet,
-                "wallet_name": _tx.wallet_name,
-                "pool": _tx.pool,
-                "chain": _tx.chain,
-            },
-        ]
+            action.isin(deposit_actions),
+            action.isin(borrow_actions),
+            action.isin(withdraw_actions),
+            action.isin(repay_actions),
+        ],
+        [DEPOSIT_ROW, BORROW_ROW, WITHDRAW_ROW, REPAY_ROW],
+        -1,
     )
-
-    return row, new_deposits, _temp_withdraws, _temp_interest
-
-
-def _handle_withdraw(_tx, _temp_deposits, _temp_withdraws, _temp_interest):
-    amount = _tx.amount_fixed
-
-    # TODO: we need a way to deal with a tokens since they are moving in 
-    # the opposite direction as the main tokens
-    if _tx.transferTo == _tx.wallet:
-        amount = amount
-    elif _tx['from'] == _tx.wallet:
-        amount = -amount 
-    else:
-        raise Exception(f"transfer is neither to nor from one of our wallets {_tx.hash}")
-    if _tx.tokenSymbol in deposit_tokens:
-        return _handle_repay(_tx, _temp_deposits, _temp_withdraws, _temp_interest)
-
-    if _temp_withdraws < _temp_deposits: # there is principal
-        if _temp_withdraws + amount > _temp_deposits + _temp_interest: # also interest
-            principal_amount = _temp_deposits + _temp_interest - _temp_withdraws
-            interest_amount = amount - principal_amount
-            
-            row = pd.DataFrame(
-                [
-                    # principal
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_principal",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": principal_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + principal_amount,
-                        "total_deposit_interest": _temp_interest,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                    # interest
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_interest",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": interest_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + principal_amount + interest_amount,
-                        "total_deposit_interest": _temp_interest + interest_amount,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                ]
-            )
-        else: 
-            principal_amount = amount
-            interest_amount = 0
-            row = pd.DataFrame(
-                [
-                    # principal
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_principal",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": principal_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + principal_amount,
-                        "total_deposit_interest": _temp_interest,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                ]
-            )
-    else:
-        if _temp_withdraws + amount > _temp_deposits: # only interest
-            interest_amount = amount
-            row = pd.DataFrame(
-                [
-                    # interest
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_interest",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": interest_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + interest_amount,
-                        "total_deposit_interest": _temp_interest + interest_amount,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                ]
-            )
-        else: # interest and principal
-            interest_amount = _temp_deposits - _temp_withdraws # interest amount is amount down to total borrows
-            principal_amount = amount - interest_amount # principal amount is the rest
-            
-            row = pd.DataFrame(
-                [
-                    # principal
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_principal",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": principal_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + principal_amount,
-                        "total_deposit_interest": _temp_interest,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                    # interest
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_interest",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": interest_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + interest_amount,
-                        "total_deposit_interest": _temp_interest + interest_amount,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                ]
-            )
-
-    return row, _temp_deposits, _temp_withdraws + amount, _temp_interest + interest_amount
-
-
-# handle a borrow
-def _handle_borrow(_tx, _temp_borrows, _temp_repayments, _temp_interest):
-    # check if amount is to us or from us
-    amount = _tx.amount_fixed
-    if _tx.transferTo == _tx.wallet:
-        amount = amount
-    elif _tx['from'] == _tx.wallet:
-        # if the amount is from us, then there was an overpayment
-        amount = -amount
-    else:
-        raise Exception(f"transfer is neither to nor from one of our wallets: {_tx.hash}")
-
-    new_borrows = _temp_borrows + amount
-    row = pd.DataFrame(
-        [
-            {
-                "tokenSymbol": _tx.tokenSymbol,
-                "hash": _tx.hash,
-                "datetime": _tx.datetime,
-                "action": "borrow",
-                "from": _tx['from'],
-                "transfer_from": _tx.transferFrom,
-                "transfer_to": _tx.transferTo,
-                "amount": amount,
-                "total_borrows": new_borrows,
-                "total_repayments": _temp_repayments,
-                "total_borrow_interest": _temp_interest,
-                "wallet": _tx.wallet,
-                "wallet_name": _tx.wallet_name,
-                "pool": _tx.pool,
-                "chain": _tx.chain,
-            },
-        ]
-    )
-
-    return row, new_borrows, _temp_repayments, _temp_interest
-
-
-# handle a repayment
-def _handle_repay(_tx, _temp_borrows, _temp_repayments, _temp_interest):
-    # check if amount is to us or from us
-    amount = _tx.amount_fixed
-    if _tx['from'] == _tx.wallet:
-        amount = amount
-    elif _tx.transferTo == _tx.wallet:
-        # if the amount is to us, then there was an overpayment -> make amount negative
-        amount = -amount
-    else:
-        raise Exception(f"transfer is neither to nor from one of our wallets: {_tx.hash}")
-
-    if _temp_repayments < _temp_borrows: # there is principal
-        if _temp_repayments + amount > _temp_borrows + _temp_interest: # there is also interest
-            principal_amount = _temp_borrows + _temp_interest - _temp_repayments  # principal amount is amount up to total borrows
-            interest_amount = amount - principal_amount # interest amount is the rest
-            
-            row = pd.DataFrame(
-                [
-                    # principal
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "repay_principal",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": principal_amount,
-                        "total_borrows": _temp_borrows,
-                        "total_repayments": _temp_repayments + principal_amount,
-                        "total_borrow_interest": _temp_interest,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                    # interest
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "repay_interest",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": interest_amount,
-                        "total_borrows": _temp_borrows,
-                        "total_repayments": _temp_repayments + principal_amount + interest_amount,
-                        "total_borrow_interest": _temp_interest + interest_amount,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                ]
-            )
-        else:
-            principal_amount = amount
-            interest_amount = 0
-            row = pd.DataFrame(
-                [
-                    # principal
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "repay_principal",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": principal_amount,
-                        "total_borrows": _temp_borrows,
-                        "total_repayments": _temp_repayments + principal_amount,
-                        "total_borrow_interest": _temp_interest,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                ]
-            )
-    else:
-        if _temp_repayments + amount > _temp_borrows: # only interest
-            interest_amount = amount
-            row = pd.DataFrame(
-                [
-                    # interest
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "repay_interest",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": interest_amount,
-                        "total_borrows": _temp_borrows,
-                        "total_repayments": _temp_repayments + interest_amount,
-                        "total_borrow_interest": _temp_interest + interest_amount,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                ]
-            )
-        else: # interest and principal
-            interest_amount = _temp_borrows - _temp_repayments # interest amount is amount down to total borrows
-            principal_amount = amount - interest_amount # principal amount is the rest
-            
-            row = pd.DataFrame(
-                [
-                    # principal
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "repay_principal",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": principal_amount,
-                        "total_borrows": _temp_borrows,
-                        "total_repayments": _temp_repayments + principal_amount,
-                        "total_borrow_interest": _temp_interest,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                    # interest
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "repay_interest",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": interest_amount,
-                        "total_borrows": _temp_borrows,
-                        "total_repayments": _temp_repayments + interest_amount,
-                        "total_borrow_interest": _temp_interest + interest_amount,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                    },
-                ]
-            )
-
-    return row, _temp_borrows, _temp_repayments + amount, _temp_interest + interest_amount
+    borrowed = np.isin(kinds, [BORROW_ROW, REPAY_ROW])
+    # rebasing deposit tokens move the opposite way to the tokens deposited, so they're
+    # borrowed and repaid against the deposit position
+    is_deposit_token = _pool_transfers.tokenSymbol.isin(deposit_tokens).to_numpy()
+    kinds[is_deposit_token & (kinds == DEPOSIT_ROW)] = BORROW_ROW
+    kinds[is_deposit_token & (kinds == WITHDRAW_ROW)] = REPAY_ROW
+
+    wallets = _pool_transfers.wallet.astype(object).to_numpy()
+    from_wallet = _pool_transfers['from'].astype(object).to_numpy() == wallets
+    to_wallet = _pool_transfers.transferTo.astype(object).to_numpy() == wallets
+    # deposits and repayments are sent from the wallet, withdraws and borrows are sent to it,
+    # and the other way around they're negative
+    sent = np.isin(kinds, [DEPOSIT_ROW, REPAY_ROW])
+    positive = np.where(sent, from_wallet, to_wallet)
+    negative = np.where(sent, to_wallet, from_wallet)
+    unmatched = (kinds >= 0) & ~positive & ~negative
+
+    amounts = _pool_transfers.amount_fixed.to_numpy(dtype="float64")
+    amounts = np.where(positive, amounts, -amounts)
+
+    return kinds, borrowed, amounts, unmatched
+
+
+# the principal and interest rows of the positions in _transfers, given in position order
+# the kinds and amounts of the transfers are worked out for all of them at once, then each
+# position is scanned over plain floats, since the interest split off a withdraw or
+# repayment depends on the interest split off before it
+# states are the deposit and borrow Position each position starts from, updated in place
+def _split_rows(_transfers, _bounds, states=None):
+    kinds, borrowed, amounts, unmatched = _transfer_kinds(_transfers)
+    kinds, borrowed, amounts = kinds.tolist(), borrowed.tolist(), amounts.tolist()
+    if states is None:
+        states = [[Position(), Position()] for _ in _bounds[1:]]
+
+    rows = PositionRows(len(_transfers))
+    for start, end, positions in zip(_bounds[:-1], _bounds[1:], states):
+        for source in range(start, end):
+            kind = kinds[source]
+            if kind < 0:
+                print(f"tx type '{_transfers.action.iat[source]}' not recognized")
+                continue
+            if unmatched[source]:
+                raise Exception(
+                    f"transfer is neither to nor from one of our wallets: {_transfers.hash.iat[source]}"
+                )
+
+            position = positions[borrowed[source]]
+            if kind in [DEPOSIT_ROW, BORROW_ROW]:
+                position.add(rows, source, kind, amounts[source])
+            else:
+                position.take(rows, source, kind, amounts[source])
+
+    return rows.frame(_transfers)
+
+
+# the principal and interest rows of every wallet's positions in the pools, with the positions
+# split across max_workers processes
+def split_positions(_pool_transfers, max_workers=1):
+    return map_positions(_split_rows, _pool_transfers[SPLIT_COLUMNS], max_workers)
 
 
 def _add_dummy_transactions(_deposits_and_borrows):
@@ -465,40 +187,6 @@ def _add_dummy_transactions(_deposits_and_borrows):
     return _deposits_and_borrows
 
 
-# add tx's for the gas fees
-def calc_gas_fees(_pool_transfers):
-    # only use one gas fee per transaction hash
-    _pool_transfers = _pool_transfers.drop_duplicates(subset=['hash'])
-    gas_fees = pd.DataFrame()
-    for _, _tx in _pool_transfers.iterrows():
-        chain = _tx.chain
-
-        # the gas paid is the price times gas used, adjusted by decimals
-        fee_amount = _tx.gasPrice * _tx.gasUsed / (10**CHAINS[chain]['base_token_decimals'])
-        row = pd.DataFrame(
-            [
-                {
-                    "tokenSymbol": CHAINS[chain]['base_token_symbol'],
-                    "hash": _tx.hash,
-                    "datetime": _tx.datetime,
-                    "action": "gas_fee",
-                    "transfer_from": _tx['from'],
-                    "transfer_to": "0x0000000000000000000000000000000000000000", # always send gas to zero address
-                    "amount": fee_amount,
-                    "from": _tx['from'],
-                    "wallet": _tx.wallet,
-                    "wallet_name": _tx.wallet_name,
-                    "pool": _tx.to,
-                    "chain": _tx.chain,
-                }
-            ]
-        )
-        gas_fees = pd.concat([gas_fees, row])
-        
-    return gas_fees
-
-
-
 # get transfers with tx going to these pools
 def get_pool_transfers(_transfers, _pools):
     pool_transfers = _transfers[_transfers.to.str.lower().isin(_pools)].copy()
@@ -507,82 +195,26 @@ def get_pool_transfers(_transfers, _pools):
     return pool_transfers
 
 
-# find, format and calculate for all split transacitons from all transfers for a list of pools 
-def get_deposits_and_borrows(_transfers, _pools):
-    _pool_transfers = get_pool_transfers(_transfers, _pools)
-    gas_fees = calc_gas_fees(_pool_transfers)
-
-    _pool_transfers['pool'] = _pool_transfers.to
-    tokens = _pool_transfers.tokenSymbol.unique()
-    wallets = _pool_transfers.wallet.unique()
-    pools = _pool_transfers.to.unique()
-
-    deposits_and_borrows = gas_fees.copy()
-    for wallet in wallets:
-        for pool in pools:
-            for token in tokens:
-                # get the transactions for this token, pool, and wallet
-                temp_txs = _pool_transfers[
-                    (_pool_transfers.tokenSymbol == token)
-                    & (_pool_transfers.to == pool)
-                    & (_pool_transfers.wallet == wallet)
-                ].sort_values(by="datetime")
-
-                # for each transaction compute the amount in the pool and the interest withdrawn
-                temp_deposits = 0
-                temp_withdraws = 0
-                temp_deposit_interest = 0
-
-                temp_borrows = 0
-                temp_repayments = 0
-                temp_borrow_interest = 0
-
-                # loop over all the transactions for this token
-                for _, tx in temp_txs.iterrows():
-                    if _is_deposit(tx):
-                        row, temp_deposits, temp_withdraws, temp_deposit_interest = _handle_deposit(
-                            tx, 
-                            temp_deposits, 
-                            temp_withdraws, 
-                            temp_deposit_interest
-                        )
-                    elif _is_borrow(tx):
-                        row, temp_borrows, temp_repayments, temp_borrow_interest = _handle_borrow(
-                            tx, 
-                            temp_borrows, 
-                            temp_repayments, 
-                            temp_borrow_interest
-                        )
-                    elif _is_withdraw(tx):
-                        row, temp_deposits, temp_withdraws, temp_deposit_interest = _handle_withdraw(
-                            tx, 
-                            temp_deposits, 
-                            temp_withdraws, 
-                            temp_deposit_interest
-                        )
-                    elif _is_repay(tx):
-                        row, temp_borrows, temp_repayments, temp_borrow_interest = _handle_repay(
-                            tx, 
-                            temp_borrows, 
-                            temp_repayments, 
-                            temp_borrow_interest
-                        )
-                    else:
-                        print(f"tx type '{tx.action}' not recognized")
-                        continue
-
-                    deposits_and_borrows = pd.concat([deposits_and_borrows, row])
+# the gas fees and split rows with the dummy income rows added, in the order they're exported
+def _format_deposits_and_borrows(_gas_fees, _split_rows):
+    deposits_and_borrows = pd.concat([_gas_fees, _split_rows]) if len(_split_rows) else _gas_fees.copy()
 
     # add variable debt transactions and a transactions
     deposits_and_borrows = _add_dummy_transactions(deposits_and_borrows)
 
     deposits_and_borrows['category'] = [action_categories[action] for action in deposits_and_borrows.action]
 
-    # shift columns to the back
-    columns_to_shift = ['wallet','wallet_name','pool','chain','category']
+    return _order_deposits_and_borrows(deposits_and_borrows)
+
+
+def _order_deposits_and_borrows(deposits_and_borrows):
+    # shift columns to the back, the deposit totals before the borrow totals whichever kind of
+    # position came first, so runs over different transfers write the same columns
+    columns_to_shift = DEPOSIT_TOTALS + BORROW_TOTALS + ['wallet','wallet_name','pool','chain','category']
     columns = deposits_and_borrows.columns.tolist()
     for column in columns_to_shift:
-        columns.insert(len(columns), columns.pop(columns.index(column)))
+        if column in columns:
+            columns.insert(len(columns), columns.pop(columns.index(column)))
 
     deposits_and_borrows = deposits_and_borrows[columns]
 
@@ -590,10 +222,85 @@ def get_deposits_and_borrows(_transfers, _pools):
     return deposits_and_borrows.sort_values(by=['wallet','chain','pool','tokenSymbol','category','datetime'])
 
 
+# find, format and calculate for all split transacitons from all transfers for a list of pools 
+# max_workers is the number of processes the positions are split across, None for one per cpu
+def get_deposits_and_borrows(_transfers, _pools, max_workers=1):
+    _pool_transfers = get_pool_transfers(_transfers, _pools)
+    gas_fees = calc_gas_fees(_pool_transfers)
+
+    split_rows = split_positions(_pool_transfers, max_workers)
+    return _format_deposits_and_borrows(gas_fees, split_rows)
+
+
+# split only the transfers after each position's checkpoint in _ledger, starting from the
+# running totals saved there, and move the checkpoints up to the last transfer split
+# the rows are the ones get_deposits_and_borrows gives those transfers, so a daily run
+# costs as much as the new transfers rather than the whole history
+# gas is added for the same transactions as a full run, every one with a transfer to the pools
+# including the transfers without a wallet, pool or token and so without a position, less the
+# ones with a transfer before a checkpoint, whose gas was added with it, and _exported_hashes,
+# the ones the last output already has the gas of
+def get_new_deposits_and_borrows(_transfers, _pools, _ledger, _exported_hashes=()):
+    _pool_transfers = get_pool_transfers(_transfers, _pools)
+    order, bounds = position_order(_pool_transfers)
+    transfers = _pool_transfers[SPLIT_COLUMNS].take(order).reset_index(drop=True)
+    datetimes = transfers["datetime"].to_numpy()
+
+    split_transfers, new_transfers, new_bounds, states, positions = [], [], [0], [], []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        key = (transfers.wallet.iat[start], transfers.to.iat[start], transfers.tokenSymbol.iat[start])
+        checkpoint = get_checkpoint(_ledger, *key)
+        split = start + checkpoint_position(checkpoint, datetimes[start:end], " ".join(key))
+        split_transfers.append(np.arange(start, split))
+        if split == end:
+            continue
+
+        new_transfers.append(np.arange(split, end))
+        new_bounds.append(new_bounds[-1] + end - split)
+        states.append([Position(*totals) for totals in checkpoint["totals"]] if checkpoint else [Position(), Position()])
+        positions.append((key, end - start))
+
+    split_hashes = transfers.hash.take(np.concatenate(split_transfers)) if split_transfers else []
+    charged = _pool_transfers.hash.isin(split_hashes) | _pool_transfers.hash.isin(_exported_hashes)
+    if not new_transfers and charged.all():
+        return pd.DataFrame(columns=DEPOSITS_AND_BORROWS_COLUMNS).astype({"datetime": "datetime64[ns]"})
+
+    gas_fees = calc_gas_fees(_pool_transfers[~charged])
+    if not new_transfers:
+        return _format_deposits_and_borrows(gas_fees, pd.DataFrame())
+
+    transfers = transfers.take(np.concatenate(new_transfers)).reset_index(drop=True)
+    split_rows = _split_rows(transfers, np.array(new_bounds), states)
+    for (key, split), state, end in zip(positions, states, new_bounds[1:]):
+        totals = [position.totals() for position in state]
+        set_checkpoint(_ledger, *key, transfers.datetime.iat[end - 1], split, totals)
+
+    return _format_deposits_and_borrows(gas_fees, split_rows)
+
+
+# the last exported split with the rows of the transfers after the ledger's checkpoints added
+# an empty ledger splits every transfer
+def _add_new_deposits_and_borrows(_ledger):
+    if not _ledger:
+        return get_new_deposits_and_borrows(load_pool_transfers(), utils.POOL_LIST, _ledger)
+    if not os.path.exists(DEPOSITS_AND_BORROWS_PATH):
+        raise Exception(f"{DEPOSITS_AND_BORROWS_PATH} is missing, the ledger has to be rebuilt")
+
+    # read back exactly as they were written, or every run would move the floats of the old rows
+    deposits_and_borrows = pd.read_csv(DEPOSITS_AND_BORROWS_PATH, parse_dates=["datetime"], float_precision="round_trip")
+    exported_hashes = deposits_and_borrows.hash[deposits_and_borrows.action == "gas_fee"]
+    new_rows = get_new_deposits_and_borrows(load_pool_transfers(), utils.POOL_LIST, _ledger, exported_hashes)
+    return _order_deposits_and_borrows(pd.concat([deposits_and_borrows, new_rows]))
+
+
 # get split interest transactions for the sample pool and wallet on polygon
 # if running from console, output results to a .csv file
-def main(verbose=False):
-    deposits_and_borrows = get_deposits_and_borrows(all_transfers, POOL_LIST)
+# with a ledger only the transfers after its checkpoints are split and added to the last output
+def main(verbose=False, ledger=None):
+    if ledger is None:
+        deposits_and_borrows = get_deposits_and_borrows(load_pool_transfers(), utils.POOL_LIST)
+    else:
+        deposits_and_borrows = _add_new_deposits_and_borrows(ledger)
 
     if verbose == True:
         print(deposits_and_borrows)
@@ -602,5 +309,18 @@ def main(verbose=False):
 
 
 if __name__ == "__main__":
-    deposits_and_borrows = main(verbose=True)
-    deposits_and_borrows.to_csv("output_files/lending/deposits_and_borrows.csv", index=False)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"only split the transfers after the checkpoints in {LEDGER_PATH}",
+    )
+    args = parser.parse_args()
+
+    ledger = load_ledger() if args.incremental else None
+    deposits_and_borrows = main(verbose=True, ledger=ledger)
+    deposits_and_borrows.to_csv(DEPOSITS_AND_BORROWS_PATH, index=False)
+
+    # only move the checkpoints once the rows they describe have been written
+    if ledger is not None:
+        save_ledger(ledger)
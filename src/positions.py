@@ -0,0 +1,197 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+# a position is one wallet's transfers of one token to one pool or contract, and each
+# position is worked through on its own, from its first transfer to its last, so the
+# positions can be split across processes
+
+# the columns a position is keyed by
+POSITION_COLUMNS = ["wallet", "to", "tokenSymbol"]
+
+# the actions of the rows split off the transfers, an interest row's is the one after its principal's
+ROW_ACTIONS = [
+    "deposit",
+    "withdraw_principal",
+    "withdraw_interest",
+    "borrow",
+    "repay_principal",
+    "repay_interest",
+]
+DEPOSIT_ROW, WITHDRAW_ROW, BORROW_ROW, REPAY_ROW = 0, 1, 3, 4
+
+# the running totals shown on the rows of deposit and borrow positions
+DEPOSIT_TOTALS = ["total_deposits", "total_withdraws", "total_deposit_interest"]
+BORROW_TOTALS = ["total_borrows", "total_repayments", "total_borrow_interest"]
+
+# shards per worker, so a worker with a few long positions doesn't hold up the rest
+SHARDS_PER_WORKER = 4
+
+
+# the order the positions are worked through in: wallets, pools and tokens in the order they
+# first appear, and each position's transfers by datetime
+# returns the order and where each position's transfers start and end in it
+def position_order(_transfers):
+    codes = [pd.factorize(_transfers[column])[0] for column in POSITION_COLUMNS]
+    # stable, so transfers at the same time keep the order they were fetched in, and a position
+    # sorts the same with or without the transfers before a checkpoint or in another shard
+    # the per-position sort_values this replaced was a quicksort, which left those transfers
+    # in whatever order it happened to, so where a withdraw or repayment shares its second with
+    # another transfer of its position its principal and interest can come out split
+    # differently than they used to, while each position's net amounts stay the same
+    order = np.lexsort([_transfers["datetime"].to_numpy()] + codes[::-1])
+    # transfers without a wallet, pool or token aren't part of any position
+    order = order[np.all([code[order] >= 0 for code in codes], axis=0)]
+
+    keys = np.stack([code[order] for code in codes])
+    changes = (keys[:, 1:] != keys[:, :-1]).any(axis=0)
+    bounds = np.append(np.flatnonzero(np.append(len(order) > 0, changes)), len(order))
+
+    return order, bounds
+
+
+# the running totals of a position: what's been added to it, taken out of it, and of that
+# the interest, kept as plain numbers so a transfer doesn't allocate anything but its rows
+class Position:
+    __slots__ = ["added", "taken", "interest"]
+
+    def __init__(self, added=0, taken=0, interest=0):
+        self.added = added
+        self.taken = taken
+        self.interest = interest
+
+    def totals(self):
+        return [self.added, self.taken, self.interest]
+
+    # a deposit or borrow
+    def add(self, _rows, _source, _action, _amount):
+        self.added = self.added + _amount
+        _rows.append(_source, _action, _amount, self.added, self.taken, self.interest)
+
+    # a withdraw or repayment, split into the principal paid back and the interest on top of it
+    # _action is the principal row's action
+    def take(self, _rows, _source, _action, _amount):
+        added, taken, interest = self.added, self.taken, self.interest
+        if taken < added: # there is principal
+            if taken + _amount > added + interest: # also interest
+                principal_amount = added + interest - taken
+                interest_amount = _amount - principal_amount
+                _rows.append(_source, _action, principal_amount, added, taken + principal_amount, interest)
+                _rows.append(
+                    _source, _action + 1, interest_amount,
+                    added, taken + principal_amount + interest_amount, interest + interest_amount,
+                )
+            else:
+                interest_amount = 0
+                _rows.append(_source, _action, _amount, added, taken + _amount, interest)
+        elif taken + _amount > added: # only interest
+            interest_amount = _amount
+            _rows.append(_source, _action + 1, _amount, added, taken + _amount, interest + _amount)
+        else: # interest and principal, the interest is the amount down to the total added
+            interest_amount = added - taken
+            principal_amount = _amount - interest_amount
+            _rows.append(_source, _action, principal_amount, added, taken + principal_amount, interest)
+            _rows.append(
+                _source, _action + 1, interest_amount,
+                added, taken + interest_amount, interest + interest_amount,
+            )
+
+        self.taken = taken + _amount
+        self.interest = interest + interest_amount
+
+
+# the rows split off the transfers, written into column buffers sized for the most rows the
+# transfers can give (two each) and made into a frame once at the end
+class PositionRows:
+    __slots__ = ["sources", "actions", "amounts", "totals", "count"]
+
+    def __init__(self, _transfers):
+        capacity = 2 * _transfers
+        self.sources = np.empty(capacity, dtype="int64")
+        self.actions = np.empty(capacity, dtype="int8")
+        self.amounts = np.empty(capacity, dtype="float64")
+        self.totals = np.empty((capacity, 3), dtype="float64")
+        self.count = 0
+
+    def append(self, _source, _action, _amount, _added, _taken, _interest):
+        row = self.count
+        self.sources[row] = _source
+        self.actions[row] = _action
+        self.amounts[row] = _amount
+        self.totals[row] = _added, _taken, _interest
+        self.count = row + 1
+
+    # the rows with the fields of the transfers they came from, the transfers' datetime, hash,
+    # tokenSymbol, from, transferFrom, transferTo, wallet, wallet_name, to and chain
+    def frame(self, _transfers):
+        sources = self.sources[:self.count]
+        actions = self.actions[:self.count]
+
+        def transfer_values(_column):
+            return _transfers[_column].astype(object).to_numpy()[sources]
+
+        rows = pd.DataFrame({
+            "tokenSymbol": transfer_values("tokenSymbol"),
+            "hash": transfer_values("hash"),
+            "datetime": _transfers["datetime"].to_numpy()[sources],
+            "action": np.array(ROW_ACTIONS, dtype=object)[actions],
+            "from": transfer_values("from"),
+            "transfer_from": transfer_values("transferFrom"),
+            "transfer_to": transfer_values("transferTo"),
+            "amount": self.amounts[:self.count].copy(),
+        })
+
+        # only the totals of the kinds of position there are, the first kind's first
+        totals = self.totals[:self.count]
+        borrow_rows = actions >= BORROW_ROW
+        kinds_of_totals = [(DEPOSIT_TOTALS, ~borrow_rows), (BORROW_TOTALS, borrow_rows)]
+        if len(borrow_rows) and borrow_rows[0]:
+            kinds_of_totals.reverse()
+        for columns, rows_of_kind in kinds_of_totals:
+            if rows_of_kind.any():
+                for column, values in zip(columns, totals.T):
+                    rows[column] = np.where(rows_of_kind, values, np.nan)
+
+        rows["wallet"] = transfer_values("wallet")
+        rows["wallet_name"] = transfer_values("wallet_name")
+        rows["pool"] = transfer_values("to")
+        rows["chain"] = transfer_values("chain")
+
+        return rows
+
+
+# where to cut the positions into about _shards shards of about the same number of transfers,
+# each a run of whole positions
+def _shard_bounds(_bounds, _shards):
+    targets = np.linspace(0, _bounds[-1], _shards + 1)[1:-1]
+    cuts = _bounds[np.minimum(np.searchsorted(_bounds, targets), len(_bounds) - 1)]
+    return np.unique(np.concatenate([[0], cuts, [_bounds[-1]]]))
+
+
+# call _function(transfers, bounds) with _transfers in position order and where each position
+# starts and ends, and return the frame it returns
+# with more than one worker (None for one per cpu) the positions are sharded across processes,
+# each sent only its own shard of the transfers, and the frames from the shards are
+# concatenated in position order, so the result is the same as with one
+def map_positions(_function, _transfers, max_workers=1):
+    order, bounds = position_order(_transfers)
+    transfers = _transfers.take(order).reset_index(drop=True)
+
+    workers = max_workers or os.cpu_count()
+    if workers == 1 or len(bounds) <= 2:
+        return _function(transfers, bounds)
+
+    shards = _shard_bounds(bounds, workers * SHARDS_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _function,
+                transfers.iloc[start:end].reset_index(drop=True),
+                bounds[(bounds >= start) & (bounds <= end)] - start,
+            )
+            for start, end in zip(shards[:-1], shards[1:])
+        ]
+        return pd.concat([future.result() for future in futures], ignore_index=True)
@@ -1,7 +1,8 @@
-from src.utils import *
-from src.lending.split import get_pool_transfers, action_categories
+import pandas as pd
 
-all_transfers = pd.read_csv("output_files/all_transfers.csv")
+from src.gas import calc_gas_fees
+from src.lending.split import get_pool_transfers, action_categories
+from src.positions import DEPOSIT_ROW, WITHDRAW_ROW, Position, PositionRows, map_positions
 
 deposit_actions = ['stake','deposit']
 withdraw_actions = ['withdraw']
@@ -12,274 +13,52 @@ arcadium_contracts = ['0x9dd1fe32aff4060c12e2b42961548876053187c6']
 sushiswap_masterchef = ['0xef0881ec094552b2e128cf945ef17a6752b4ec5d']
 fiat_dao = ['0x4645d1cF3f4cE59b06008642E74E60e8F80c8b58']
 
-def _is_tx_in(_tx):
-    return _tx.transferTo == _tx.wallet
-
-
-# add tx's for the gas fees
-def calc_gas_fees(_pool_transfers):
-    # only use one gas fee per transaction hash
-    _pool_transfers = _pool_transfers.drop_duplicates(subset=['hash'])
-    gas_fees = pd.DataFrame()
-    for _, _tx in _pool_transfers.iterrows():
-        chain = _tx.chain
-
-        # the gas paid is the price times gas used, adjusted by decimals
-        fee_amount = _tx.gasPrice * _tx.gasUsed / (10**CHAINS[chain]['base_token_decimals'])
-        row = pd.DataFrame(
-            [
-                {
-                    "tokenSymbol": CHAINS[chain]['base_token_symbol'],
-                    "hash": _tx.hash,
-                    "datetime": _tx.datetime,
-                    "action": "gas_fee",
-                    "transfer_from": _tx['from'],
-                    "transfer_to": "0x0000000000000000000000000000000000000000", # always send gas to zero address
-                    "amount": fee_amount,
-                    "from": _tx['from'],
-                    "wallet": _tx.wallet,
-                    "wallet_name": _tx.wallet_name,
-                    "pool": _tx.to,
-                    "chain": _tx.chain,
-                    "original_action": _tx.action,
-                }
-            ]
-        )
-        gas_fees = pd.concat([gas_fees, row])
-        
-    return gas_fees
-
-
-def _handle_deposit(_tx, _temp_deposits, _temp_withdraws, _temp_interest):
-    amount = _tx.amount_fixed
-
-    new_deposits = _temp_deposits + amount
-    row = pd.DataFrame(
-        [
-            {
-                "tokenSymbol": _tx.tokenSymbol,
-                "hash": _tx.hash,
-                "datetime": _tx.datetime,
-                "action": "deposit",
-                "from": _tx['from'],
-                "transfer_from": _tx.transferFrom,
-                "transfer_to": _tx.transferTo,
-                "amount": amount,
-                "total_deposits": new_deposits,
-                "total_withdraws": _temp_withdraws,
-                "total_deposit_interest": _temp_interest,
-                "wallet": _tx.wallet,
-                "wallet_name": _tx.wallet_name,
-                "pool": _tx.pool,
-                "chain": _tx.chain,
-                "original_action": _tx.action
-            },
-        ]
-    )
-
-    return row, new_deposits, _temp_withdraws, _temp_interest
-
-
-def _handle_withdraw(_tx, _temp_deposits, _temp_withdraws, _temp_interest):
-    amount = _tx.amount_fixed
-
-    if _temp_withdraws < _temp_deposits: # there is principal
-        if _temp_withdraws + amount > _temp_deposits + _temp_interest: # also interest
-            principal_amount = _temp_deposits + _temp_interest - _temp_withdraws
-            interest_amount = amount - principal_amount
-            
-            row = pd.DataFrame(
-                [
-                    # principal
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_principal",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": principal_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + principal_amount,
-                        "total_deposit_interest": _temp_interest,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                        "original_action": _tx.action
-                    },
-                    # interest
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_interest",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": interest_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + principal_amount + interest_amount,
-                        "total_deposit_interest": _temp_interest + interest_amount,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                        "original_action": _tx.action
-                    },
-                ]
-            )
-        else: 
-            principal_amount = amount
-            interest_amount = 0
-            row = pd.DataFrame(
-                [
-                    # principal
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_principal",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": principal_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + principal_amount,
-                        "total_deposit_interest": _temp_interest,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                        "original_action": _tx.action
-                    },
-                ]
-            )
-    else:
-        if _temp_withdraws + amount > _temp_deposits: # only interest
-            interest_amount = amount
-            row = pd.DataFrame(
-                [
-                    # interest
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_interest",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": interest_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + interest_amount,
-                        "total_deposit_interest": _temp_interest + interest_amount,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                        "original_action": _tx.action
-                    },
-                ]
-            )
-        else: # interest and principal
-            interest_amount = _temp_deposits - _temp_withdraws # interest amount is amount down to total borrows
-            principal_amount = amount - interest_amount # principal amount is the rest
-            
-            row = pd.DataFrame(
-                [
-                    # principal
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_principal",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": principal_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + principal_amount,
-                        "total_deposit_interest": _temp_interest,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                        "original_action": _tx.action
-                    },
-                    # interest
-                    {
-                        "tokenSymbol": _tx.tokenSymbol,
-                        "hash": _tx.hash,
-                        "datetime": _tx.datetime,
-                        "action": "withdraw_interest",
-                        "from": _tx['from'],
-                        "transfer_from": _tx.transferFrom,
-                        "transfer_to": _tx.transferTo,
-                        "amount": interest_amount,
-                        "total_deposits": _temp_deposits,
-                        "total_withdraws": _temp_withdraws + interest_amount,
-                        "total_deposit_interest": _temp_interest + interest_amount,
-                        "wallet": _tx.wallet,
-                        "wallet_name": _tx.wallet_name,
-                        "pool": _tx.pool,
-                        "chain": _tx.chain,
-                        "original_action": _tx.action
-                    },
-                ]
-            )
-
-    return row, _temp_deposits, _temp_withdraws + amount, _temp_interest + interest_amount
+# the columns the reward rows are made from, all a worker is sent
+REWARD_COLUMNS = [
+    "hash", "datetime", "action", "from", "to", "transferFrom", "transferTo",
+    "tokenSymbol", "amount_fixed", "wallet", "wallet_name", "chain",
+]
 
 
 def get_contract_transfers(_transfers, _contracts):
     return get_pool_transfers(_transfers, _contracts)
 
 
-def calc_rewards(_transfers, _contracts):
+# the reward rows of the positions in _transfers, given in position order
+# transfers in the same second are taken in the order they were fetched (see position_order),
+# not the quicksort's order the rewards used to be split in, so a withdraw sharing its second
+# with another transfer can be split into principal and reward differently than before, with
+# the same net amounts
+def _position_rewards(_transfers, _bounds):
+    # first case is if the flow of the token is to our wallet
+    is_in = (
+        _transfers.transferTo.astype(object).to_numpy() == _transfers.wallet.astype(object).to_numpy()
+    ).tolist()
+    amounts = _transfers.amount_fixed.to_numpy(dtype="float64").tolist()
+
+    rows = PositionRows(len(_transfers))
+    for start, end in zip(_bounds[:-1], _bounds[1:]):
+        position = Position()
+        for source in range(start, end):
+            if is_in[source]:
+                position.take(rows, source, WITHDRAW_ROW, amounts[source])
+            else:
+                position.add(rows, source, DEPOSIT_ROW, amounts[source])
+
+    rewards = rows.frame(_transfers)
+    rewards["original_action"] = _transfers.action.astype(object).to_numpy()[rows.sources[:rows.count]]
+    return rewards
+
+
+# max_workers is the number of processes the positions are split across, None for one per cpu
+def calc_rewards(_transfers, _contracts, max_workers=1):
     contract_transfers = get_contract_transfers(_transfers, _contracts)
-    gas_fees = calc_gas_fees(contract_transfers)
-
-    contract_transfers['pool'] = contract_transfers.to
-    tokens = contract_transfers.tokenSymbol.unique()
-    wallets = contract_transfers.wallet.unique()
-    contracts = contract_transfers.to.unique()
-
-    rewards = gas_fees.copy()
-    for wallet in wallets:
-        for contract in contracts:
-            for token in tokens:
-                temp_txs = contract_transfers[
-                    (contract_transfers.tokenSymbol == token)
-                    & (contract_transfers.to == contract)
-                    & (contract_transfers.wallet == wallet)
-                ].sort_values(by="datetime")
-
-                temp_deposits = 0
-                temp_withdraws = 0
-                temp_deposit_interest = 0
-
-                for _, tx in temp_txs.iterrows():
-                    # first case is if the flow of the token is to our wallet
-                    if _is_tx_in(tx): 
-                        row, temp_deposits, temp_withdraws, temp_deposit_interest = _handle_withdraw(
-                            tx,
-                            temp_deposits,
-                            temp_withdraws,
-                            temp_deposit_interest
-                        )
-                    elif not _is_tx_in(tx): 
-                        row, temp_deposits, temp_withdraws, temp_deposit_interest = _handle_deposit(
-                            tx,
-                            temp_deposits,
-                            temp_withdraws,
-                            temp_deposit_interest
-                        )
-                    else:
-                        print(f"Skipping irrelevant action type: {tx.action}")
-                        continue
+    gas_fees = calc_gas_fees(contract_transfers, {"original_action": "action"})
 
-                    rewards = pd.concat([rewards, row])
+    rewards = pd.concat([
+        gas_fees,
+        map_positions(_position_rewards, contract_transfers[REWARD_COLUMNS], max_workers),
+    ])
 
     rewards['category'] = [action_categories[action] for action in rewards.action]
 
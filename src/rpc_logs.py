@@ -0,0 +1,278 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import utils
+from src.explorer import MAX_RETRIES, REQUEST_TIMEOUT_SECONDS, backoff_seconds
+
+
+# erc20 transfers read straight from Transfer event logs over json-rpc eth_getLogs,
+# as an alternative to the explorers' per-wallet "tokentx" endpoint
+
+# keccak256("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+# erc20 metadata calls
+NAME_SELECTOR = "0x06fdde03"
+SYMBOL_SELECTOR = "0x95d89b41"
+DECIMALS_SELECTOR = "0x313ce567"
+
+# calls sent in one json-rpc batch, and batches in flight at once per chain
+RPC_BATCH_SIZE = 100
+RPC_PARALLEL_BATCHES = 4
+# eth_getLogs block windows queried in one batch, each as a from and a to query
+LOG_WINDOWS_PER_BATCH = 10
+
+# block windows grow while they come back small and shrink when a node refuses them
+INITIAL_LOG_WINDOW = 2_000
+MAX_LOG_WINDOW = 1_000_000
+SMALL_LOG_WINDOW_RESULTS = 1_000
+
+
+class RpcError(Exception):
+    def __init__(self, error):
+        super().__init__(f"{error.get('code')}: {error.get('message')}")
+        self.code = error.get("code")
+        self.message = error.get("message", "")
+
+
+# nodes word this differently, e.g. "query returned more than 10000 results",
+# "Log response size exceeded" or "block range is too large"
+# other errors about the range, e.g. "invalid block range", aren't fixed by halving it
+def _is_too_many_logs(error):
+    message = error.message.lower()
+    return error.code == -32005 or any(
+        text in message for text in ["block range is too large", "more than", "exceed"]
+    )
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _get_session(chain):
+    with _sessions_lock:
+        if chain not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=RPC_PARALLEL_BATCHES)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[chain] = session
+
+        return _sessions[chain]
+
+
+def _post_batch(chain, batch):
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            http_response = _get_session(chain).post(
+                utils.CHAINS[chain]["rpc_url"], json=batch, timeout=REQUEST_TIMEOUT_SECONDS
+            )
+            if http_response.status_code != 429 and http_response.status_code < 500:
+                http_response.raise_for_status()
+                return http_response.json()
+            error = f"HTTP {http_response.status_code}"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = str(e)
+
+        if attempt == MAX_RETRIES:
+            raise Exception(f"{chain} rpc: {error}")
+        print(f"{chain} rpc: {error}, retrying")
+        time.sleep(backoff_seconds(attempt))
+
+
+# send (method, params) calls as json-rpc batches, returning results in call order
+# a failed call's result is an RpcError, raised unless allow_errors is set
+def rpc_batch(chain, calls, allow_errors=False):
+    batches = [
+        [
+            {"jsonrpc": "2.0", "id": id, "method": method, "params": params}
+            for id, (method, params) in enumerate(calls[i:i + RPC_BATCH_SIZE])
+        ]
+        for i in range(0, len(calls), RPC_BATCH_SIZE)
+    ]
+    if len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=RPC_PARALLEL_BATCHES) as executor:
+            batch_responses = list(executor.map(lambda batch: _post_batch(chain, batch), batches))
+    else:
+        batch_responses = [_post_batch(chain, batch) for batch in batches]
+
+    results = []
+    for responses in batch_responses:
+        # a batch can come back in any order
+        for response in sorted(responses, key=lambda response: response["id"]):
+            if "error" in response:
+                error = RpcError(response["error"])
+                if not allow_errors:
+                    raise error
+                results.append(error)
+            else:
+                results.append(response["result"])
+
+    return results
+
+
+def _address_topic(_address):
+    return "0x" + "0" * 24 + _address.lower()[2:]
+
+
+def _topic_address(_topic):
+    return "0x" + _topic[-40:]
+
+
+# all Transfer logs from or to the wallets over [start_block, end_block]
+# windows are batched, halved when a node refuses them and doubled while they're small
+def _get_transfer_logs(chain, wallets, start_block, end_block):
+    wallet_topics = [_address_topic(wallet) for wallet in wallets]
+    topic_filters = [[TRANSFER_TOPIC, wallet_topics], [TRANSFER_TOPIC, None, wallet_topics]]
+
+    logs = {}
+    window_size = INITIAL_LOG_WINDOW
+    retry_windows = []
+    next_block = start_block
+    while retry_windows or next_block <= end_block:
+        windows = []
+        while retry_windows and len(windows) < LOG_WINDOWS_PER_BATCH:
+            windows.append(retry_windows.pop())
+        while next_block <= end_block and len(windows) < LOG_WINDOWS_PER_BATCH:
+            window_end = min(next_block + window_size - 1, end_block)
+            windows.append((next_block, window_end))
+            next_block = window_end + 1
+
+        calls = [
+            ("eth_getLogs", [{"fromBlock": hex(from_block), "toBlock": hex(to_block), "topics": topics}])
+            for from_block, to_block in windows
+            for topics in topic_filters
+        ]
+        results = rpc_batch(chain, calls, allow_errors=True)
+
+        for i, (from_block, to_block) in enumerate(windows):
+            window_results = results[len(topic_filters) * i:len(topic_filters) * (i + 1)]
+            errors = [result for result in window_results if isinstance(result, RpcError)]
+            if errors:
+                if not _is_too_many_logs(errors[0]) or from_block == to_block:
+                    raise errors[0]
+                middle = (from_block + to_block) // 2
+                retry_windows += [(middle + 1, to_block), (from_block, middle)]
+                window_size = max(1, min(window_size, to_block - from_block + 1) // 2)
+                continue
+
+            window_logs = [log for result in window_results for log in result]
+            # erc721 transfers share the event signature but index the token id too
+            for log in window_logs:
+                if len(log["topics"]) == 3 and not log.get("removed", False):
+                    # a transfer between two of our wallets matches both filters
+                    logs[(log["transactionHash"], log["logIndex"])] = log
+            if len(window_logs) < SMALL_LOG_WINDOW_RESULTS and to_block - from_block + 1 >= window_size:
+                window_size = min(MAX_LOG_WINDOW, window_size * 2)
+
+    return sorted(logs.values(), key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)))
+
+
+def _decode_string(_data):
+    data = bytes.fromhex(_data[2:])
+    # some older tokens (e.g. MKR) return a bytes32 instead of a string
+    if len(data) == 32:
+        return data.rstrip(b"\0").decode("utf-8", "replace")
+    if len(data) < 64:
+        return ""
+    offset = int.from_bytes(data[:32], "big")
+    length = int.from_bytes(data[offset:offset + 32], "big")
+    return data[offset + 32:offset + 32 + length].decode("utf-8", "replace")
+
+
+def _get_token_metadata(chain, contracts):
+    calls = [
+        ("eth_call", [{"to": contract, "data": selector}, "latest"])
+        for contract in contracts
+        for selector in [NAME_SELECTOR, SYMBOL_SELECTOR, DECIMALS_SELECTOR]
+    ]
+    results = rpc_batch(chain, calls, allow_errors=True)
+
+    metadata = {}
+    for i, contract in enumerate(contracts):
+        name, symbol, decimals = [
+            result if isinstance(result, str) and result != "0x" else None
+            for result in results[3 * i:3 * (i + 1)]
+        ]
+        metadata[contract] = {
+            "tokenName": _decode_string(name) if name else "",
+            "tokenSymbol": _decode_string(symbol) if symbol else "",
+            "tokenDecimal": str(int(decimals, 16)) if decimals else "0",
+        }
+
+    return metadata
+
+
+# get the erc20 Transfer logs to or from the wallets as "tokentx"-style records,
+# streamed into a buffer per wallet from new_buffer()
+def get_transfer_records_by_logs(wallets, chain, new_buffer, start_block=0, end_block=None):
+    head = int(rpc_batch(chain, [("eth_blockNumber", [])])[0], 16)
+    if end_block is None or end_block > head:
+        end_block = head
+
+    logs = _get_transfer_logs(chain, [wallet.lower() for wallet in wallets], start_block, end_block)
+
+    blocks = sorted({log["blockNumber"] for log in logs})
+    hashes = sorted({log["transactionHash"] for log in logs})
+    contracts = sorted({log["address"].lower() for log in logs})
+
+    block_results = rpc_batch(chain, [("eth_getBlockByNumber", [block, False]) for block in blocks])
+    timestamps = {
+        block: str(int(result["timestamp"], 16)) for block, result in zip(blocks, block_results)
+    }
+    transaction_results = rpc_batch(chain, [("eth_getTransactionByHash", [hash]) for hash in hashes])
+    transactions = dict(zip(hashes, transaction_results))
+    receipt_results = rpc_batch(chain, [("eth_getTransactionReceipt", [hash]) for hash in hashes])
+    receipts = dict(zip(hashes, receipt_results))
+    # nodes that prune old data, or haven't indexed a transaction yet, return null for it
+    for hash in hashes:
+        if transactions[hash] is None or receipts[hash] is None:
+            raise Exception(
+                f"{chain} rpc: no transaction or receipt for {hash}, the node may have pruned it "
+                f"or not indexed it yet"
+            )
+    metadata = _get_token_metadata(chain, contracts)
+
+    records_by_wallet = {wallet: new_buffer() for wallet in wallets}
+    # topics are lowercase, the wallets may be checksummed
+    wallets_by_address = {wallet.lower(): wallet for wallet in wallets}
+    for log in logs:
+        transaction = transactions[log["transactionHash"]]
+        receipt = receipts[log["transactionHash"]]
+        block = int(log["blockNumber"], 16)
+        contract = log["address"].lower()
+        from_address = _topic_address(log["topics"][1])
+        to_address = _topic_address(log["topics"][2])
+
+        record = {
+            "blockNumber": str(block),
+            "timeStamp": timestamps[log["blockNumber"]],
+            "hash": log["transactionHash"],
+            "nonce": str(int(transaction["nonce"], 16)),
+            "blockHash": log["blockHash"],
+            "from": from_address,
+            "contractAddress": contract,
+            "to": to_address,
+            "value": str(int(log["data"], 16) if log["data"] != "0x" else 0),
+            "tokenName": metadata[contract]["tokenName"],
+            "tokenSymbol": metadata[contract]["tokenSymbol"],
+            "tokenDecimal": metadata[contract]["tokenDecimal"],
+            "transactionIndex": str(int(log["transactionIndex"], 16)),
+            "gas": str(int(transaction["gas"], 16)),
+            # what was actually paid, which is what the explorers report after eip-1559
+            "gasPrice": str(int(receipt.get("effectiveGasPrice") or transaction["gasPrice"], 16)),
+            "gasUsed": str(int(receipt["gasUsed"], 16)),
+            "cumulativeGasUsed": str(int(receipt["cumulativeGasUsed"], 16)),
+            "input": "deprecated",
+            "confirmations": str(head - block),
+        }
+        # like the explorers, a transfer between two of our wallets shows up for both
+        for address in {from_address, to_address}:
+            if address in wallets_by_address:
+                records_by_wallet[wallets_by_address[address]].append(record)
+
+    return records_by_wallet
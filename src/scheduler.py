@@ -0,0 +1,92 @@
+import fcntl
+import hashlib
+import json
+import os
+import time
+
+
+# bucket state lives in files so every process on the host shares one budget per key
+SCHEDULER_DIR = os.environ.get("EXPLORER_SCHEDULER_DIR", ".cache/rate_limits")
+
+# a throttled request cuts the learned rate to this fraction of itself
+THROTTLE_DECREASE = 0.7
+# each successful request raises the learned rate by this many calls per second
+SUCCESS_INCREASE = 0.02
+MIN_RATE = 0.2
+
+
+# token bucket shared across processes through a locked state file
+# the refill rate starts at max_rate and adapts to the explorer's real limit:
+# it is cut on every throttling response and creeps back up on success
+class TokenBucket:
+    def __init__(self, _name, _max_rate):
+        self.path = os.path.join(SCHEDULER_DIR, f"{_name}.json")
+        self.max_rate = _max_rate
+
+    # read, change and write the state while holding an exclusive lock on the file
+    def _update(self, _change):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT), "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                contents = f.read()
+                now = time.time()
+                if contents:
+                    state = json.loads(contents)
+                else:
+                    state = {"rate": self.max_rate, "tokens": 1.0, "updated": now}
+
+                # refill for the time since the last update, allowing a burst of one second
+                state["rate"] = min(state["rate"], self.max_rate)
+                state["tokens"] = min(
+                    max(state["rate"], 1.0),
+                    state["tokens"] + (now - state["updated"]) * state["rate"]
+                )
+                state["updated"] = now
+
+                result = _change(state)
+
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                # the write must land before the lock is released
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # block until a request may be sent
+    def acquire(self):
+        def take(state):
+            if state["tokens"] >= 1:
+                state["tokens"] -= 1
+                return 0
+            return (1 - state["tokens"]) / state["rate"]
+
+        wait = self._update(take)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._update(take)
+
+    def on_success(self):
+        def increase(state):
+            state["rate"] = min(self.max_rate, state["rate"] + SUCCESS_INCREASE)
+
+        self._update(increase)
+
+    def on_throttle(self):
+        def decrease(state):
+            state["rate"] = max(MIN_RATE, state["rate"] * THROTTLE_DECREASE)
+            # nothing more goes out until the bucket has refilled at the lower rate
+            state["tokens"] = min(state["tokens"], 0.0)
+
+        self._update(decrease)
+
+    def rate(self):
+        return self._update(lambda state: state["rate"])
+
+
+# buckets are per api key, named without revealing the key itself
+def bucket_name(_url, _api_key):
+    return hashlib.sha256(f"{_url}|{_api_key}".encode()).hexdigest()[:16]
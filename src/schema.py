@@ -0,0 +1,217 @@
+import functools
+
+import numpy as np
+import pandas as pd
+
+from src import utils
+from src.uint256 import Uint256Dtype
+
+
+# one place for the columns and dtypes of every transaction frame, so each stage
+# builds, reads and converts its frames the same way with a single astype pass
+
+# known up front, so frames from different wallets and chains keep the same
+# categories when they're concatenated (sorted so sorting by them stays alphabetical)
+# the chains and wallets come from the .env, so these are built on first use, and the
+# schemas below hold the functions, resolved by get_schema
+@functools.lru_cache(maxsize=None)
+def chain_dtype():
+    return pd.CategoricalDtype(sorted(utils.CHAINS))
+
+
+@functools.lru_cache(maxsize=None)
+def wallet_dtype():
+    return pd.CategoricalDtype(sorted(utils.WALLETS.values()))
+
+
+@functools.lru_cache(maxsize=None)
+def wallet_name_dtype():
+    return pd.CategoricalDtype(sorted(utils.WALLETS))
+
+
+# token amounts can be anything up to 2**256
+UINT256 = Uint256Dtype()
+
+# "str" columns are left as they are, "category" columns get their categories from the data
+# addresses, tokens and function names repeat on most rows, so they're categories
+# the nullable integer columns are the ones internal transactions don't have
+NORMAL_TRANSACTIONS = {
+    "blockNumber": "int64",
+    "timeStamp": "int64",
+    "hash": "str",
+    "nonce": "Int64",
+    "blockHash": "str",
+    "transactionIndex": "Int32",
+    "from": "category",
+    "to": "category",
+    "value": "str",
+    "gas": "int64",
+    "gasPrice": "Int64",
+    "isError": "int8",
+    "txreceipt_status": "Int8",
+    "input": "str",
+    "contractAddress": "category",
+    "cumulativeGasUsed": "Int64",
+    "gasUsed": "int64",
+    "confirmations": "Int64",
+    "methodId": "category",
+    "functionName": "category",
+    "wallet": wallet_dtype,
+    "wallet_name": wallet_name_dtype,
+    "chain": chain_dtype,
+}
+
+# internal transactions are stored with the normal transaction columns
+INTERNAL_TRANSACTIONS = NORMAL_TRANSACTIONS
+
+TOKEN_TRANSFERS = {
+    "blockNumber": "int64",
+    "timeStamp": "int64",
+    "hash": "str",
+    "nonce": "Int64",
+    "blockHash": "str",
+    "from": "category",
+    "contractAddress": "category",
+    "to": "category",
+    "value": UINT256,
+    "tokenName": "category",
+    "tokenSymbol": "category",
+    "tokenDecimal": "int64",
+    "transactionIndex": "Int32",
+    "gas": "int64",
+    "gasPrice": "Int64",
+    "gasUsed": "int64",
+    "cumulativeGasUsed": "Int64",
+    "input": "category",
+    "confirmations": "Int64",
+    "wallet": wallet_dtype,
+    "wallet_name": wallet_name_dtype,
+    "chain": chain_dtype,
+}
+
+# token transfers and raw eth transfers merged with the transactions they came from
+ALL_TRANSFERS = {
+    "blockNumber": "int64",
+    "timeStamp": "int64",
+    "hash": "str",
+    "nonce": "Int64",
+    "blockHash": "str",
+    "transferFrom": "category",
+    "from": "category",
+    "contractAddress": "category",
+    "transferTo": "category",
+    "to": "category",
+    "amount": UINT256,
+    "tokenName": "category",
+    "tokenSymbol": "category",
+    "tokenDecimal": "int64",
+    "transactionIndex": "Int32",
+    "gas": "int64",
+    "gasPrice": "Int64",
+    "gasUsed": "int64",
+    "cumulativeGasUsed": "Int64",
+    "input_deprecated": "category",
+    "confirmations": "Int64",
+    "value": "str",
+    "isError": "Int8",
+    "txreceipt_status": "Int8",
+    "input": "str",
+    "methodId": "category",
+    "functionName": "category",
+    "wallet": wallet_dtype,
+    "wallet_name": wallet_name_dtype,
+    "chain": chain_dtype,
+    "datetime": "datetime64[ns]",
+    "amount_fixed": "float64",
+    "action": "category",
+}
+
+SCHEMAS = {
+    "normal_transactions": NORMAL_TRANSACTIONS,
+    "internal_transactions": INTERNAL_TRANSACTIONS,
+    "token_transfers": TOKEN_TRANSFERS,
+    "all_transfers": ALL_TRANSFERS,
+}
+
+
+# a schema's columns and dtypes, with the chain and wallet categories built
+@functools.lru_cache(maxsize=None)
+def get_schema(_name):
+    return {
+        column: dtype() if callable(dtype) else dtype for column, dtype in SCHEMAS[_name].items()
+    }
+
+
+def _is_integer(_dtype):
+    return isinstance(_dtype, str) and _dtype.lower().startswith("int")
+
+
+# an empty frame with the schema's columns and dtypes
+def empty_frame(_name):
+    schema = get_schema(_name)
+    return pd.DataFrame({
+        column: pd.Series([], dtype="object" if dtype == "str" else dtype)
+        for column, dtype in schema.items()
+    })
+
+
+# put a frame into the schema's column order and dtypes
+# missing integer columns are left empty, other missing columns are blank strings
+# columns limits it to some of the schema's columns, in that order
+def apply_schema(_df, _name, columns=None):
+    schema = get_schema(_name)
+    if columns is not None:
+        schema = {column: schema[column] for column in columns}
+    df = _df.copy(deep=False)
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            df[column] = pd.array([pd.NA] * len(df), dtype=dtype) if _is_integer(dtype) else ""
+        # integers that came back as strings, e.g. a blank txreceipt_status
+        elif _is_integer(dtype) and not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column])
+
+    # only the columns not already in their dtype are converted
+    df = df[list(schema)]
+    for column, dtype in schema.items():
+        if dtype != "str" and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+# concatenate frames with the same columns into one with a new index, keeping category
+# columns as categories (pd.concat turns them into plain objects unless every frame has
+# the same categories, and compares the categories of every frame even when they do)
+def concat_frames(_frames):
+    frames = list(_frames)
+    columns = {}
+    for column in frames[0].columns:
+        series = [frame[column] for frame in frames]
+        if all(isinstance(values.dtype, pd.CategoricalDtype) for values in series):
+            categories = series[0].cat.categories
+            for values in series[1:]:
+                categories = categories.union(values.cat.categories)
+            dtype = pd.CategoricalDtype(categories)
+            codes = [pd.Categorical(values, dtype=dtype).codes for values in series]
+            columns[column] = pd.Categorical.from_codes(np.concatenate(codes), dtype=dtype)
+        else:
+            columns[column] = pd.concat(series, ignore_index=True)
+
+    return pd.DataFrame(columns)
+
+
+# read a frame written by to_csv back into its schema
+# strings, hashes and amounts are kept exactly as written
+def read_csv(_path, _name):
+    schema = get_schema(_name)
+    as_read = {
+        column: dtype if _is_integer(dtype) else "object"
+        for column, dtype in schema.items()
+        if dtype not in ["datetime64[ns]", "float64"]
+    }
+    df = pd.read_csv(_path, dtype=as_read, keep_default_na=False, na_values={
+        column: [""] for column, dtype in schema.items() if dtype not in ["str", UINT256]
+    })
+    if "datetime" in df.columns:
+        df["datetime"] = pd.to_datetime(df["datetime"])
+
+    return apply_schema(df, _name)
@@ -0,0 +1,173 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src.schema import get_schema, UINT256, apply_schema, read_csv
+from src.uint256 import Uint256Array, LIMBS
+
+
+# columnar copies of the output frames, stored as parquet under
+# output_files/datasets/{name}/chain={chain}/wallet={wallet}/part-0.parquet
+# so a stage can read just the columns and the chains or wallets it needs
+# the csv files are still written next to them for the notebooks and spreadsheets
+# pyarrow is only imported once a dataset is read or written, it's slow to import
+
+DATASET_DIR = "output_files/datasets"
+OUTPUT_DIR = "output_files"
+
+PARTITION_COLUMNS = ["chain", "wallet"]
+
+
+def _arrow_type(_dtype):
+    import pyarrow as pa
+
+    if _dtype == UINT256:
+        # the little-endian limbs as they are stored in memory
+        return pa.binary(4 * LIMBS)
+    if _dtype == "category" or isinstance(_dtype, pd.CategoricalDtype):
+        return pa.dictionary(pa.int32(), pa.string())
+    if _dtype == "str":
+        return pa.string()
+
+    return {
+        "int8": pa.int8(),
+        "int16": pa.int16(),
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "datetime64[ns]": pa.timestamp("ns"),
+    }[_dtype.lower()]
+
+
+# the stored schema of a dataset, without the partition columns
+def arrow_schema(_name):
+    import pyarrow as pa
+
+    return pa.schema([
+        (column, _arrow_type(dtype))
+        for column, dtype in get_schema(_name).items()
+        if column not in PARTITION_COLUMNS
+    ])
+
+
+def _to_arrow_column(_series, _type):
+    import pyarrow as pa
+
+    if _series.dtype == UINT256:
+        array = _series.array
+        mask = array.isna()
+        validity = pa.array(~mask).buffers()[1] if mask.any() else None
+        return pa.FixedSizeBinaryArray.from_buffers(
+            _type, len(array), [validity, pa.py_buffer(array._limbs.tobytes())],
+            null_count=int(mask.sum()),
+        )
+    if pa.types.is_dictionary(_type):
+        return pa.DictionaryArray.from_pandas(
+            pd.Categorical(_series.astype(object).where(_series.notna(), None))
+        ).cast(_type)
+
+    return pa.array(_series, type=_type, from_pandas=True)
+
+
+def _from_arrow_uint256(_column):
+    column = _column.combine_chunks()
+    width = 4 * LIMBS
+    data = column.buffers()[1]
+    limbs = np.frombuffer(
+        data, dtype="<u4", count=len(column) * LIMBS, offset=column.offset * width
+    ).reshape(len(column), LIMBS).copy()
+    mask = column.is_null().to_numpy(zero_copy_only=False)
+
+    return Uint256Array(limbs, mask)
+
+
+def _partition_path(_name, _chain, _wallet, _root):
+    return os.path.join(_root, _name, f"chain={_chain}", f"wallet={_wallet}")
+
+
+# replace the stored dataset with _df, one file per chain and wallet
+# the new files are written next to the old ones and swapped in at the end
+def write_dataset(_df, _name, _root=DATASET_DIR):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = apply_schema(_df, _name)
+    schema = arrow_schema(_name)
+
+    temp_root = os.path.join(_root, f".{_name}.tmp")
+    shutil.rmtree(temp_root, ignore_errors=True)
+    os.makedirs(os.path.join(temp_root, _name))
+
+    for (chain, wallet), partition in df.groupby(PARTITION_COLUMNS, observed=True, sort=False):
+        table = pa.Table.from_arrays(
+            [_to_arrow_column(partition[field.name], field.type) for field in schema],
+            schema=schema,
+        )
+        path = _partition_path(_name, chain, wallet, temp_root)
+        os.makedirs(path)
+        pq.write_table(table, os.path.join(path, "part-0.parquet"))
+
+    path = os.path.join(_root, _name)
+    old_path = os.path.join(_root, f".{_name}.old")
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(os.path.join(temp_root, _name), path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    shutil.rmtree(temp_root, ignore_errors=True)
+
+
+def dataset_exists(_name, _root=DATASET_DIR):
+    return os.path.isdir(os.path.join(_root, _name))
+
+
+# read a stored dataset, only the given columns and the partitions for the given
+# chains and wallets (all of them when not given)
+def read_dataset(_name, columns=None, chains=None, wallets=None, _root=DATASET_DIR):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    schema = get_schema(_name)
+    columns = list(schema) if columns is None else columns
+
+    partitioning = ds.partitioning(
+        pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]), flavor="hive"
+    )
+    dataset = ds.dataset(
+        os.path.join(_root, _name), format="parquet", partitioning=partitioning
+    )
+    partition_filter = None
+    for column, values in [("chain", chains), ("wallet", wallets)]:
+        if values is not None:
+            condition = ds.field(column).isin(list(values))
+            partition_filter = condition if partition_filter is None else partition_filter & condition
+
+    table = dataset.to_table(columns=columns, filter=partition_filter)
+
+    uint256_columns = {
+        column: _from_arrow_uint256(table.column(column))
+        for column in columns if schema[column] == UINT256
+    }
+    df = table.drop(list(uint256_columns)).to_pandas()
+    for column, values in uint256_columns.items():
+        df[column] = values
+
+    return apply_schema(df, _name, columns)
+
+
+# the frame for a stage, from its dataset or from the csv written before datasets existed
+def load_frame(_name, columns=None, chains=None, wallets=None):
+    if dataset_exists(_name):
+        return read_dataset(_name, columns, chains, wallets)
+
+    df = read_csv(os.path.join(OUTPUT_DIR, f"{_name}.csv"), _name)
+    if chains is not None:
+        df = df[df["chain"].isin(chains)]
+    if wallets is not None:
+        df = df[df["wallet"].isin(wallets)]
+    if columns is not None:
+        df = df[columns]
+
+    df.reset_index(drop=True, inplace=True)
+    return df
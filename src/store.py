@@ -0,0 +1,172 @@
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+from src.schema import get_schema, UINT256, apply_schema
+
+
+# a local sqlite database with every fetched frame, indexed on the columns the
+# analyses select by, so they can read just the rows they need instead of
+# loading a whole csv and masking it
+# rows are keyed like the sync cursors dedupe them: chain, wallet, hash and the
+# position of the row among the rows of the same hash and wallet
+
+STORE_PATH = "output_files/transactions.db"
+
+TABLES = ["normal_transactions", "internal_transactions", "token_transfers", "all_transfers"]
+
+KEY_COLUMNS = ["chain", "wallet", "hash", "_ordinal"]
+
+# {index name suffix: columns}
+INDEXES = {
+    "hash": ["hash"],
+    "wallet_chain": ["wallet", "chain"],
+    "to": ["to"],
+    "contract": ["contractAddress"],
+    "block": ["blockNumber"],
+}
+
+
+def _quote(_column):
+    return f'"{_column}"'
+
+
+def _sql_type(_dtype):
+    if _dtype == UINT256:
+        # too big for an sqlite integer, kept as its decimal string
+        return "TEXT"
+    if _dtype in ["float64"]:
+        return "REAL"
+    # datetimes are stored as nanoseconds since the epoch
+    if isinstance(_dtype, str) and (_dtype.lower().startswith("int") or _dtype == "datetime64[ns]"):
+        return "INTEGER"
+    return "TEXT"
+
+
+def store_exists(_path=STORE_PATH):
+    return os.path.exists(_path)
+
+
+def _connect(_path):
+    connection = sqlite3.connect(_path)
+    # readers aren't blocked while a fetch is writing
+    connection.execute("PRAGMA journal_mode=WAL")
+    return connection
+
+
+def _create_table(_connection, _name):
+    schema = get_schema(_name)
+    columns = [f"{_quote(column)} {_sql_type(dtype)}" for column, dtype in schema.items()]
+    columns.append("_ordinal INTEGER NOT NULL")
+    key = ", ".join(_quote(column) for column in KEY_COLUMNS)
+    _connection.execute(
+        f"CREATE TABLE IF NOT EXISTS {_name} ({', '.join(columns)}, PRIMARY KEY ({key}))"
+    )
+    for suffix, index_columns in INDEXES.items():
+        _connection.execute(
+            f"CREATE INDEX IF NOT EXISTS {_name}_{suffix} "
+            f"ON {_name} ({', '.join(_quote(column) for column in index_columns)})"
+        )
+
+
+# one list of python values per column, with None for missing values
+def _column_values(_series):
+    if _series.dtype == UINT256:
+        values = _series.array.to_ints().astype(str)
+        values[_series.array.isna()] = None
+        return values.tolist()
+    if pd.api.types.is_datetime64_dtype(_series):
+        values = _series.values.astype("int64").astype(object)
+        values[_series.isna().values] = None
+        return values.tolist()
+
+    return _series.astype(object).where(_series.notna(), None).tolist()
+
+
+# insert the rows of _df into its table, replacing the rows already stored with the same key
+# replace_from, {(wallet, chain): block}, first deletes the stored rows of each wallet and chain
+# from that block on, the blocks _df was fetched again for, so rows no longer fetched are gone
+def upsert(_df, _name, _path=STORE_PATH, replace_from=None):
+    df = apply_schema(_df, _name)
+    df["_ordinal"] = df.groupby(["hash", "wallet"], observed=True).cumcount()
+
+    columns = list(df.columns)
+    updates = ", ".join(
+        f"{_quote(column)} = excluded.{_quote(column)}"
+        for column in columns if column not in KEY_COLUMNS
+    )
+    sql = (
+        f"INSERT INTO {_name} ({', '.join(_quote(column) for column in columns)}) "
+        f"VALUES ({', '.join('?' for _ in columns)}) "
+        f"ON CONFLICT ({', '.join(_quote(column) for column in KEY_COLUMNS)}) DO UPDATE SET {updates}"
+    )
+    rows = zip(*[_column_values(df[column]) for column in columns])
+
+    connection = _connect(_path)
+    try:
+        with connection:
+            _create_table(connection, _name)
+            if replace_from:
+                connection.executemany(
+                    f'DELETE FROM {_name} WHERE "wallet" = ? AND "chain" = ? AND "blockNumber" >= ?',
+                    [(wallet, chain, int(block)) for (wallet, chain), block in replace_from.items()],
+                )
+            connection.executemany(sql, rows)
+    finally:
+        connection.close()
+
+
+# the stored rows of a table as a frame in its schema, in the order they were first stored
+# every filter given narrows the selection, list filters match any of their values
+def query(
+    _name,
+    columns=None,
+    chains=None,
+    wallets=None,
+    hashes=None,
+    to=None,
+    contract_addresses=None,
+    start_block=None,
+    end_block=None,
+    _path=STORE_PATH,
+):
+    schema = get_schema(_name)
+    columns = list(schema) if columns is None else columns
+
+    conditions = []
+    params = []
+    for column, values in [
+        ("chain", chains),
+        ("wallet", wallets),
+        ("hash", hashes),
+        ("to", to),
+        ("contractAddress", contract_addresses),
+    ]:
+        if values is not None:
+            # one parameter however many values there are
+            conditions.append(f"{_quote(column)} IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps([str(value) for value in values]))
+    if start_block is not None:
+        conditions.append('"blockNumber" >= ?')
+        params.append(int(start_block))
+    if end_block is not None:
+        conditions.append('"blockNumber" <= ?')
+        params.append(int(end_block))
+
+    sql = f"SELECT {', '.join(_quote(column) for column in columns)} FROM {_name}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY rowid"
+
+    connection = _connect(_path)
+    try:
+        df = pd.read_sql_query(sql, connection, params=params)
+    finally:
+        connection.close()
+
+    if "datetime" in df.columns:
+        df["datetime"] = pd.to_datetime(df["datetime"], unit="ns")
+
+    return apply_schema(df, _name, columns)
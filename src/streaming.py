@@ -0,0 +1,170 @@
+import bisect
+import codecs
+import json
+import sys
+from array import array
+
+import numpy as np
+import pandas as pd
+
+
+# incremental parsing of explorer responses, so a 10k record response never exists
+# as a raw body, a list of dicts and a DataFrame all at the same time
+# records are decoded one at a time and written straight into column buffers
+
+# once this much of the text buffer has been consumed it is dropped
+_COMPACT_CHARS = 1 << 16
+
+_decoder = json.JSONDecoder()
+
+
+# column-per-field storage for explorer records
+# integer fields go into int64 arrays, low cardinality strings are interned and
+# fields that aren't listed are dropped as the records arrive
+class ColumnBuffer:
+    def __init__(self, _fields, _int_fields=(), _interned_fields=()):
+        self.int_fields = set(_int_fields)
+        self.interned_fields = set(_interned_fields)
+        self.columns = {
+            field: array("q") if field in self.int_fields else [] for field in _fields
+        }
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    # an integer column with a value that isn't an integer falls back to strings
+    def _to_strings(self, _field):
+        self.columns[_field] = [str(value) for value in self.columns[_field]]
+        self.int_fields.discard(_field)
+
+    def append(self, _record):
+        for field, column in self.columns.items():
+            value = _record.get(field, "")
+            if field in self.int_fields:
+                try:
+                    column.append(int(value))
+                    continue
+                except (TypeError, ValueError, OverflowError):
+                    self._to_strings(field)
+                    column = self.columns[field]
+            elif field in self.interned_fields and isinstance(value, str):
+                value = sys.intern(value)
+            column.append(value)
+
+    def extend(self, _other):
+        for field in self.columns:
+            if field in self.int_fields and field not in _other.int_fields:
+                self._to_strings(field)
+            if field not in self.int_fields and field in _other.int_fields:
+                self.columns[field].extend(str(value) for value in _other.columns[field])
+            else:
+                self.columns[field].extend(_other.columns[field])
+
+    def truncate(self, _length):
+        for column in self.columns.values():
+            del column[_length:]
+
+    # number of leading records with a value below _value, for a column sorted ascending
+    def count_below(self, _field, _value):
+        return bisect.bisect_left(self.columns[_field], _value)
+
+    def to_frame(self):
+        return pd.DataFrame({
+            field: np.frombuffer(column, dtype=np.int64) if isinstance(column, array) else column
+            for field, column in self.columns.items()
+        })
+
+
+class ExplorerResponse:
+    def __init__(self, status, message, result):
+        self.status = status
+        self.message = message
+        self.result = result
+
+
+class _StreamReader:
+    def __init__(self, _chunks):
+        self.chunks = iter(_chunks)
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.done = False
+
+    def _fill(self):
+        if self.done:
+            return False
+
+        if self.pos > _COMPACT_CHARS:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.text += self.text_decoder.decode(b"", final=True)
+            self.done = True
+        else:
+            self.text += self.text_decoder.decode(chunk)
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                raise ValueError("unexpected end of explorer response")
+
+    def expect(self, _chars):
+        char = self.peek()
+        if char not in _chars:
+            raise ValueError(f"expected one of {_chars!r} in explorer response, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                # a number at the end of the buffer may continue in the next chunk
+                if end < len(self.text) or self.done:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            self._fill()
+
+
+# parse {"status": ..., "message": ..., "result": [...]} from an iterable of byte chunks
+# a list result is streamed into _buffer, anything else (e.g. an error string) is kept as is
+def parse_explorer_response(_chunks, _buffer):
+    reader = _StreamReader(_chunks)
+    fields = {}
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.expect("}")
+    else:
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            if key == "result" and reader.peek() == "[":
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.expect("]")
+                else:
+                    while True:
+                        _buffer.append(reader.value())
+                        if reader.expect(",]") == "]":
+                            break
+                fields[key] = _buffer
+            else:
+                fields[key] = reader.value()
+
+            if reader.expect(",}") == "}":
+                break
+
+    return ExplorerResponse(
+        fields.get("status"), fields.get("message", ""), fields.get("result")
+    )
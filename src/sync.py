@@ -0,0 +1,100 @@
+import json
+import os
+
+import pandas as pd
+
+
+CURSOR_PATH = "output_files/sync_cursors.json"
+
+# blocks below each cursor that are fetched again in case the chain reorganised
+REORG_OVERLAP_BLOCKS = 256
+
+
+# cursors are stored as {wallet: {chain: {action: highest synced block}}}
+def load_cursors(_path=CURSOR_PATH):
+    if not os.path.exists(_path):
+        return {}
+
+    with open(_path) as f:
+        return json.load(f)
+
+
+# write to a temporary file first so a crash can't leave half a cursor file
+def save_cursors(_cursors, _path=CURSOR_PATH):
+    temp_path = f"{_path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(_cursors, f, indent=4, sort_keys=True)
+    os.replace(temp_path, _path)
+
+
+# first block to request for a wallet, chain and action
+def get_start_block(_cursors, _wallet, _chain, _action):
+    cursor = _cursors.get(_wallet, {}).get(_chain, {}).get(_action)
+    if cursor is None:
+        return 0
+
+    return max(0, cursor - REORG_OVERLAP_BLOCKS)
+
+
+# the first block fetched again for each wallet and chain, {(wallet, chain): block}
+def get_start_blocks(_cursors, _wallets, _chains, _action):
+    return {
+        (wallet, chain): get_start_block(_cursors, wallet, chain, _action)
+        for wallet in _wallets for chain in _chains
+    }
+
+
+# which rows of _transactions are in the blocks fetched again for their wallet and chain
+def in_refetched_blocks(_transactions, _start_blocks):
+    if not _start_blocks or _transactions.empty:
+        return pd.Series(False, index=_transactions.index)
+
+    keys = pd.MultiIndex.from_arrays(
+        [_transactions.wallet.astype(object), _transactions.chain.astype(object)]
+    )
+    starts = pd.Series(list(_start_blocks.values()), index=pd.MultiIndex.from_tuples(_start_blocks))
+    starts = starts.reindex(keys).to_numpy(dtype="float64")
+    # rows of wallets and chains that weren't fetched compare to nan, so are kept
+    return pd.Series(_transactions.blockNumber.to_numpy() >= starts, index=_transactions.index)
+
+
+# move the cursors up to the highest block seen for each wallet and chain
+def update_cursors(_cursors, _transactions, _action):
+    if _transactions.empty:
+        return _cursors
+
+    highest_blocks = _transactions.groupby(["wallet", "chain"], observed=True).blockNumber.max()
+    for (wallet, chain), block in highest_blocks.items():
+        chain_cursors = _cursors.setdefault(wallet, {}).setdefault(chain, {})
+        chain_cursors[_action] = max(int(block), chain_cursors.get(_action, 0))
+
+    return _cursors
+
+
+# the explorers don't give every row a log index, so use the position of each row
+# among the rows for the same hash and wallet, which is stable between fetches
+def _add_ordinal(_transactions):
+    _transactions = _transactions.copy()
+    _transactions["_ordinal"] = _transactions.groupby(["hash", "wallet"], observed=True).cumcount()
+
+    return _transactions
+
+
+# append newly synced rows, replacing rows fetched again in the reorg overlap
+# with _start_blocks every existing row from the first block fetched again is dropped first,
+# so a transaction reorged out of the chain isn't kept
+def append_synced_transactions(_existing, _new, _start_blocks=None):
+    if _existing is None or _existing.empty:
+        return _new.copy()
+    _existing = _existing[~in_refetched_blocks(_existing, _start_blocks)]
+    if _new.empty:
+        return _existing.reset_index(drop=True)
+
+    transactions = pd.concat([_add_ordinal(_existing), _add_ordinal(_new)])
+    transactions = transactions.drop_duplicates(
+        subset=["hash", "wallet", "_ordinal"], keep="last"
+    )
+    del transactions["_ordinal"]
+
+    transactions.reset_index(drop=True, inplace=True)
+    return transactions
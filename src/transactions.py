@@ -1,270 +1,301 @@
-from datetime import datetime
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import numpy as np
 import pandas as pd
-import requests
+from dateutil.tz import gettz
+from pandas.api.extensions import take
+
+from src import utils
+from src.utils import CHAIN_LIST
+from src.cache import OPEN_END_BLOCK, set_offline
+from src.explorer import get_chain_head, get_explorer_response
+from src.streaming import ColumnBuffer
+from src.schema import apply_schema, concat_frames, empty_frame
+from src.storage import dataset_exists, load_frame, write_dataset
+from src.store import upsert
+from src.rpc_logs import get_transfer_records_by_logs
+from src.sync import (
+    REORG_OVERLAP_BLOCKS, load_cursors, save_cursors, get_start_block, get_start_blocks,
+    update_cursors, append_synced_transactions,
+)
+
+
+# fields kept from each explorer action, in the order the explorers return them
+EXPLORER_FIELDS = {
+    "txlist": [
+        "blockNumber", "timeStamp", "hash", "nonce", "blockHash", "transactionIndex",
+        "from", "to", "value", "gas", "gasPrice", "isError", "txreceipt_status", "input",
+        "contractAddress", "cumulativeGasUsed", "gasUsed", "confirmations", "methodId",
+        "functionName",
+    ],
+    "tokentx": [
+        "blockNumber", "timeStamp", "hash", "nonce", "blockHash", "from", "contractAddress",
+        "to", "value", "tokenName", "tokenSymbol", "tokenDecimal", "transactionIndex", "gas",
+        "gasPrice", "gasUsed", "cumulativeGasUsed", "input", "confirmations",
+    ],
+    # type, traceId and errCode aren't used, so they are dropped while parsing
+    "txlistinternal": [
+        "blockNumber", "timeStamp", "hash", "from", "to", "value", "contractAddress", "input",
+        "gas", "gasUsed", "isError",
+    ],
+}
+EXPLORER_INT_FIELDS = {
+    "txlist": [
+        "blockNumber", "timeStamp", "nonce", "transactionIndex", "gas", "gasPrice", "isError",
+        "txreceipt_status", "cumulativeGasUsed", "gasUsed", "confirmations",
+    ],
+    "tokentx": [
+        "blockNumber", "timeStamp", "nonce", "tokenDecimal", "transactionIndex", "gas",
+        "gasPrice", "gasUsed", "cumulativeGasUsed", "confirmations",
+    ],
+    "txlistinternal": ["blockNumber", "timeStamp", "gas", "isError", "gasUsed"],
+}
+# addresses and token names repeat across rows, so each distinct string is stored once
+INTERNED_FIELDS = [
+    "from", "to", "contractAddress", "tokenName", "tokenSymbol", "methodId", "functionName",
+]
+
+
+def new_record_buffer(action):
+    return ColumnBuffer(
+        EXPLORER_FIELDS[action], EXPLORER_INT_FIELDS[action], INTERNED_FIELDS
+    )
+
+
+# block explorers return at most this many records per request
+MAX_RECORDS = 10_000
+# aim well under the cap when sizing block windows, density isn't uniform
+WINDOW_TARGET_RECORDS = 5_000
+MAX_PARALLEL_WINDOWS = 8
+
+
+# split a block range into windows that should each hold WINDOW_TARGET_RECORDS
+# the last window is left open to the end of the range
+def _plan_block_windows(start_block, end_block, density):
+    window_size = max(1, math.floor(WINDOW_TARGET_RECORDS / density))
+
+    windows = []
+    while start_block <= end_block and len(windows) < MAX_PARALLEL_WINDOWS - 1:
+        windows.append((start_block, min(start_block + window_size - 1, end_block)))
+        start_block += window_size
+    if start_block <= end_block:
+        windows.append((start_block, end_block))
 
-from src.utils import CHAINS, CHAIN_LIST, WALLET_LIST, wallet_address_to_name
+    return windows
+
+
+# whether a range ending at end_block can't gain any more records: it has a closed end, at
+# least REORG_OVERLAP_BLOCKS below the chain head
+def _is_settled(chain, end_block):
+    if end_block >= OPEN_END_BLOCK:
+        return False
+
+    return end_block <= get_chain_head(chain) - REORG_OVERLAP_BLOCKS
+
+
+# get every record for a request over [start_block, end_block]
+# when a response is capped at MAX_RECORDS, the rest of the range is split into
+# windows sized from the record density seen so far and fetched in parallel
+# a range that isn't settled, like a window planned past the chain head, is requested open
+# ended and cut back to end_block, so its response is cached like one running to the head
+# rather than kept forever without the records still to come
+def _get_explorer_records(chain, params, start_block, end_block):
+    request_end = end_block if _is_settled(chain, end_block) else OPEN_END_BLOCK
+    params = dict(params, startblock=start_block, endblock=request_end, sort="asc")
+    response = get_explorer_response(
+        chain, params, lambda: new_record_buffer(params["action"])
+    )
+    if response.status != "1":
+        return new_record_buffer(params["action"]), response.message
+
+    records = response.result
+    capped = len(records) >= MAX_RECORDS
+    last_block = records.columns["blockNumber"][-1] if len(records) else end_block
+    if request_end != end_block:
+        records.truncate(records.count_below("blockNumber", end_block + 1))
+    # a capped response that runs past end_block has every record up to it
+    if not capped or last_block > end_block:
+        return records, response.message
+
+    # the last block in a capped response may be cut off part way through
+    records.truncate(records.count_below("blockNumber", last_block))
+    if not len(records):
+        raise Exception(f"More than {MAX_RECORDS} records in block {last_block}")
+
+    density = len(records) / (last_block - start_block)
+    windows = _plan_block_windows(last_block, end_block, density)
+    with ThreadPoolExecutor(max_workers=len(windows)) as executor:
+        window_records = executor.map(
+            lambda window: _get_explorer_records(chain, params, *window)[0],
+            windows
+        )
+        # windows don't overlap, so stitching them in order gives no duplicates
+        for these_records in window_records:
+            records.extend(these_records)
+
+    return records, response.message
 
 
 # get all "normal" transactions for a particular address on a given chain
 def get_normal_transactions_by_wallet(
-    wallet, chain="mainnet", start_block=0, end_block=99999999
+    wallet, chain="mainnet", start_block=0, end_block=OPEN_END_BLOCK
 ):
     wallet = wallet.lower()
-    base_url = CHAINS[chain]["explorer_url"]
-    api_key = CHAINS[chain]["explorer_token"]
-
-    url = (
-        "{}?module=account&action=txlist&address={}&startblock={}&endblock={} \
-        &apikey={}"
-    )
-    url = url.format(base_url, wallet, start_block, end_block, api_key)
-
-    response = requests.get(url).json()
-    if response["status"] == "1":
-        df = pd.DataFrame(response["result"])
-        if len(df) == 10_000:
-            raise Exception("Max records received on this request")
-        df = df[df['isError'] != '1']
-        columns_str_to_int = [
-            "blockNumber",
-            "timeStamp",
-            "nonce",
-            "transactionIndex",
-            "gas",
-            "gasPrice",
-            "isError",
-            "txreceipt_status",
-            "cumulativeGasUsed",
-            "gasUsed",
-            "confirmations",
-        ]
-        for column in columns_str_to_int:
-            df[column] = df[column].astype(int)
+    params = {
+        "module": "account",
+        "action": "txlist",
+        "address": wallet,
+    }
+
+    records, message = _get_explorer_records(chain, params, start_block, end_block)
+    if len(records):
+        df = records.to_frame()
+        # remove reverted transactions
+        df = df[df['isError'].astype(int) != 1]
+        df.reset_index(drop=True, inplace=True)
 
         df["wallet"] = wallet.lower()
-        df["wallet_name"] = wallet_address_to_name[wallet]
+        df["wallet_name"] = utils.wallet_address_to_name[wallet]
         df["chain"] = chain
-        df.loc[:, ("to")] = [to.lower() for to in df["to"]]
-
-        # remove reverted transactions
-        df.reset_index(drop=True, inplace=True)
+        df["to"] = df["to"].str.lower()
+        df = apply_schema(df, "normal_transactions")
 
         print(f"{len(df)} transaction(s) found")
         return df
     else:
-        print(response["message"])
-    df = pd.DataFrame(
-        columns=[
-            "blockNumber",
-            "timeStamp",
-            "hash",
-            "nonce",
-            "blockHash",
-            "transactionIndex",
-            "from",
-            "to",
-            "value",
-            "gas",
-            "gasPrice",
-            "isError",
-            "txreceipt_status",
-            "input",
-            "contractAddress",
-            "cumulativeGasUsed",
-            "gasUsed",
-            "confirmations",
-            "methodId",
-            "functionName",
-            "wallet",
-            "wallet_name",
-            "chain",
-        ]
-    )
-    return df
+        print(message)
+    return empty_frame("normal_transactions")
 
 
 # get all internal transactions by address
 def get_internal_transactions_by_wallet(
-    wallet, chain="mainnet", start_block=0, end_block=99999999
+    wallet, chain="mainnet", start_block=0, end_block=OPEN_END_BLOCK
 ):
-    base_url = CHAINS[chain]["explorer_url"]
-    api_key = CHAINS[chain]["explorer_token"]
-
-    url = (
-        "{}?module=account&action=txlistinternal&address={}&startblock={} \
-                &endblock={}&apikey={}"
-    )
-    url = url.format(base_url, wallet, start_block, end_block, api_key)
+    params = {
+        "module": "account",
+        "action": "txlistinternal",
+        "address": wallet,
+    }
 
-    response = requests.get(url).json()
+    records, message = _get_explorer_records(chain, params, start_block, end_block)
 
-    if response["status"] == "1":
-        df = pd.DataFrame(response["result"])
-        if len(df) == 10_000:
-            raise Exception("Max records received on this request")
-        df = df[df['isError'] != '1']
+    if len(records):
+        df = records.to_frame()
+        df = df[df['isError'].astype(int) != 1]
+        df.reset_index(drop=True, inplace=True)
         df['wallet'] = wallet.lower()
-        df['wallet_name'] = wallet_address_to_name[wallet]
+        df['wallet_name'] = utils.wallet_address_to_name[wallet]
         df['chain'] = chain
+        df["to"] = df["to"].str.lower()
 
-        empty_columns_to_add = [
-            'nonce',
-            'blockHash',
-            'transactionIndex',
-            'gasPrice',
-            'txreceipt_status',
-            'cumulativeGasUsed',
-            'confirmations',
-            'methodId',
-            'functionName']
-        for column in empty_columns_to_add:
-            df[column] = ''
-
-        columns_str_to_int = [
-            "blockNumber",
-            "timeStamp",
-            "gas",
-            "isError",
-            "gasUsed",
-        ]
-        for column in columns_str_to_int:
-            df[column] = df[column].astype(int)
-
-        df.loc[:, ("to")] = [to.lower() for to in df["to"]]
-
-        del df['type']
-        del df['traceId']
-        del df['errCode']
+        # the columns only normal transactions have are left empty
+        df = apply_schema(df, "internal_transactions")
 
         print(f"{len(df)} transaction(s) found")
         return df
     else:
-        print(response["message"])
-    df = pd.DataFrame(
-        columns=[
-            "blockNumber",
-            "timeStamp",
-            "hash",
-            "nonce",
-            "blockHash",
-            "transactionIndex",
-            "from",
-            "to",
-            "value",
-            "gas",
-            "gasPrice",
-            "isError",
-            "txreceipt_status",
-            "input",
-            "contractAddress",
-            "cumulativeGasUsed",
-            "gasUsed",
-            "confirmations",
-            "methodId",
-            "functionName",
-            "wallet",
-            "wallet_name",
-            "chain",
-        ]
-    )
-    return df
+        print(message)
+    return empty_frame("internal_transactions")
+
+
+# build the token transfers frame for one wallet from its "tokentx" records
+def format_token_transfers(records, wallet, chain):
+    df = records.to_frame()
+    df["wallet"] = wallet
+    df["wallet_name"] = utils.wallet_address_to_name[wallet]
+    df["chain"] = chain
+
+    return apply_schema(df, "token_transfers")
 
 
 # get all erc20 sends for a given wallet
 def get_token_transfers_by_wallet(
-    wallet, token=None, chain="mainnet", start_block=0, end_block=99999999
+    wallet, token=None, chain="mainnet", start_block=0, end_block=OPEN_END_BLOCK
 ):
-    base_url = CHAINS[chain]["explorer_url"]
-    api_key = CHAINS[chain]["explorer_token"]
-
+    params = {
+        "module": "account",
+        "action": "tokentx",
+        "address": wallet,
+    }
     if token:
-        url = "{}?module=account&action=tokentx&contractaddress={}&address={} \
-                &startblock={}&endblock={}&apikey={}"
-        url = url.format(
-                base_url, token, wallet, start_block, end_block, api_key
-            )
-    else:
-        url = "{}?module=account&action=tokentx&address={}&startblock={}& \
-                endblock={}&apikey={}"
-        url = url.format(base_url, wallet, start_block, end_block, api_key)
-
-    response = requests.get(url).json()
-    if response["status"] == "1":
-        df = pd.DataFrame(response["result"])
-        if len(df) == 10_000:
-            raise Exception("Max records received on this request")
-        columns_str_to_int = [
-            "blockNumber",
-            "timeStamp",
-            "nonce",
-            "tokenDecimal",
-            "transactionIndex",
-            "gas",
-            "gasPrice",
-            "gasUsed",
-            "cumulativeGasUsed",
-            "confirmations",
-        ]
-        for column in columns_str_to_int:
-            df[column] = pd.to_numeric(df[column])
+        params["contractaddress"] = token
 
-        df["wallet"] = wallet
-        df["wallet_name"] = wallet_address_to_name[wallet]
-        df["chain"] = chain
-        df['value'] = [int(value) for value in df.value]
+    records, message = _get_explorer_records(chain, params, start_block, end_block)
+    if len(records):
+        df = format_token_transfers(records, wallet, chain)
 
         print(f"{len(df)} token transfers found")
         return df
     else:
-        print(response["message"])
+        print(message)
 
     # ensure no errors if nothing is found
-    return pd.DataFrame(
-        columns=[
-            "blockNumber",
-            "timeStamp",
-            "hash",
-            "nonce",
-            "blockHash",
-            "from",
-            "contractAddress",
-            "to",
-            "value",
-            "tokenName",
-            "tokenSymbol",
-            "tokenDecimal",
-            "transactionIndex",
-            "gas",
-            "gasPrice",
-            "gasUsed",
-            "cumulativeGasUsed",
-            "input",
-            "confirmations",
-            "wallet",
-            "wallet_name",
-            "chain",
-        ]
-    )
+    return empty_frame("token_transfers")
+
+
+# run a per-wallet fetch for every wallet and chain
+# each block explorer gets its own worker (and rate limit), so the chains are crawled
+# in parallel while the frames are still concatenated in wallet-by-chain order
+# _priority(wallet, chain) orders the wallets within a chain, lowest first
+def _fetch_all(_fetch, _wallets, _chains, concurrent=True, _priority=None):
+    def fetch_chain(chain):
+        wallets = _wallets
+        if _priority:
+            wallets = sorted(_wallets, key=lambda wallet: _priority(wallet, chain))
+
+        frames = {}
+        for wallet in wallets:
+            print(f"{utils.wallet_address_to_name[wallet]}, {chain}")
+            frames[wallet] = _fetch(wallet, chain)
+        return frames
+
+    if concurrent and len(_chains) > 1:
+        with ThreadPoolExecutor(max_workers=len(_chains)) as executor:
+            frames_by_chain = dict(zip(_chains, executor.map(fetch_chain, _chains)))
+    else:
+        frames_by_chain = {chain: fetch_chain(chain) for chain in _chains}
+
+    frames = [frames_by_chain[chain][wallet] for wallet in _wallets for chain in _chains]
+    if not frames:
+        return pd.DataFrame()
+
+    transactions = pd.concat(frames)
+    transactions.reset_index(drop=True, inplace=True)
+    return transactions.copy()
+
+
+# like _fetch_all, for fetches that cover every wallet on a chain at once
+# _fetch(wallets, chain) returns {wallet: frame}
+def _fetch_all_by_chain(_fetch, _wallets, _chains, concurrent=True):
+    if concurrent and len(_chains) > 1:
+        with ThreadPoolExecutor(max_workers=len(_chains)) as executor:
+            frames_by_chain = dict(zip(
+                _chains, executor.map(lambda chain: _fetch(_wallets, chain), _chains)
+            ))
+    else:
+        frames_by_chain = {chain: _fetch(_wallets, chain) for chain in _chains}
 
+    frames = [frames_by_chain[chain][wallet] for wallet in _wallets for chain in _chains]
+    if not frames:
+        return pd.DataFrame()
 
-def get_normal_transactions(_wallets, _chains):
+    transactions = pd.concat(frames)
+    transactions.reset_index(drop=True, inplace=True)
+    return transactions.copy()
+
+
+def get_normal_transactions(_wallets, _chains, concurrent=True):
     if isinstance(_wallets, str):
         _wallets = [_wallets]
     if isinstance(_chains, str):
         _chains = [_chains]
-    normal_transactions = pd.DataFrame()
-
-    for wallet in _wallets:
-        for chain in _chains:
-            print(f"{wallet_address_to_name[wallet]}, {chain}")
-            normal_transactions = pd.concat(
-                [normal_transactions, get_normal_transactions_by_wallet(
-                    wallet, chain)
-                 ]
-            )
 
-    normal_transactions.reset_index(drop=True, inplace=True)
-    return normal_transactions.copy()
+    normal_transactions = _fetch_all(
+        get_normal_transactions_by_wallet, _wallets, _chains, concurrent
+    )
+    return apply_schema(normal_transactions, "normal_transactions")
 
 
 def filter_normal_transactions(_normal_transactions, _addresses):
@@ -279,33 +310,67 @@ def filter_normal_transactions(_normal_transactions, _addresses):
     return normal_transactions_filtered.copy()
 
 
-def get_token_transfers(wallets, chains):
-    token_transfers = pd.DataFrame()
-    for wallet in wallets:
-        for chain in chains:
-            print(f"{wallet_address_to_name[wallet]}, {chain}")
-            temp_transfers = get_token_transfers_by_wallet(wallet, None, chain)
-            token_transfers = pd.concat([token_transfers, temp_transfers])
+# backend="rpc" reads erc20 Transfer logs over json-rpc instead of the explorers,
+# which also covers chains without an explorer api like harmony
+# chains without an rpc_url are read from their explorer
+def get_token_transfers(wallets, chains, concurrent=True, backend="explorer"):
+    if isinstance(chains, str):
+        chains = [chains]
 
-    token_transfers.reset_index(drop=True, inplace=True)
-    return token_transfers.copy()
+    if backend == "rpc":
+        unreachable = [
+            chain for chain in chains
+            if not utils.CHAINS[chain].get("rpc_url") and not utils.CHAINS[chain]["explorer_url"]
+        ]
+        if unreachable:
+            raise Exception(f"No rpc_url or explorer_url to read token transfers on {', '.join(unreachable)}")
 
+        def get_chain_token_transfers(wallets, chain):
+            if utils.CHAINS[chain].get("rpc_url"):
+                return get_token_transfers_by_logs(wallets, chain)
 
-def get_internal_transactions(_wallets, _chains):
-    internal_transactions = pd.DataFrame()
+            print(f"{chain} has no rpc_url, reading its token transfers from the explorer")
+            return {wallet: get_token_transfers_by_wallet(wallet, None, chain) for wallet in wallets}
 
-    for wallet in _wallets:
-        for chain in _chains:
-            print(f"{wallet_address_to_name[wallet]}, {chain}")
-            temp_transactions = get_internal_transactions_by_wallet(
-                    wallet, chain
-                )
-            internal_transactions = pd.concat(
-                    [internal_transactions, temp_transactions]
-                )
+        token_transfers = _fetch_all_by_chain(
+            get_chain_token_transfers, wallets, chains, concurrent
+        )
+    else:
+        token_transfers = _fetch_all(
+            lambda wallet, chain: get_token_transfers_by_wallet(wallet, None, chain),
+            wallets,
+            chains,
+            concurrent
+        )
+
+    # token categories differ between wallets, so they're rebuilt for the whole frame
+    return apply_schema(token_transfers, "token_transfers")
+
+
+# get the erc20 transfers for all wallets on a chain from Transfer logs
+# returns {wallet: frame} with the same columns as get_token_transfers_by_wallet
+def get_token_transfers_by_logs(wallets, chain="mainnet", start_block=0, end_block=None):
+    records_by_wallet = get_transfer_records_by_logs(
+        wallets, chain, lambda: new_record_buffer("tokentx"), start_block, end_block
+    )
 
-    internal_transactions.reset_index(drop=True, inplace=True)
-    return internal_transactions.copy()
+    transfers = {}
+    for wallet in wallets:
+        records = records_by_wallet[wallet]
+        print(f"{utils.wallet_address_to_name[wallet]}, {chain}: {len(records)} token transfers found")
+        if len(records):
+            transfers[wallet] = format_token_transfers(records, wallet, chain)
+        else:
+            transfers[wallet] = empty_frame("token_transfers")
+
+    return transfers
+
+
+def get_internal_transactions(_wallets, _chains, concurrent=True):
+    internal_transactions = _fetch_all(
+        get_internal_transactions_by_wallet, _wallets, _chains, concurrent
+    )
+    return apply_schema(internal_transactions, "internal_transactions")
 
 
 # get all erc20 tokens interacted with
@@ -321,176 +386,200 @@ def get_all_tokens_interacted_with(wallets, chains):
 
 # format transactions so that raw eth is same format as erc20 transfers
 def get_raw_transfers(_normal_transactions, _internal_transactions):
-    combined_transactions = pd.concat(
-            [_normal_transactions, _internal_transactions]
+    # only the transactions moving value are kept, so filter before combining
+    # most send nothing, and only the values that aren't a plain "0" need parsing
+    moving_value = []
+    for transactions in [_normal_transactions, _internal_transactions]:
+        transactions = transactions[transactions['value'] != "0"]
+        values = transactions['value'].astype("uint256")
+        moving_value.append(transactions.assign(value=values)[(values > 0).to_numpy()])
+    plus_value_transactions = concat_frames(moving_value)
+
+    # chain is a category, so each chain is only looked up once
+    for column, key in [
+        ("tokenName", "base_token_name"),
+        ("tokenSymbol", "base_token_symbol"),
+        ("tokenDecimal", "base_token_decimals"),
+    ]:
+        plus_value_transactions[column] = plus_value_transactions["chain"].map(
+            {chain: utils.CHAINS[chain][key] for chain in utils.CHAINS}
         )
-    combined_transactions.loc[:, ('value')] = [
-            int(value) for value in combined_transactions['value']
-        ]
-    plus_value_transactions = combined_transactions[
-            combined_transactions['value'] > 0].copy()
 
-    plus_value_transactions.reset_index(drop=True, inplace=True)
-    plus_value_chains = plus_value_transactions.loc[:, ("chain")]
-    plus_value_transactions.loc[:, ('tokenName')] = [
-            CHAINS[chain]["base_token_name"] for chain in plus_value_chains
-        ]
-    plus_value_transactions.loc[:, ('tokenSymbol')] = [
-            CHAINS[chain]["base_token_symbol"] for chain in plus_value_chains
-        ]
-    plus_value_transactions.loc[:, ('tokenDecimal')] = [
-            CHAINS[chain]["base_token_decimals"] for chain in plus_value_chains
-        ]
+    return apply_schema(plus_value_transactions, "token_transfers")
 
-    plus_value_transactions = plus_value_transactions.loc[:, (
-                "blockNumber",
-                "timeStamp",
-                "hash",
-                "nonce",
-                "blockHash",
-                "from",
-                "contractAddress",
-                "to",
-                "value",
-                "tokenName",
-                "tokenSymbol",
-                "tokenDecimal",
-                "transactionIndex",
-                "gas",
-                "gasPrice",
-                "gasUsed",
-                "cumulativeGasUsed",
-                "input",
-                "confirmations",
-                "wallet",
-                "wallet_name",
-                "chain"
-            )
-        ]
 
-    return plus_value_transactions
+# transfer columns renamed in the merged frame, the transaction's own fields take their names
+TRANSFER_RENAMES = {
+    "from": "transferFrom",
+    "to": "transferTo",
+    "value": "amount",
+    "input": "input_deprecated",
+}
+
+# the only columns taken from the normal transaction of each transfer
+TRANSACTION_COLUMNS = [
+    "from", "to", "value", "isError", "txreceipt_status", "input", "methodId", "functionName",
+]
+
+
+# normal transactions by (hash, wallet), built once to look up every transfer's transaction
+# each (hash, wallet) is turned into one integer key, so lookups are a binary search over
+# sorted integers rather than comparing strings
+def build_transaction_index(_normal_transactions):
+    hashes = pd.Index(_normal_transactions.hash.unique())
+    wallets = _normal_transactions.wallet.astype("category").cat.categories
+    keys = _transaction_keys(hashes, wallets, _normal_transactions)
+
+    # the first transaction for each key
+    sorted_keys, positions = np.unique(keys, return_index=True)
+    return hashes, wallets, sorted_keys, positions
+
+
+def _transaction_keys(_hashes, _wallets, _transactions):
+    hash_codes = _hashes.get_indexer(_transactions.hash).astype(np.int64)
+    wallet_codes = pd.Categorical(_transactions.wallet, categories=_wallets).codes.astype(np.int64)
+    keys = hash_codes * len(_wallets) + wallet_codes
+
+    return np.where((hash_codes == -1) | (wallet_codes == -1), -1, keys)
+
+
+# the position in _normal_transactions of the transaction each transfer came from, or -1
+def find_transactions(_transaction_index, _transfers):
+    hashes, wallets, sorted_keys, positions = _transaction_index
+    keys = _transaction_keys(hashes, wallets, _transfers)
+
+    if not len(sorted_keys):
+        return np.full(len(keys), -1)
+
+    found = np.searchsorted(sorted_keys, keys).clip(max=len(sorted_keys) - 1)
+    return np.where((keys != -1) & (sorted_keys[found] == keys), positions[found], -1)
+
+
+# local time, like datetime.fromtimestamp
+# gettz() reads the local zone's transition table, which pandas converts with in one pass
+def timestamps_to_datetimes(_timestamps):
+    return (
+        pd.to_datetime(_timestamps, unit="s", utc=True)
+        .dt.tz_convert(gettz())
+        .dt.tz_localize(None)
+    )
 
 
 # merge transactions with all token and raw eth transfers
-# reformat columns to remove duplicate columns
+# each transfer keeps its own columns and gets the from, to, value, input and function
+# of the normal transaction with the same hash and wallet, if there is one
 def merge_transactions_and_token_transfers(
         _normal_transactions, _token_transfers, _internal_transactions
 ):
     raw_transfers = get_raw_transfers(
             _normal_transactions, _internal_transactions
         )
-    token_transfers = pd.concat([_token_transfers, raw_transfers])
-    token_transfers.reset_index(drop=True, inplace=True)
+    merged_transfers = concat_frames([_token_transfers, raw_transfers])
+    merged_transfers.reset_index(drop=True, inplace=True)
+    merged_transfers.rename(columns=TRANSFER_RENAMES, inplace=True)
+
+    positions = find_transactions(build_transaction_index(_normal_transactions), merged_transfers)
+    for column in TRANSACTION_COLUMNS:
+        merged_transfers[column] = take(
+            _normal_transactions[column].array, positions, allow_fill=True
+        )
 
-    merged_transfers = token_transfers.merge(
-        _normal_transactions, how="left", on=["hash", "wallet"],
-        suffixes=(None, "_tx")
+    # add additional columns for use later
+    merged_transfers['datetime'] = timestamps_to_datetimes(merged_transfers.timeStamp)
+    merged_transfers['amount_fixed'] = merged_transfers.amount.array.scale(merged_transfers.tokenDecimal)
+
+    # transfers without a transaction have always had the function name "nan"
+    function_names = merged_transfers.functionName.astype("category")
+    if function_names.isna().any():
+        if "nan" not in function_names.cat.categories:
+            function_names = function_names.cat.add_categories(["nan"])
+        function_names = function_names.fillna("nan")
+    merged_transfers['functionName'] = function_names
+    # the action is the function name without its arguments
+    # mapping a categorical only maps each distinct name once
+    merged_transfers['action'] = function_names.map(lambda name: name.split("(")[0])
+
+    return apply_schema(merged_transfers, "all_transfers")
+
+
+ACTION_SCHEMAS = {
+    "txlist": "normal_transactions",
+    "tokentx": "token_transfers",
+    "txlistinternal": "internal_transactions",
+}
+
+
+# fetch only the blocks after the saved cursors and append them to existing transactions
+# _fetch takes (wallet, chain, start_block)
+def sync_transactions(_existing, _fetch, _action, _wallets, _chains, _cursors, concurrent=True):
+    # without the existing rows the cursors are meaningless, so start from scratch
+    if _existing is None:
+        _cursors = {}
+
+    def start_block(wallet, chain):
+        return get_start_block(_cursors, wallet, chain, _action)
+
+    def fetch_new(wallet, chain):
+        return _fetch(wallet, chain, start_block(wallet, chain))
+
+    # the stalest wallets are synced first, so they get the rate limit budget first
+    new_transactions = _fetch_all(
+        fetch_new, _wallets, _chains, concurrent, _priority=start_block
+    )
+    transactions = append_synced_transactions(
+        _existing, new_transactions, get_start_blocks(_cursors, _wallets, _chains, _action)
     )
+    return apply_schema(transactions, ACTION_SCHEMAS[_action])
 
-    merged_transfers = merged_transfers[
-        [
-            "blockNumber",
-            "timeStamp",
-            "hash",
-            "nonce",
-            "blockHash",
-            "from",
-            "from_tx",
-            "contractAddress",
-            "to",
-            "to_tx",
-            "value",
-            "tokenName",
-            "tokenSymbol",
-            "tokenDecimal",
-            "transactionIndex",
-            "gas",
-            "gasPrice",
-            "gasUsed",
-            "cumulativeGasUsed",
-            "input",
-            "confirmations",
-            "value_tx",
-            "isError",
-            "txreceipt_status",
-            "input_tx",
-            "methodId",
-            "functionName",
-            "wallet",
-            "wallet_name",
-            "chain",
-        ]
-    ]
 
-    merged_transfers.columns = [
-        "blockNumber",
-        "timeStamp",
-        "hash",
-        "nonce",
-        "blockHash",
-        "transferFrom",
-        "from",
-        "contractAddress",
-        "transferTo",
-        "to",
-        "amount",
-        "tokenName",
-        "tokenSymbol",
-        "tokenDecimal",
-        "transactionIndex",
-        "gas",
-        "gasPrice",
-        "gasUsed",
-        "cumulativeGasUsed",
-        "input_deprecated",
-        "confirmations",
-        "value",
-        "isError",
-        "txreceipt_status",
-        "input",
-        "methodId",
-        "functionName",
-        "wallet",
-        "wallet_name",
-        "chain",
-    ]
-    columns_str_to_int = [
-        "blockNumber",
-        "timeStamp",
-        "nonce",
-        "tokenDecimal",
-        "transactionIndex",
-        "gas",
-        "gasPrice",
-        "gasUsed",
-        "cumulativeGasUsed",
-        "confirmations",
-    ]
-    for column in columns_str_to_int:
-        merged_transfers[column] = pd.to_numeric(merged_transfers[column])
-    merged_transfers['amount'] = [int(amount) for amount in merged_transfers.amount]
+def _read_existing(_path, _name):
+    if not dataset_exists(_name) and not os.path.exists(_path):
+        return None
+    return load_frame(_name)
 
-    # add additional columns for use later
-    merged_transfers['datetime'] = [datetime.fromtimestamp(timestamp) for timestamp in merged_transfers.timeStamp]
-    merged_transfers['amount_fixed'] = merged_transfers.amount / 10**merged_transfers.tokenDecimal 
-    merged_transfers['functionName'] = merged_transfers.functionName.astype(str)
-    merged_transfers['action'] = [name.split("(")[0] for name in merged_transfers['functionName']]
 
-    return merged_transfers
+def main(sync=False):
+    wallets = utils.WALLET_LIST
+    chains = CHAIN_LIST
 
+    if sync:
+        cursors = load_cursors()
 
-def main():
-    wallets = WALLET_LIST
-    chains = CHAIN_LIST
+        print("Syncing normal transactions")
+        normal_transactions = sync_transactions(
+            _read_existing("output_files/normal_transactions.csv", "normal_transactions"),
+            lambda wallet, chain, start_block: get_normal_transactions_by_wallet(
+                wallet, chain, start_block
+            ),
+            "txlist", wallets, chains, cursors
+        )
 
-    print("Getting normal transactions")
-    normal_transactions = get_normal_transactions(wallets, chains)
+        print("Syncing token transfers")
+        token_transfers = sync_transactions(
+            _read_existing("output_files/token_transfers.csv", "token_transfers"),
+            lambda wallet, chain, start_block: get_token_transfers_by_wallet(
+                wallet, None, chain, start_block
+            ),
+            "tokentx", wallets, chains, cursors
+        )
 
-    print("Getting token transfers")
-    token_transfers = get_token_transfers(wallets, chains)
+        print("Syncing internal transactions")
+        internal_transactions = sync_transactions(
+            _read_existing("output_files/internal_transactions.csv", "internal_transactions"),
+            lambda wallet, chain, start_block: get_internal_transactions_by_wallet(
+                wallet, chain, start_block
+            ),
+            "txlistinternal", wallets, chains, cursors
+        )
+    else:
+        print("Getting normal transactions")
+        normal_transactions = get_normal_transactions(wallets, chains)
 
-    print("Getting internal transactions")
-    internal_transactions = get_internal_transactions(wallets, chains)
+        print("Getting token transfers")
+        token_transfers = get_token_transfers(wallets, chains)
+
+        print("Getting internal transactions")
+        internal_transactions = get_internal_transactions(wallets, chains)
 
     print("Getting all transfers")
     all_transfers = merge_transactions_and_token_transfers(normal_transactions, token_transfers, internal_transactions)
@@ -499,16 +588,50 @@ def main():
 
 
 if __name__ == "__main__":
-    normal_transactions, token_transfers, internal_transactions, all_transfers = main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="only fetch blocks after the saved cursors and append to output_files",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="serve explorer responses only from the cache, never the network",
+    )
+    args = parser.parse_args()
+    set_offline(args.offline)
+
+    normal_transactions, token_transfers, internal_transactions, all_transfers = main(args.sync)
 
     normal_transactions.to_csv("output_files/normal_transactions.csv", index=False)
     token_transfers.to_csv("output_files/token_transfers.csv", index=False)
     internal_transactions.to_csv("output_files/internal_transactions.csv", index=False)
     all_transfers.to_csv("output_files/all_transfers.csv", index=False)
 
-
-
-normal_transactions = pd.read_csv("output_files/normal_transactions.csv")
-internal_transactions = pd.read_csv("output_files/internal_transactions.csv")
-token_transfers = pd.read_csv("output_files/token_transfers.csv")
-all_transfers = merge_transactions_and_token_transfers(normal_transactions, token_transfers, internal_transactions)
+    write_dataset(normal_transactions, "normal_transactions")
+    write_dataset(token_transfers, "token_transfers")
+    write_dataset(internal_transactions, "internal_transactions")
+    write_dataset(all_transfers, "all_transfers")
+
+    # the stored rows in the blocks fetched again are replaced, so rows reorged out of the
+    # chain are dropped, everything when the whole history was fetched
+    cursors = load_cursors() if args.sync else {}
+    start_blocks = {
+        action: get_start_blocks(cursors, utils.WALLET_LIST, CHAIN_LIST, action)
+        for action in ACTION_SCHEMAS
+    }
+    upsert(normal_transactions, "normal_transactions", replace_from=start_blocks["txlist"])
+    upsert(token_transfers, "token_transfers", replace_from=start_blocks["tokentx"])
+    upsert(internal_transactions, "internal_transactions", replace_from=start_blocks["txlistinternal"])
+    # all transfers are rebuilt from all three, so from the lowest block any was fetched from
+    upsert(all_transfers, "all_transfers", replace_from={
+        key: min(blocks[key] for blocks in start_blocks.values()) for key in start_blocks["txlist"]
+    })
+
+    # only move the cursors once the data they describe has been written
+    cursors = load_cursors()
+    update_cursors(cursors, normal_transactions, "txlist")
+    update_cursors(cursors, token_transfers, "tokentx")
+    update_cursors(cursors, internal_transactions, "txlistinternal")
+    save_cursors(cursors)
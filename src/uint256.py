@@ -0,0 +1,318 @@
+import numbers
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import (
+    ExtensionArray, ExtensionDtype, register_extension_dtype, take
+)
+
+
+# exact unsigned 256-bit integers for token amounts, which don't fit in int64
+# (1,000 tokens with 18 decimals is already 10**21) and would otherwise be an
+# object column of python ints
+# each value is stored as eight little-endian 32-bit limbs, so parsing, comparing,
+# summing and scaling by token decimals are all done on whole numpy columns
+
+LIMBS = 8
+LIMB_BITS = 32
+LIMB_MASK = (1 << LIMB_BITS) - 1
+MAX_UINT256 = (1 << 256) - 1
+
+# decimal strings are read and written nine digits at a time, so every
+# intermediate product of a limb and 10**9 fits in a uint64
+CHUNK_DIGITS = 9
+CHUNK = 10**CHUNK_DIGITS
+# 2**256 has 78 digits, rounded up to whole chunks
+MAX_DIGITS = 81
+
+# token decimals are looked up rather than raised to a power per value
+# 10**22 is the largest power of ten a float64 holds exactly
+EXACT_FLOAT_DIGITS = 22
+FLOAT_POWERS_OF_TEN = np.array([float(10**i) for i in range(EXACT_FLOAT_DIGITS + 1)])
+# below 2**53 every integer is exact as a float64
+EXACT_FLOAT_BITS = 53
+POWERS_OF_TEN = np.array([10**i for i in range(MAX_DIGITS)], dtype=object)
+
+
+def _int_to_limbs(_value):
+    if not 0 <= _value <= MAX_UINT256:
+        raise ValueError(f"{_value} is not a uint256")
+    return np.frombuffer(_value.to_bytes(4 * LIMBS, "little"), dtype="<u4")
+
+
+def _strings_to_limbs(_strings):
+    if not len(_strings):
+        return np.zeros((0, LIMBS), dtype="<u4")
+
+    strings = np.asarray(_strings).astype("S")
+    width = -(-strings.dtype.itemsize // CHUNK_DIGITS) * CHUNK_DIGITS
+    if width > MAX_DIGITS:
+        raise ValueError("value is not a uint256")
+
+    # right align the digits of each string in a matrix a whole number of chunks wide,
+    # copying the strings of each length as one block
+    raw = np.frombuffer(strings.tobytes(), dtype=np.uint8).reshape(len(strings), -1)
+    lengths = (raw != 0).sum(axis=1)
+    order = np.argsort(lengths, kind="stable")
+    sorted_lengths = lengths[order]
+    sorted_raw = raw[order]
+    digits = np.full((len(strings), width), ord("0"), dtype=np.uint8)
+    starts = np.flatnonzero(np.diff(sorted_lengths, prepend=-1))
+    for start, end in zip(starts, np.append(starts[1:], len(strings))):
+        length = sorted_lengths[start]
+        digits[start:end, width - length:] = sorted_raw[start:end, :length]
+    digits -= ord("0")
+    if (digits > 9).any() or (lengths == 0).any():
+        raise ValueError("value is not a uint256")
+
+    # each chunk of nine digits is below 2**53, so the float product is exact
+    powers = 10.0 ** np.arange(CHUNK_DIGITS - 1, -1, -1)
+    chunks = (digits.reshape(len(strings), -1, CHUNK_DIGITS) @ powers).astype(np.uint64)
+
+    # limbs = limbs * 10**9 + chunk, for each chunk from the most significant
+    # only the limbs that can be non-zero so far are touched
+    limbs = np.zeros((LIMBS, len(strings)), dtype=np.uint64)
+    used = 0
+    for k in range(chunks.shape[1]):
+        carry = chunks[:, k]
+        if not used and not carry.any():
+            continue
+        used = min(LIMBS, used + 1)
+        for i in range(used):
+            product = limbs[i] * np.uint64(CHUNK) + carry
+            limbs[i] = product & np.uint64(LIMB_MASK)
+            carry = product >> np.uint64(LIMB_BITS)
+        if carry.any():
+            raise ValueError("value is not a uint256")
+
+    # back from length order to the original order
+    unsorted = np.empty((len(strings), LIMBS), dtype="<u4")
+    unsorted[order] = limbs.T
+    return unsorted
+
+
+@register_extension_dtype
+class Uint256Dtype(ExtensionDtype):
+    name = "uint256"
+    type = int
+    kind = "O"
+    na_value = pd.NA
+
+    @classmethod
+    def construct_array_type(cls):
+        return Uint256Array
+
+
+class Uint256Array(ExtensionArray):
+    def __init__(self, _limbs, _mask=None):
+        self._limbs = _limbs
+        self._mask = np.zeros(len(_limbs), dtype=bool) if _mask is None else _mask
+
+    # from python ints, decimal strings or another Uint256Array, with None/NaN/"" as missing
+    @classmethod
+    def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+        if isinstance(scalars, cls):
+            return scalars.copy() if copy else scalars
+
+        values = np.asarray(scalars, dtype=object)
+        mask = np.asarray(pd.isna(values), dtype=bool) | (values == "")
+        limbs = np.zeros((len(values), LIMBS), dtype="<u4")
+
+        present = values[~mask]
+        if pd.api.types.infer_dtype(present, skipna=False) in ["integer", "empty"]:
+            # ints up to 2**64 convert directly, bigger ones go through their digits
+            if len(present) and max(present) <= np.iinfo(np.uint64).max and min(present) >= 0:
+                small = present.astype(np.uint64)
+                limbs[~mask, 0] = small & np.uint64(LIMB_MASK)
+                limbs[~mask, 1] = small >> np.uint64(LIMB_BITS)
+            elif len(present):
+                limbs[~mask] = _strings_to_limbs(present.astype(str))
+        else:
+            limbs[~mask] = _strings_to_limbs(present)
+
+        return cls(limbs, mask)
+
+    @classmethod
+    def _from_sequence_of_strings(cls, strings, *, dtype=None, copy=False):
+        return cls._from_sequence(strings, dtype=dtype, copy=copy)
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        return cls._from_sequence(values)
+
+    @classmethod
+    def _concat_same_type(cls, to_concat):
+        return cls(
+            np.concatenate([array._limbs for array in to_concat]),
+            np.concatenate([array._mask for array in to_concat]),
+        )
+
+    @property
+    def dtype(self):
+        return Uint256Dtype()
+
+    @property
+    def nbytes(self):
+        return self._limbs.nbytes + self._mask.nbytes
+
+    def __len__(self):
+        return len(self._limbs)
+
+    def __getitem__(self, item):
+        if isinstance(item, numbers.Integral):
+            if self._mask[item]:
+                return pd.NA
+            return int.from_bytes(self._limbs[item].tobytes(), "little")
+
+        item = pd.api.indexers.check_array_indexer(self, item)
+        return type(self)(self._limbs[item], self._mask[item])
+
+    def __setitem__(self, key, value):
+        value = type(self)._from_sequence(np.atleast_1d(np.asarray(value, dtype=object)))
+        key = pd.api.indexers.check_array_indexer(self, key)
+        self._limbs[key] = value._limbs
+        self._mask[key] = value._mask
+
+    def isna(self):
+        return self._mask.copy()
+
+    def copy(self):
+        return type(self)(self._limbs.copy(), self._mask.copy())
+
+    def take(self, indices, allow_fill=False, fill_value=None):
+        positions = take(np.arange(len(self)), indices, allow_fill=allow_fill, fill_value=-1)
+        missing = positions == -1
+        limbs = self._limbs[positions]
+        mask = self._mask[positions] | missing
+        if allow_fill and fill_value is not None and not pd.isna(fill_value):
+            limbs[missing] = _int_to_limbs(int(fill_value))
+            mask[missing] = False
+        else:
+            limbs[missing] = 0
+
+        return type(self)(limbs, mask)
+
+    # python ints, one per value, for output and anything that needs objects
+    def to_ints(self):
+        data = self._limbs.tobytes()
+        width = 4 * LIMBS
+        return np.array([
+            pd.NA if missing else int.from_bytes(data[i * width:(i + 1) * width], "little")
+            for i, missing in enumerate(self._mask)
+        ], dtype=object)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.to_ints()
+
+    def _values_for_factorize(self):
+        values = self.to_ints()
+        values[self._mask] = None
+        return values, None
+
+    def _values_for_argsort(self):
+        return self.to_ints()
+
+    def astype(self, dtype, copy=True):
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if isinstance(dtype, Uint256Dtype):
+            return self.copy() if copy else self
+        if pd.api.types.is_float_dtype(dtype):
+            return self.scale(0).astype(dtype)
+        if pd.api.types.is_string_dtype(dtype) and not pd.api.types.is_object_dtype(dtype):
+            return self.to_ints().astype(str).astype(dtype)
+
+        return np.asarray(self.to_ints(), dtype=dtype)
+
+    # value / 10**decimals as float64, with decimals a scalar or one per value
+    # the result is the exact quotient correctly rounded: values below 2**53 divided by a power
+    # of ten float64 holds exactly are divided as floats, which ieee rounds correctly, and the
+    # rest as python ints, whose true division also rounds the exact quotient
+    def scale(self, decimals):
+        decimals = np.broadcast_to(np.asarray(decimals, dtype=np.int64), (len(self),))
+        scaled = np.full(len(self), np.nan)
+
+        high_bits = EXACT_FLOAT_BITS - LIMB_BITS
+        exact = (
+            ~self._mask
+            & ~self._limbs[:, 2:].any(axis=1)
+            & (self._limbs[:, 1] < (1 << high_bits))
+            & (decimals <= EXACT_FLOAT_DIGITS)
+        )
+        values = self._limbs[exact, 1].astype(np.float64) * float(1 << LIMB_BITS) + self._limbs[exact, 0]
+        scaled[exact] = values / FLOAT_POWERS_OF_TEN[decimals[exact]]
+
+        rest = ~self._mask & ~exact
+        if rest.any():
+            # python ints built from 64-bit words, only as many as the largest value needs
+            words = np.ascontiguousarray(self._limbs[rest]).view("<u8")
+            used = words.any(axis=0)
+            values = np.zeros(len(words), dtype=object)
+            for i in range(len(used) - int(np.argmax(used[::-1])) - 1, -1, -1):
+                values = values * (1 << 64) + words[:, i].astype(object)
+            scaled[rest] = (values / POWERS_OF_TEN[decimals[rest]]).astype(np.float64)
+
+        return scaled
+
+    # sign of self - other per value: a uint256 array, a sequence or a single int
+    def _compare(self, other):
+        if isinstance(other, (pd.Series, pd.Index)):
+            other = other.array
+        if isinstance(other, numbers.Integral):
+            if other < 0:
+                return np.ones(len(self), dtype=np.int8), self._mask
+            if other > MAX_UINT256:
+                return -np.ones(len(self), dtype=np.int8), self._mask
+            other_limbs, other_mask = _int_to_limbs(int(other))[np.newaxis, :], False
+        else:
+            other = type(self)._from_sequence(other)
+            other_limbs, other_mask = other._limbs, other._mask
+
+        signs = np.zeros(len(self), dtype=np.int8)
+        for i in range(LIMBS - 1, -1, -1):
+            undecided = signs == 0
+            signs[undecided & (self._limbs[:, i] > other_limbs[:, i])] = 1
+            signs[undecided & (self._limbs[:, i] < other_limbs[:, i])] = -1
+        return signs, self._mask | other_mask
+
+    def __eq__(self, other):
+        signs, mask = self._compare(other)
+        return (signs == 0) & ~mask
+
+    def __ne__(self, other):
+        signs, mask = self._compare(other)
+        return (signs != 0) & ~mask
+
+    def __lt__(self, other):
+        signs, mask = self._compare(other)
+        return (signs < 0) & ~mask
+
+    def __le__(self, other):
+        signs, mask = self._compare(other)
+        return (signs <= 0) & ~mask
+
+    def __gt__(self, other):
+        signs, mask = self._compare(other)
+        return (signs > 0) & ~mask
+
+    def __ge__(self, other):
+        signs, mask = self._compare(other)
+        return (signs >= 0) & ~mask
+
+    # exact sum as a python int, each limb column is summed as uint64 first
+    def sum(self):
+        limb_sums = self._limbs[~self._mask].astype(np.uint64).sum(axis=0)
+        return sum(int(limb_sum) << (LIMB_BITS * i) for i, limb_sum in enumerate(limb_sums))
+
+    def _reduce(self, name, skipna=True, **kwargs):
+        if not skipna and self._mask.any():
+            return pd.NA
+        if name == "sum":
+            return self.sum()
+        if name in ["min", "max"]:
+            values = self[~self._mask]
+            if not len(values):
+                return pd.NA
+            order = np.lexsort(values._limbs.T)
+            return values[int(order[0] if name == "min" else order[-1])]
+
+        raise TypeError(f"uint256 does not support {name}")
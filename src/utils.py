@@ -1,156 +1,175 @@
-from dotenv import dotenv_values, find_dotenv
 import ast
-from ratelimiter import RateLimiter
-import pandas as pd
+import functools
 
-rate_limiter = RateLimiter(max_calls=5, period=1)
 
-dot_env_path = find_dotenv(raise_error_if_not_found=True)
-config = dotenv_values(dot_env_path)
+# the .env is only read the first time one of the names from it is used (see __getattr__
+# at the bottom), so importing this module, or the modules that only need the static
+# lists, doesn't need the .env or pay for reading it
+@functools.lru_cache(maxsize=None)
+def load_config():
+    from dotenv import dotenv_values, find_dotenv
+
+    return dotenv_values(find_dotenv(raise_error_if_not_found=True))
+
+
+# rpc project ids and block explorer api keys, read from .env as they are
+CONFIG_NAMES = [
+    "WEB3_ALCHEMY_PROJECT_ID",
+    "WEB3_OPT_PROJECT_ID",
+    "WEB3_ARB_PROJECT_ID",
+    "WEB3_POLY_PROJECT_ID",
+    "ETHERSCAN_TOKEN",
+    "ARBISCAN_TOKEN",
+    "SNOWTRACE_TOKEN",
+    "POLYGONSCAN_TOKEN",
+    "OPTIMISTIC_TOKEN",
+    "AURORASCAN_TOKEN",
+    "FTMSCAN_TOKEN",
+    "GNOSISSCAN_TOKEN",
+    "BSCSCAN_TOKEN",
+]
 
-WEB3_ALCHEMY_PROJECT_ID = config["WEB3_ALCHEMY_PROJECT_ID"]
-WEB3_OPT_PROJECT_ID = config["WEB3_OPT_PROJECT_ID"]
-WEB3_ARB_PROJECT_ID = config["WEB3_ARB_PROJECT_ID"]
-WEB3_POLY_PROJECT_ID = config["WEB3_POLY_PROJECT_ID"]
 
 # read the list of wallets from .env
 # wallets are in a string dictionary
-WALLETS = ast.literal_eval(config["WALLETS"])
-for item in WALLETS.items():
-    WALLETS[item[0]] = item[1].lower()
-WALLET_LIST = list(WALLETS.values())
-wallet_address_to_name = {wallet: name for name, wallet in WALLETS.items()}
-
-# get block explorer api keys
-ETHERSCAN_TOKEN = config["ETHERSCAN_TOKEN"]
-ARBISCAN_TOKEN = config["ARBISCAN_TOKEN"]
-SNOWTRACE_TOKEN = config["SNOWTRACE_TOKEN"]
-POLYGONSCAN_TOKEN = config["POLYGONSCAN_TOKEN"]
-OPTIMISTIC_TOKEN = config["OPTIMISTIC_TOKEN"]
-AURORASCAN_TOKEN = config["AURORASCAN_TOKEN"]
-FTMSCAN_TOKEN = config["FTMSCAN_TOKEN"]
-GNOSISSCAN_TOKEN = config["GNOSISSCAN_TOKEN"]
-BSCSCAN_TOKEN = config["BSCSCAN_TOKEN"]
+@functools.lru_cache(maxsize=None)
+def _load_wallets():
+    wallets = ast.literal_eval(load_config()["WALLETS"])
+    for item in wallets.items():
+        wallets[item[0]] = item[1].lower()
+    return wallets
+
 
 # info for acccessing data on each chain
-CHAINS = {
-    "mainnet": {
-        "chain_id": 1,
-        "explorer_url": "https://api.etherscan.io/api",
-        "explorer_token": ETHERSCAN_TOKEN,
-        "v2_pool": "0x7d2768de32b0b80b7a3454c06bdac94a69ddc7a9",
-        "pools": ["0x7d2768de32b0b80b7a3454c06bdac94a69ddc7a9"],
-        "base_token_name": "Ether",
-        "base_token_symbol": "ETH",
-        "base_token_decimals": 18,
-    },
-    "polygon": {
-        "chain_id": 137,
-        "explorer_url": "https://api.polygonscan.com/api",
-        "explorer_token": POLYGONSCAN_TOKEN,
-        "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
-        "v2_pool": "0x8dFf5E27EA6b7AC08EbFdf9eB090F32ee9a30fcf",
-        "v2_gateway": "0xbEadf48d62aCC944a06EEaE0A9054A90E5A7dc97",
-        "pools": [
-            "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
-            "0x8dFf5E27EA6b7AC08EbFdf9eB090F32ee9a30fcf",
-            "0xbEadf48d62aCC944a06EEaE0A9054A90E5A7dc97",
-        ],
-        "amUSDT": "0x60D55F02A771d515e077c9C2403a1ef324885CeC",
-        "base_token_name": "Polygon",
-        "base_token_symbol": "MATIC",
-        "base_token_decimals": 18,
-    },
-    "avalanche": {
-        "chain_id": 43114,
-        "explorer_token": SNOWTRACE_TOKEN,
-        "explorer_url": "https://api.snowtrace.io/api",
-        "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
-        "v2_pool": "0x4F01AeD16D97E3aB5ab2B501154DC9bb0F1A5A2C",
-        "blizz_gateway": "0x56d0fed06d2e0b5ac80d7a9ed0387694bdf90c33",
-        "pools": [
-            "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
-            "0x4F01AeD16D97E3aB5ab2B501154DC9bb0F1A5A2C",
-            "0x56d0fed06d2e0b5ac80d7a9ed0387694bdf90c33",
-        ],
-        "base_token_name": "Avalanche",
-        "base_token_symbol": "AVAX",
-        "base_token_decimals": 18,
-    },
-    "arbitrum": {
-        "chain_id": 42161,
-        "explorer_url": "https://api.arbiscan.io/api",
-        "explorer_token": ARBISCAN_TOKEN,
-        "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
-        "pools": ["0x794a61358D6845594F94dc1DB02A252b5b4814aD"],
-        "base_token_name": "Ether",
-        "base_token_symbol": "ETH",
-        "base_token_decimals": 18,
-    },
-    "optimism": {
-        "chain_id": 10,
-        "explorer_url": "https://api-optimistic.etherscan.io/api",
-        "explorer_token": OPTIMISTIC_TOKEN,
-        "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
-        "pools": ["0x794a61358D6845594F94dc1DB02A252b5b4814aD"],
-        "base_token_name": "Optimism",
-        "base_token_symbol": "OP",
-        "base_token_decimals": 18,
-    },
-    "fantom": {
-        "chain_id": 250,
-        "explorer_url": "https://api.ftmscan.com/api",
-        "explorer_token": FTMSCAN_TOKEN,
-        "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
-        "geist_gateway": "0x47102245fea0f8d35a6b28e54505e9ffd83d0704",
-        "pools": 
-        [
-            "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
-            "0x47102245fea0f8d35a6b28e54505e9ffd83d0704"
-        ],
-        "base_token_name": "Fantom",
-        "base_token_symbol": "FTM",
-        "base_token_decimals": 18,
-    },
-    # harmony has a different block explorer so it needs a custom treatment
-    "harmony": {
-        "chain_id": 1666600000,
-        "explorer_url": None,
-        "explorer_token": None,
-        "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
-        "pools": ["0x794a61358D6845594F94dc1DB02A252b5b4814aD"],
-        "base_token_name": "Harmony One",
-        "base_token_symbol": "ONE",
-        "base_token_decimals": 18,
-    },
-    "binance": {
-        "chain_id": 56,
-        "explorer_url": "https://api.bscscan.com/api",
-        "explorer_token": BSCSCAN_TOKEN,
-        "pools": [],
-        "base_token_name": "Binance Coin",
-        "base_token_symbol": "BNB",
-        "base_token_decimals": 18,
-    },
-    "gnosis": {
-        "chain_id": 100,
-        "explorer_url": "https://api.gnosisscan.io/api",
-        "explorer_token": GNOSISSCAN_TOKEN,
-        "base_token_name": "Gnosis",
-        "base_token_symbol": "xDai",
-        "base_token_decimals": 18,
-        "pools": [],
-    },
-    "aurora": {
-        "chain_id": 1313161554,
-        "explorer_url": "https://api.aurorascan.dev/api",
-        "explorer_token": AURORASCAN_TOKEN,
-        "base_token_name": "Ether",
-        "base_token_symbol": "ETH",
-        "base_token_decimals": 18,
-        "pools": [],
-    },
-}
+# built once, so changes to it (e.g. the benchmarks pointing a chain at a mock) are shared
+@functools.lru_cache(maxsize=None)
+def _load_chains():
+    config = load_config()
+    return {
+        "mainnet": {
+            "chain_id": 1,
+            "explorer_url": "https://api.etherscan.io/api",
+            "explorer_token": config["ETHERSCAN_TOKEN"],
+            "rpc_url": f"https://eth-mainnet.g.alchemy.com/v2/{config['WEB3_ALCHEMY_PROJECT_ID']}",
+            "v2_pool": "0x7d2768de32b0b80b7a3454c06bdac94a69ddc7a9",
+            "pools": ["0x7d2768de32b0b80b7a3454c06bdac94a69ddc7a9"],
+            "base_token_name": "Ether",
+            "base_token_symbol": "ETH",
+            "base_token_decimals": 18,
+        },
+        "polygon": {
+            "chain_id": 137,
+            "explorer_url": "https://api.polygonscan.com/api",
+            "explorer_token": config["POLYGONSCAN_TOKEN"],
+            "rpc_url": f"https://polygon-mainnet.g.alchemy.com/v2/{config['WEB3_POLY_PROJECT_ID']}",
+            "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
+            "v2_pool": "0x8dFf5E27EA6b7AC08EbFdf9eB090F32ee9a30fcf",
+            "v2_gateway": "0xbEadf48d62aCC944a06EEaE0A9054A90E5A7dc97",
+            "pools": [
+                "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
+                "0x8dFf5E27EA6b7AC08EbFdf9eB090F32ee9a30fcf",
+                "0xbEadf48d62aCC944a06EEaE0A9054A90E5A7dc97",
+            ],
+            "amUSDT": "0x60D55F02A771d515e077c9C2403a1ef324885CeC",
+            "base_token_name": "Polygon",
+            "base_token_symbol": "MATIC",
+            "base_token_decimals": 18,
+        },
+        "avalanche": {
+            "chain_id": 43114,
+            "explorer_token": config["SNOWTRACE_TOKEN"],
+            "explorer_url": "https://api.snowtrace.io/api",
+            "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
+            "v2_pool": "0x4F01AeD16D97E3aB5ab2B501154DC9bb0F1A5A2C",
+            "blizz_gateway": "0x56d0fed06d2e0b5ac80d7a9ed0387694bdf90c33",
+            "pools": [
+                "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
+                "0x4F01AeD16D97E3aB5ab2B501154DC9bb0F1A5A2C",
+                "0x56d0fed06d2e0b5ac80d7a9ed0387694bdf90c33",
+            ],
+            "base_token_name": "Avalanche",
+            "base_token_symbol": "AVAX",
+            "base_token_decimals": 18,
+        },
+        "arbitrum": {
+            "chain_id": 42161,
+            "explorer_url": "https://api.arbiscan.io/api",
+            "explorer_token": config["ARBISCAN_TOKEN"],
+            "rpc_url": f"https://arb-mainnet.g.alchemy.com/v2/{config['WEB3_ARB_PROJECT_ID']}",
+            "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
+            "pools": ["0x794a61358D6845594F94dc1DB02A252b5b4814aD"],
+            "base_token_name": "Ether",
+            "base_token_symbol": "ETH",
+            "base_token_decimals": 18,
+        },
+        "optimism": {
+            "chain_id": 10,
+            "explorer_url": "https://api-optimistic.etherscan.io/api",
+            "explorer_token": config["OPTIMISTIC_TOKEN"],
+            "rpc_url": f"https://opt-mainnet.g.alchemy.com/v2/{config['WEB3_OPT_PROJECT_ID']}",
+            "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
+            "pools": ["0x794a61358D6845594F94dc1DB02A252b5b4814aD"],
+            "base_token_name": "Optimism",
+            "base_token_symbol": "OP",
+            "base_token_decimals": 18,
+        },
+        "fantom": {
+            "chain_id": 250,
+            "explorer_url": "https://api.ftmscan.com/api",
+            "explorer_token": config["FTMSCAN_TOKEN"],
+            "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
+            "geist_gateway": "0x47102245fea0f8d35a6b28e54505e9ffd83d0704",
+            "pools": 
+            [
+                "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
+                "0x47102245fea0f8d35a6b28e54505e9ffd83d0704"
+            ],
+            "base_token_name": "Fantom",
+            "base_token_symbol": "FTM",
+            "base_token_decimals": 18,
+        },
+        # harmony has a different block explorer so it needs a custom treatment
+        "harmony": {
+            "chain_id": 1666600000,
+            "explorer_url": None,
+            "explorer_token": None,
+            "rpc_url": "https://api.harmony.one",
+            "v3_pool": "0x794a61358D6845594F94dc1DB02A252b5b4814aD",
+            "pools": ["0x794a61358D6845594F94dc1DB02A252b5b4814aD"],
+            "base_token_name": "Harmony One",
+            "base_token_symbol": "ONE",
+            "base_token_decimals": 18,
+        },
+        "binance": {
+            "chain_id": 56,
+            "explorer_url": "https://api.bscscan.com/api",
+            "explorer_token": config["BSCSCAN_TOKEN"],
+            "pools": [],
+            "base_token_name": "Binance Coin",
+            "base_token_symbol": "BNB",
+            "base_token_decimals": 18,
+        },
+        "gnosis": {
+            "chain_id": 100,
+            "explorer_url": "https://api.gnosisscan.io/api",
+            "explorer_token": config["GNOSISSCAN_TOKEN"],
+            "base_token_name": "Gnosis",
+            "base_token_symbol": "xDai",
+            "base_token_decimals": 18,
+            "pools": [],
+        },
+        "aurora": {
+            "chain_id": 1313161554,
+            "explorer_url": "https://api.aurorascan.dev/api",
+            "explorer_token": config["AURORASCAN_TOKEN"],
+            "base_token_name": "Ether",
+            "base_token_symbol": "ETH",
+            "base_token_decimals": 18,
+            "pools": [],
+        },
+    }
+
+
 chain_id_to_name = {
     1: "mainnet",
     137: "polygon",
@@ -163,15 +182,18 @@ chain_id_to_name = {
     100: "gnosis",
     1313161554: "aurora",
 }
-CHAIN_LIST = list(CHAINS.keys())
+CHAIN_LIST = list(chain_id_to_name.values())
 CHAIN_LIST.remove("harmony")
 
 
-POOL_LIST = []
-for chain in CHAIN_LIST:
-    for pool in CHAINS[chain]['pools']:
-        POOL_LIST.append(pool)
-POOL_LIST = [pool.lower() for pool in POOL_LIST]
+def _load_pool_list():
+    pool_list = []
+    for chain in CHAIN_LIST:
+        for pool in _load_chains()[chain]['pools']:
+            pool_list.append(pool)
+    return [pool.lower() for pool in pool_list]
+
+
 h_POOLS = {
     "hFRX":'0xb4300e088a3ae4e624ee5c71bc1822f68bb5f2bc',
     "iGBP":'0xecab2c76f1a8359a06fab5fa0ceea51280a97ecf',
@@ -198,8 +220,6 @@ generic_vault_list = [pool.lower() for pool in generic_vaults.values()]
 
 qi_dao_vaults = ['0xa3Fa99A148fA48D14Ed51d610c367C61876997F1'.lower()]
 
-TEST_WALLET = WALLET_LIST[11]
-TEST_POOL = CHAINS["polygon"]["v2_pool"]
 TEST_CHAIN = "polygon"
 
 # {key: key: value}
@@ -209,4 +229,42 @@ BRIDGES = {
         'polygon': '0xa0c68c638235ee32657e8f720a23cec1bfc77c77',
         'avalanche': '0xe78388b4ce79068e89bf8aa7f218ef6b9ab0e9d0',
     },
-}
\ No newline at end of file
+}
+
+
+# everything built from the .env, by name
+_LAZY_NAMES = {
+    "WALLETS": _load_wallets,
+    "WALLET_LIST": lambda: list(_load_wallets().values()),
+    "wallet_address_to_name": lambda: {wallet: name for name, wallet in _load_wallets().items()},
+    "CHAINS": _load_chains,
+    "POOL_LIST": _load_pool_list,
+    "TEST_WALLET": lambda: list(_load_wallets().values())[11],
+    "TEST_POOL": lambda: _load_chains()["polygon"]["v2_pool"],
+}
+
+__all__ = [
+    "CHAIN_LIST",
+    "chain_id_to_name",
+    "h_POOLS",
+    "h_POOL_LIST",
+    "generic_vaults",
+    "generic_vault_list",
+    "qi_dao_vaults",
+    "TEST_CHAIN",
+    "BRIDGES",
+    "load_config",
+] + CONFIG_NAMES + list(_LAZY_NAMES)
+
+
+# names from the .env are resolved on first use and then kept as module attributes
+def __getattr__(name):
+    if name in CONFIG_NAMES:
+        value = load_config()[name]
+    elif name in _LAZY_NAMES:
+        value = _LAZY_NAMES[name]()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import baseline_split
+from src import gas, utils
+from src.lending import split
+
+
+WALLETS = {
+    "wallet_a": "0x00000000000000000000000000000000000000a1",
+    "wallet_b": "0x00000000000000000000000000000000000000b2",
+}
+POOLS = [
+    "0x8dff5e27ea6b7ac08ebfdf9eb090f32ee9a30fcf",
+    "0x794a61358d6845594f94dc1db02a252b5b4814ad",
+]
+OTHER = "0x00000000000000000000000000000000000000ff"
+
+
+# the gas fees are worked out in the chain's base token, the rest of the .env isn't needed
+# set in the module's namespace, since getting utils.CHAINS first would read the .env
+@pytest.fixture(autouse=True)
+def chains(monkeypatch):
+    polygon = {"base_token_symbol": "MATIC", "base_token_decimals": 18}
+    monkeypatch.setitem(vars(utils), "CHAINS", {"polygon": polygon})
+    monkeypatch.setattr(gas, "_fees", pd.Series([], dtype="float64"))
+    gas._chain_table.cache_clear()
+    yield
+    gas._chain_table.cache_clear()
+
+
+# transfers of every kind to and from the wallets, in deposit tokens and variable debt tokens
+# too, with a few transactions sending more than one transfer
+# every transfer is at a different time, since the baseline sorted positions with an unstable sort
+def make_transfers(_seed, _n):
+    rng = np.random.default_rng(_seed)
+    actions = ["deposit", "supply", "withdraw", "withdrawETH", "borrow", "repay", "repayBorrow", "depositAll", "swap"]
+    tokens = ["USDC", "amUSDC", "variableDebtUSDC", "WETH", "aCRV"]
+
+    wallets = rng.choice(list(WALLETS.values()), _n)
+    sent = rng.integers(0, 2, _n).astype(bool)
+    senders = np.where(sent, wallets, OTHER)
+    receivers = np.where(sent, OTHER, wallets)
+    names = {wallet: name for name, wallet in WALLETS.items()}
+
+    return pd.DataFrame({
+        "hash": [f"0x{i:064x}" for i in rng.integers(0, _n // 2, _n)],
+        "datetime": pd.to_datetime(1.6e9 + rng.permutation(_n) * 60, unit="s"),
+        "action": rng.choice(actions, _n),
+        "from": senders,
+        "to": rng.choice(POOLS, _n),
+        "transferFrom": senders,
+        "transferTo": receivers,
+        "tokenSymbol": rng.choice(tokens, _n),
+        "amount_fixed": np.round(rng.exponential(5, _n), 1) * rng.choice([1, 1, 1, 0], _n),
+        "gasPrice": rng.integers(1, 10**10, _n),
+        "gasUsed": rng.integers(21000, 300000, _n),
+        "wallet": wallets,
+        "wallet_name": [names[wallet] for wallet in wallets],
+        "chain": "polygon",
+    })
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_split_matches_baseline(seed, max_workers):
+    transfers = make_transfers(seed, 600)
+
+    expected = baseline_split.get_deposits_and_borrows(transfers, POOLS)
+    result = split.get_deposits_and_borrows(transfers, POOLS, max_workers=max_workers)
+
+    # the baseline's totals columns came in the order of the first kind of position it split,
+    # now the deposit totals always come first
+    assert sorted(result.columns) == sorted(expected.columns)
+    pd.testing.assert_frame_equal(result, expected[result.columns])
+
+
+# transfers for running the split a few transfers at a time, each transaction's transfers at
+# its own time like a block's, and some without a token, which aren't part of any position
+def make_incremental_transfers(_seed, _n):
+    transfers = make_transfers(_seed, _n)
+    transaction = transfers.hash.str[2:].apply(int, base=16)
+    transfers["datetime"] = pd.to_datetime(1.6e9 + transaction * 60, unit="s")
+    transfers.loc[transfers.index % 25 == 0, "tokenSymbol"] = np.nan
+    return transfers
+
+
+# the output of incremental runs, each splitting the transfers up to a cut and adding them to
+# the last run's file, is the file a full run writes
+@pytest.mark.parametrize("cuts", [[0.5], [0.2, 0.6, 0.9]])
+def test_incremental_split_matches_full(tmp_path, monkeypatch, cuts):
+    transfers = make_incremental_transfers(0, 600)
+    path = tmp_path / "deposits_and_borrows.csv"
+    monkeypatch.setattr(split, "DEPOSITS_AND_BORROWS_PATH", str(path))
+    monkeypatch.setitem(vars(utils), "POOL_LIST", POOLS)
+
+    ledger = {}
+    for cut in cuts + [1]:
+        arrived = transfers[transfers.datetime <= transfers.datetime.quantile(cut)]
+        monkeypatch.setattr(split, "load_pool_transfers", lambda: arrived)
+        split.main(ledger=ledger).to_csv(path, index=False)
+        # as it's saved and loaded between runs
+        ledger = json.loads(json.dumps(ledger))
+
+    full = split.get_deposits_and_borrows(transfers, POOLS)
+    assert path.read_text() == full.to_csv(index=False)
+
+    # and a run with nothing new leaves it as it is
+    split.main(ledger=ledger).to_csv(path, index=False)
+    assert path.read_text() == full.to_csv(index=False)